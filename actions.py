@@ -1,13 +1,30 @@
-from PyQt6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog, QDialog
+from PyQt6.QtWidgets import QApplication, QFileDialog, QMessageBox, QProgressDialog, QDialog
 from PyQt6.QtGui import QStandardItem
 from PyQt6.QtCore import Qt
 from pathlib import Path
+import os
+import threading
 import toml
 import traceback
 
 from gui_components import SuffixInputDialog, TomlConfigDialog, CaptionConfigDialog
 from caption_generator import CaptionGenerator
 from danbooru_generator import DanbooruGenerator
+from aspect_buckets import make_buckets, load_bucket_index, bucket_settings
+from dataset_scan import scan_images, estimate_report, mark_up_to_date, calibrate
+from image_quality import QualityThresholds
+from super_resolution import SuperResolver, SuperResolutionUnavailable, DEFAULT_MODEL, CACHE_DIRNAME
+from concept_folders import find_concept_folders, dataset_subsets, caption_paths
+from model_registry import MODEL_REGISTRY
+from memory_policy import MemoryPolicy
+
+# Opções do combo "Output Format": (formato, nível de compressão PNG)
+OUTPUT_FORMAT_CHOICES = {
+    "PNG": ("png", 6),
+    "PNG (fast)": ("png", 1),
+    "WebP (lossless)": ("webp", 6),
+    "JPEG (q95)": ("jpeg", 6),
+}
 
 class DatasetActionsMixin:
     def toggle_face_detection(self):
@@ -16,6 +33,42 @@ class DatasetActionsMixin:
         else:
             self.face_detection.setText("Face Detection: OFF")
     
+    def toggle_aspect_buckets(self):
+        if self.aspect_buckets.isChecked():
+            self.aspect_buckets.setText("Aspect Ratio Buckets: ON")
+        else:
+            self.aspect_buckets.setText("Aspect Ratio Buckets: OFF")
+    
+    def toggle_smart_crop(self):
+        if self.smart_crop.isChecked():
+            self.smart_crop.setText("Smart Crop: ON")
+        else:
+            self.smart_crop.setText("Smart Crop: OFF")
+    
+    def toggle_sr_upscale(self):
+        if self.sr_upscale.isChecked():
+            self.sr_upscale.setText("SR Upscale: ON")
+        else:
+            self.sr_upscale.setText("SR Upscale: OFF")
+    
+    def toggle_include_subfolders(self):
+        if self.include_subfolders.isChecked():
+            self.include_subfolders.setText("Include Subfolders: ON")
+        else:
+            self.include_subfolders.setText("Include Subfolders: OFF")
+    
+    def toggle_skip_duplicates(self):
+        if self.skip_duplicates.isChecked():
+            self.skip_duplicates.setText("Skip Duplicates: ON")
+        else:
+            self.skip_duplicates.setText("Skip Duplicates: OFF")
+    
+    def toggle_quality_filter(self):
+        if self.quality_filter.isChecked():
+            self.quality_filter.setText("Quality Filter: ON")
+        else:
+            self.quality_filter.setText("Quality Filter: OFF")
+    
     def select_dataset_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Dataset Folder")
         if folder:
@@ -50,24 +103,43 @@ class DatasetActionsMixin:
         else:
             self.status_label.setText("No dataset selected")
     
+    def run_in_background(self, label: str, func, *args):
+        """
+        Executa func(*args) numa thread, mantendo a GUI responsiva com um
+        diálogo de progresso. Retorna o resultado, ou None se o usuário pular
+        a espera (a thread termina sozinha, e o resultado é descartado).
+        Exceções de func são relançadas aqui.
+        """
+        outcome = {}
+
+        def run():
+            try:
+                outcome["result"] = func(*args)
+            except Exception as e:
+                outcome["error"] = e
+
+        progress = QProgressDialog(label, "Skip", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while thread.is_alive() and not progress.wasCanceled():
+            QApplication.processEvents()
+            thread.join(0.05)
+        progress.close()
+
+        if "error" in outcome and not progress.wasCanceled():
+            raise outcome["error"]
+        return outcome.get("result")
+    
     def get_image_files(self, directory):
         """Obter todos os arquivos de imagem suportados em um diretório,
         incluindo diferentes casos de extensão e formatos adicionais."""
-        # Lista para armazenar todos os arquivos de imagem encontrados
-        image_files = []
-        
-        # Extensões de imagem comuns em diferentes casos
-        extensions = [
-            "*.jpg", "*.jpeg", "*.png", "*.webp",  # minúsculas
-            "*.JPG", "*.JPEG", "*.PNG", "*.WEBP",  # maiúsculas
-            "*.Jpg", "*.Jpeg", "*.Png", "*.Webp"   # misto
-        ]
-        
-        # Procurar por cada tipo de extensão
-        for ext in extensions:
-            image_files.extend(directory.glob(ext))
-        
-        return image_files
+        # Uma única passada no diretório, comparando a extensão sem diferenciar maiúsculas
+        extensions = {".jpg", ".jpeg", ".png", ".webp"}
+        return sorted(path for path in directory.iterdir()
+                      if path.is_file() and path.suffix.lower() in extensions)
     
     def process_images(self):
         if not self.dataset_path:
@@ -79,82 +151,88 @@ class DatasetActionsMixin:
             output_dir = self.dataset_path / "cropped_images"
             
             # Encontrar todas as imagens com extensões diversas usando nosso método
-            our_image_files = self.get_image_files(input_dir)
+            recursive = self.include_subfolders.isChecked()
+            if recursive:
+                # Subpastas de conceitos, espelhadas dentro de cropped_images
+                folders = find_concept_folders(input_dir, exclude=[output_dir], skip_outputs=True)
+                our_image_files = [path for folder in folders for path in folder.images]
+            else:
+                our_image_files = self.get_image_files(input_dir)
             n_files = len(our_image_files)
             
-            # Verificar quais arquivos o método original encontraria
-            original_glob_files = list(input_dir.glob("*.[jp][pn][g]"))
-            n_original_files = len(original_glob_files)
-            
-            # Criar listas de nomes para comparação
-            our_filenames = [f.name for f in our_image_files]
-            original_filenames = [f.name for f in original_glob_files]
-            
-            # Encontrar diferenças
-            missing_files = [f for f in our_filenames if f not in original_filenames]
-            
-            # Mostrar diagnóstico
-            diagnostic_message = (
-                f"Diagnóstico:\n"
-                f"- Nosso método encontrou: {n_files} imagens\n"
-                f"- Método original encontraria: {n_original_files} imagens\n\n"
-                f"Arquivos que seriam ignorados pelo método original:\n"
-                f"{', '.join(missing_files)}"
-            )
-            
-            QMessageBox.information(self, "Diagnóstico", diagnostic_message)
-            
             if n_files == 0:
                 QMessageBox.warning(self, "Warning", "No images found in the input directory!")
                 return
             
-            # SOLUÇÃO TEMPORÁRIA: Modificar o comportamento do ImageProcessor
-            # Vamos sobrecarregar o método process_directory para processar nossa lista de arquivos
+            target_size = (self.crop_width.value(), self.crop_height.value())
+            self.image_processor.use_face_detection = self.face_detection.isChecked()
+            self.image_processor.smart_crop = self.smart_crop.isChecked()
+            self.image_processor.upscale_model = None
+            if self.sr_upscale.isChecked():
+                # Verifica o modelo antes de começar, em vez de cada worker cair no Lanczos
+                try:
+                    SuperResolver(DEFAULT_MODEL).check()
+                    self.image_processor.upscale_model = str(DEFAULT_MODEL)
+                    # Cache das ampliações ao lado do manifesto, fora do dataset de entrada
+                    self.image_processor.sr_cache_dir = str(output_dir / CACHE_DIRNAME)
+                except SuperResolutionUnavailable as e:
+                    QMessageBox.warning(self, "Warning",
+                        f"Super-resolution unavailable, using Lanczos upscaling:\n{e}")
+            output_format, compress_level = OUTPUT_FORMAT_CHOICES[self.output_format.currentText()]
+            self.image_processor.output_format = output_format
+            self.image_processor.png_compress_level = compress_level
             
-            # Guardar método original para restaurar depois
-            original_process_dir = self.image_processor.process_directory
+            # Com bucketing, o Target Size define a área máxima dos buckets
+            buckets = make_buckets(target_size) if self.aspect_buckets.isChecked() else None
             
-            # Definir uma função wrapper customizada
-            def custom_process_directory(input_dir, output_dir, target_size):
-                processed = 0
-                failed = 0
-                
-                # Garantir que o diretório de saída existe
-                output_dir.mkdir(parents=True, exist_ok=True)
-                
-                # Processar cada arquivo que encontramos
-                for image_path in our_image_files:
-                    try:
-                        # Chamar o método de processamento de arquivo único do ImageProcessor
-                        # (Observe que você pode precisar ajustar isto com base na implementação real)
-                        output_path = output_dir / f"{image_path.stem}.png"
-                        if self.image_processor.process_image(image_path, output_path, target_size):
-                            processed += 1
-                        else:
-                            failed += 1
-                    except Exception as e:
-                        print(f"Error processing {image_path}: {e}")
-                        failed += 1
-                
-                return processed, failed
+            # Pré-varredura só pelos cabeçalhos: classifica as imagens e estima
+            # o tempo com os custos medidos numa amostra do próprio dataset
+            workers = os.cpu_count() or 1
+            report = scan_images(our_image_files, target_size)
+            # O processamento é incremental: saídas já atualizadas no manifesto não custam nada
+            if recursive:
+                output_dir_for = lambda path: output_dir / path.parent.relative_to(input_dir)
+            else:
+                output_dir_for = lambda path: output_dir
+            mark_up_to_date(report.entries, self.image_processor, output_dir_for,
+                            target_size, buckets)
+            # A calibração processa algumas amostras: roda fora da thread da
+            # GUI, e pular a espera usa os custos padrão na estimativa
+            costs = self.run_in_background("Measuring processing speed on sample images...",
+                                           calibrate, self.image_processor, report, target_size)
+            report = estimate_report(report.entries, target_size, costs, workers,
+                                     self.image_processor.fast_decode, output_format)
             
-            # Substituir o método temporariamente
-            try:
-                # Esta é uma solução rápida - pode não funcionar dependendo da implementação do ImageProcessor
-                self.image_processor.process_directory = custom_process_directory
-                
-                target_size = (self.crop_width.value(), self.crop_height.value())
-                self.image_processor.use_face_detection = self.face_detection.isChecked()
-                
-                processed, failed = self.image_processor.process_directory(
-                    input_dir, output_dir, target_size
-                )
-                
-                QMessageBox.information(self, "Success", 
-                    f"Processing complete!\n\nSuccessfully processed: {processed}\nFailed: {failed}")
-            finally:
-                # Restaurar o método original
-                self.image_processor.process_directory = original_process_dir
+            reply = QMessageBox.question(
+                self, "Process Images", f"{report.summary()}\n\nStart processing?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            
+            # Processa as imagens legíveis encontradas acima, em paralelo,
+            # pulando as imagens cuja saída já está atualizada no manifesto
+            process = (self.image_processor.process_directory_recursive if recursive
+                       else self.image_processor.process_directory)
+            processed, failed = process(
+                input_dir, output_dir, target_size,
+                workers=workers,
+                image_files=report.readable_files,
+                incremental=True,
+                buckets=buckets,
+                skip_duplicates=self.skip_duplicates.isChecked(),
+                quality=QualityThresholds() if self.quality_filter.isChecked() else None
+            )
+            
+            message = f"Processing complete!\n\nSuccessfully processed: {processed}\nFailed: {failed}"
+            quarantine = self.image_processor.quarantine
+            if quarantine:
+                # Arquivos que travaram ou derrubaram o decodificador
+                names = ", ".join(path.name for path in list(quarantine)[:10])
+                more = f" and {len(quarantine) - 10} more" if len(quarantine) > 10 else ""
+                message += (f"\n\nQuarantined (crashed or timed out): {len(quarantine)}\n{names}{more}"
+                            f"\n\nUse \"Clear Quarantine\" to retry them.")
+            QMessageBox.information(self, "Success", message)
             
             self.tree_model.clear()
             self.populate_tree_view(self.dataset_path)
@@ -166,6 +244,16 @@ class DatasetActionsMixin:
             error_msg = f"Error processing images: {str(e)}\n\n{traceback.format_exc()}"
             QMessageBox.critical(self, "Error", error_msg)
     
+    def clear_quarantine(self):
+        """Libera as imagens em quarentena para serem tentadas no próximo processamento"""
+        if not self.dataset_path:
+            QMessageBox.warning(self, "Warning", "Please select a dataset folder first!")
+            return
+        cleared = self.image_processor.clear_quarantine(self.dataset_path / "cropped_images")
+        QMessageBox.information(self, "Clear Quarantine",
+            f"{cleared} quarantined image(s) will be retried on the next processing run."
+            if cleared else "No quarantined images.")
+    
     def generate_captions(self):
         if not self.dataset_path:
             QMessageBox.warning(self, "Warning", "Please select a dataset folder first!")
@@ -177,9 +265,8 @@ class DatasetActionsMixin:
                 QMessageBox.warning(self, "Warning", "Please process images first!")
                 return
             
-            # Usar o método melhorado para encontrar imagens
-            image_files = self.get_image_files(cropped_dir)
-            n_files = len(image_files)
+            # Imagens da raiz e das subpastas de conceitos, como os geradores
+            n_files = len(caption_paths(cropped_dir, cropped_dir / "captions"))
             
             if n_files == 0:
                 QMessageBox.warning(self, "Warning", "No images found in cropped_images folder!")
@@ -203,28 +290,41 @@ class DatasetActionsMixin:
             
             captions_dir = cropped_dir / "captions"
             
-            # Escolhe o gerador apropriado
-            generator = None
+            # Escolhe o gerador apropriado. O registro devolve o já carregado
+            # numa execução anterior com o mesmo modelo, se ainda estiver na
+            # memória; só os ajustes desta execução são aplicados de novo
             if config['method'] == "Florence-2":
-                generator = CaptionGenerator()
+                candidate = CaptionGenerator(batch_size=config['batch_size'])
             elif config['method'] == "Danbooru":
                 model_type = config.get('model_type', 'vit')
-                generator = DanbooruGenerator(model_type=model_type)
+                candidate = DanbooruGenerator(model_type=model_type, batch_size=config['batch_size'])
             else:  # Janus-7B
                 from janus_generator import JanusGenerator
-                generator = JanusGenerator()
-                if config['janus_context']:
-                    if config['replace_prompt']:
-                        generator.set_prompt(config['janus_context'])
-                    else:
-                        generator.add_context(config['janus_context'])
+                candidate = JanusGenerator()
             
-            processed, failed = generator.process_directory(
-                cropped_dir, 
-                captions_dir,
-                prefix=config['prefix'],
-                progress_callback=update_progress
-            )
+            update_progress("Loading caption model...", 0)
+            with MODEL_REGISTRY.use(candidate.model_key(), lambda: candidate) as generator:
+                if config['method'] == "Janus-7B":
+                    generator.custom_prompt = None
+                    if config['janus_context']:
+                        if config['replace_prompt']:
+                            generator.set_prompt(config['janus_context'])
+                        else:
+                            generator.add_context(config['janus_context'])
+                else:
+                    generator.batch_size = max(1, config['batch_size'])
+                generator.memory_policy = MemoryPolicy(
+                    mode=config['memory_mode'],
+                    every_n=config['memory_every_n'],
+                    threshold_mb=config['memory_threshold_mb'],
+                )
+                
+                processed, failed = generator.process_directory(
+                    cropped_dir, 
+                    captions_dir,
+                    prefix=config['prefix'],
+                    progress_callback=update_progress
+                )
             
             progress.close()
             
@@ -240,6 +340,16 @@ class DatasetActionsMixin:
             error_msg = f"Error generating captions:\n{str(e)}\n\nTraceback:\n{traceback.format_exc()}"
             QMessageBox.critical(self, "Error", error_msg)
     
+    def unload_caption_models(self):
+        """Descarrega os modelos de caption mantidos na memória entre execuções"""
+        loaded = len(MODEL_REGISTRY.loaded())
+        if loaded == 0:
+            QMessageBox.information(self, "Caption Models", "No caption models are loaded.")
+            return
+        freed = MODEL_REGISTRY.unload()
+        QMessageBox.information(self, "Caption Models",
+            f"Unloaded {loaded} caption model(s), freeing {freed:.0f} MB.")
+    
     def generate_toml(self):
         if not self.dataset_path:
             QMessageBox.warning(self, "Warning", "Please select a dataset folder first!")
@@ -271,6 +381,24 @@ class DatasetActionsMixin:
                     }]
                 }
                 
+                # Um subset por pasta com imagens (conceitos processados com
+                # "Include Subfolders"); pastas no padrão do kohya (10_alice)
+                # definem as próprias repetições e class tokens
+                subsets = dataset_subsets(cropped_dir, config['num_repeats'], config['class_tokens'])
+                if subsets:
+                    toml_data["datasets"][0]["subsets"] = subsets
+                
+                # Imagens já processadas em buckets: configura o bucketing do
+                # kohya a partir dos índices, sem reescalar nem cortar de novo
+                bucketed = {}
+                for subset in toml_data["datasets"][0]["subsets"]:
+                    bucket_index = load_bucket_index(Path(subset["image_dir"]))
+                    if bucket_index and bucket_index.get("images"):
+                        bucketed.update({f"{subset['image_dir']}/{name}": size
+                                         for name, size in bucket_index["images"].items()})
+                if bucketed:
+                    toml_data["datasets"][0].update(bucket_settings({"images": bucketed}))
+                
                 toml_path = cropped_dir / "dataset.toml"
                 with open(toml_path, "w", encoding="utf-8") as f:
                     toml.dump(toml_data, f)
@@ -0,0 +1,82 @@
+import json
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Índice de buckets gravado junto às imagens processadas
+BUCKET_INDEX = "buckets.json"
+
+
+def make_buckets(resolution: Tuple[int, int], min_size: int = 256,
+                 max_size: int = 2048, step: int = 64) -> List[Tuple[int, int]]:
+    """
+    Gera o conjunto de buckets no mesmo esquema do kohya: todas as
+    resoluções com lados múltiplos de step, entre min_size e max_size, cuja
+    área não passa da área de resolution.
+    """
+    max_area = resolution[0] * resolution[1]
+    buckets = set()
+    width = min_size
+    while width <= max_size:
+        height = min(max_size, (max_area // width) // step * step)
+        if height >= min_size:
+            buckets.add((width, height))
+            buckets.add((height, width))
+        width += step
+
+    # O bucket quadrado nem sempre sai do laço acima (ex.: 1000x1000)
+    side = int(math.sqrt(max_area)) // step * step
+    if side >= min_size:
+        buckets.add((side, side))
+    return sorted(buckets)
+
+
+def closest_bucket(size: Tuple[int, int], buckets: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Escolhe o bucket com a proporção mais próxima da imagem, comparando em
+    escala logarítmica para que 2:1 e 1:2 fiquem à mesma distância de 1:1.
+    Em caso de empate fica com o maior bucket.
+    """
+    aspect = math.log(size[0] / size[1])
+    return min(buckets, key=lambda b: (abs(math.log(b[0] / b[1]) - aspect), -b[0] * b[1]))
+
+
+def write_bucket_index(output_dir: Path, buckets: List[Tuple[int, int]],
+                       assignments: Dict[str, Tuple[int, int]]):
+    """Grava o índice {nome da saída: bucket} no diretório de saída"""
+    index = {
+        "buckets": [list(b) for b in buckets],
+        "images": {name: list(bucket) for name, bucket in sorted(assignments.items())},
+    }
+    (Path(output_dir) / BUCKET_INDEX).write_text(json.dumps(index, indent=2), encoding="utf-8")
+
+
+def load_bucket_index(output_dir: Path) -> Optional[dict]:
+    """Lê o índice de buckets, se existir"""
+    path = Path(output_dir) / BUCKET_INDEX
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def bucket_settings(index: dict) -> dict:
+    """
+    Configuração de bucketing do kohya (dataset.toml) para um diretório já
+    processado em buckets. Como cada imagem já está exatamente no tamanho do
+    seu bucket, bucket_no_upscale faz o kohya usar esse tamanho direto, sem
+    novos resizes ou crops.
+    """
+    sizes = [tuple(size) for size in index["images"].values()]
+    sides = [side for size in sizes for side in size]
+    largest = max(sizes, key=lambda size: size[0] * size[1])
+    return {
+        "resolution": [largest[0], largest[1]],
+        "enable_bucket": True,
+        "bucket_no_upscale": True,
+        "min_bucket_reso": min(sides),
+        "max_bucket_reso": max(sides),
+        "bucket_reso_steps": math.gcd(*sides),
+    }
@@ -0,0 +1,92 @@
+# Benchmark da decodificação reduzida (ImageProcessor.fast_decode)
+#
+# Gera imagens sintéticas grandes em JPEG, PNG e WebP, processa cada uma com e
+# sem fast_decode e reporta o tempo médio por imagem, o speedup e a diferença
+# de qualidade (PSNR) entre as duas saídas.
+#
+# Uso:
+#   python benchmarks/bench_fast_decode.py --size 6000x4000 --target 1024 --repeats 3
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from image_processor import ImageProcessor
+
+
+def make_source(size, seed=0, noise=12.0) -> Image.Image:
+    """Imagem sintética com gradientes suaves e textura fina (próxima de uma foto)"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    r = 127 + 100 * np.sin(x / 180.0) * np.cos(y / 240.0)
+    g = 127 + 100 * np.sin((x + y) / 300.0)
+    b = 127 + 100 * np.cos(np.hypot(x - width / 2, y - height / 2) / 90.0)
+    pixels = np.stack([r, g, b], axis=-1)
+    pixels += rng.normal(0, noise, pixels.shape).astype(np.float32)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    mse = np.mean(diff ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def time_processing(processor, source, output, target_size, repeats) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        if not processor.process_image(source, output, target_size):
+            raise RuntimeError(f"Falha ao processar {source}")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de fast_decode do ImageProcessor")
+    parser.add_argument("--size", default="6000x4000", help="Tamanho das imagens de origem (LxA)")
+    parser.add_argument("--target", type=int, default=1024, help="Lado do target quadrado")
+    parser.add_argument("--repeats", type=int, default=3, help="Repetições por medida (usa a menor)")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    target_size = (args.target, args.target)
+
+    full = ImageProcessor(use_face_detection=False, fast_decode=False)
+    fast = ImageProcessor(use_face_detection=False, fast_decode=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        image = make_source(size)
+        sources = {
+            "JPEG": (tmp / "source.jpg", {"quality": 92}),
+            "PNG": (tmp / "source.png", {}),
+            "WebP": (tmp / "source.webp", {"quality": 92}),
+        }
+
+        print(f"Origem {size[0]}x{size[1]} -> {target_size[0]}x{target_size[1]}")
+        print(f"{'formato':<8}{'completo (ms)':>15}{'reduzido (ms)':>15}{'speedup':>10}{'PSNR (dB)':>12}")
+        for name, (path, save_args) in sources.items():
+            image.save(path, **save_args)
+            full_out = tmp / f"{name}_full.png"
+            fast_out = tmp / f"{name}_fast.png"
+
+            full_time = time_processing(full, path, full_out, target_size, args.repeats)
+            fast_time = time_processing(fast, path, fast_out, target_size, args.repeats)
+
+            with Image.open(full_out) as a, Image.open(fast_out) as b:
+                quality = psnr(a, b)
+
+            print(f"{name:<8}{full_time * 1000:>15.1f}{fast_time * 1000:>15.1f}"
+                  f"{full_time / fast_time:>9.2f}x{quality:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
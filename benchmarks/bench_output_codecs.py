@@ -0,0 +1,60 @@
+# Benchmark dos formatos de saída do ImageProcessor
+#
+# Mede, para cada opção de codificação, o tempo médio de encode por imagem e
+# o tamanho médio do arquivo, sobre imagens sintéticas já no tamanho final.
+#
+# Uso:
+#   python benchmarks/bench_output_codecs.py --target 1024 --images 5
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from image_processor import ImageProcessor
+from bench_fast_decode import make_source
+
+# (rótulo, argumentos do ImageProcessor)
+CODECS = [
+    ("PNG nível 1", {"output_format": "png", "png_compress_level": 1}),
+    ("PNG nível 6", {"output_format": "png", "png_compress_level": 6}),
+    ("PNG nível 9", {"output_format": "png", "png_compress_level": 9}),
+    ("WebP lossless", {"output_format": "webp"}),
+    ("JPEG q95", {"output_format": "jpeg"}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos formatos de saída do ImageProcessor")
+    parser.add_argument("--target", type=int, default=1024, help="Lado das imagens codificadas")
+    parser.add_argument("--images", type=int, default=5, help="Número de imagens por formato")
+    parser.add_argument("--noise", type=float, default=3.0, help="Desvio padrão do ruído sintético")
+    args = parser.parse_args()
+
+    # Granulação leve, próxima de uma foto já reduzida para o tamanho final
+    images = [make_source((args.target, args.target), seed=i, noise=args.noise)
+              for i in range(args.images)]
+
+    print(f"{args.images} imagens {args.target}x{args.target}")
+    print(f"{'formato':<16}{'encode (ms/img)':>17}{'tamanho (KB/img)':>18}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for label, options in CODECS:
+            processor = ImageProcessor(use_face_detection=False, **options)
+            total_time = 0.0
+            total_bytes = 0
+            for i, image in enumerate(images):
+                output_path = processor._output_path(tmp, Path(f"image_{i}"))
+                start = time.perf_counter()
+                processor._save_image(image, output_path)
+                total_time += time.perf_counter() - start
+                total_bytes += output_path.stat().st_size
+
+            print(f"{label:<16}{total_time * 1000 / len(images):>17.1f}"
+                  f"{total_bytes / 1024 / len(images):>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# Suíte de benchmark do ImageProcessor sobre datasets sintéticos
+#
+# Gera um dataset sintético com mistura controlada de formatos (JPEG, PNG,
+# WebP), tamanhos (de miniaturas a 24 MP) e proporções, e o processa em cada
+# modo (padrão, fast_decode, detecção facial, smart crop) com process_image e
+# process_directory. Para cada combinação reporta imagens/s, MB/s de entrada,
+# pico de memória (RSS) e o tempo por fase (decode, resample, encode...).
+#
+# Cada medida roda num processo novo, para que o pico de RSS seja só dela.
+# Os resultados podem ser gravados como baseline JSON e comparados depois:
+#
+#   python benchmarks/bench_suite.py --save results/baseline.json
+#   (altera image_processor.py)
+#   python benchmarks/bench_suite.py --compare results/baseline.json
+#
+# Com --compare, o código de saída é 1 se algum caso ficou mais lento que a
+# tolerância. O dataset gerado fica em cache em --data-dir entre execuções.
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from image_processor import ImageProcessor
+from bench_fast_decode import make_source
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem getrusage, o pico de RSS não é medido
+    resource = None
+
+# Classes de tamanho: megapixels de cada imagem
+SIZE_CLASSES = {
+    "tiny": 0.06,
+    "small": 0.5,
+    "medium": 6.0,
+    "large": 24.0,
+}
+
+# Proporções (largura, altura) usadas em rodízio dentro de cada classe
+ASPECTS = [(1, 1), (3, 2), (2, 3), (16, 9)]
+
+# Formato: (extensão, argumentos do save)
+FORMATS = {
+    "jpeg": (".jpg", {"quality": 92}),
+    "png": (".png", {"compress_level": 6}),
+    "webp": (".webp", {"quality": 90}),
+}
+
+# Modo: argumentos do ImageProcessor
+MODES = {
+    "default": {"use_face_detection": False},
+    "fast_decode": {"use_face_detection": False, "fast_decode": True},
+    "face_detection": {"use_face_detection": True},
+    "smart_crop": {"use_face_detection": False, "smart_crop": True},
+}
+
+# Como as imagens são processadas:
+# - image: process_image em laço, no próprio processo
+# - directory: process_directory sem workers (no próprio processo)
+# - pool: process_directory com o pool supervisionado (sem tempos por fase)
+RUNNERS = ["image", "directory", "pool"]
+
+# Fases medidas e os métodos do ImageProcessor que compõem cada uma
+PHASES = {
+    "decode": ["_load_image"],
+    "upscale": ["_upscale_if_needed"],
+    "faces": ["_find_faces"],
+    "saliency": ["_find_saliency"],
+    "resample": ["_resize_and_crop", "_render_variants"],
+    "encode": ["_save_image"],
+}
+
+# Lado da imagem-base que é repetida em mosaico nas imagens maiores
+# (gerar 24 MP direto com make_source usaria gigabytes de memória)
+TILE_SIZE = 1536
+
+
+def synthetic_image(size, seed) -> Image.Image:
+    """Imagem sintética de qualquer tamanho, em mosaico de uma base com textura de foto"""
+    width, height = size
+    if width <= TILE_SIZE and height <= TILE_SIZE:
+        return make_source(size, seed=seed)
+    tile = make_source((min(width, TILE_SIZE), min(height, TILE_SIZE)), seed=seed)
+    image = Image.new("RGB", size)
+    for top in range(0, height, tile.height):
+        for left in range(0, width, tile.width):
+            image.paste(tile, (left, top))
+    return image
+
+
+def dataset_spec(formats, size_classes, per_class):
+    """Lista de (nome do arquivo, formato, tamanho) do dataset sintético"""
+    spec = []
+    for image_format in formats:
+        extension = FORMATS[image_format][0]
+        for size_class in size_classes:
+            pixels = SIZE_CLASSES[size_class] * 1e6
+            for i in range(per_class):
+                aspect_w, aspect_h = ASPECTS[i % len(ASPECTS)]
+                height = round((pixels * aspect_h / aspect_w) ** 0.5)
+                width = round(height * aspect_w / aspect_h)
+                name = f"{size_class}_{i:02d}_{aspect_w}x{aspect_h}{extension}"
+                spec.append((name, image_format, (width, height)))
+    return spec
+
+
+def generate_dataset(data_dir: Path, spec) -> Path:
+    """Gera o dataset (ou reaproveita um já gerado com o mesmo spec)"""
+    digest = hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:12]
+    dataset_dir = data_dir / f"dataset_{digest}"
+    done_marker = dataset_dir / ".complete"
+    if done_marker.exists():
+        return dataset_dir
+
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    for seed, (name, image_format, size) in enumerate(spec):
+        path = dataset_dir / name
+        if not path.exists():
+            synthetic_image(size, seed).save(path, **FORMATS[image_format][1])
+    done_marker.touch()
+    return dataset_dir
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo e dos filhos já finalizados, em MB"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def instrument(processor: ImageProcessor) -> dict:
+    """Envolve os métodos de cada fase para acumular o tempo gasto neles"""
+    timings = {phase: 0.0 for phase in PHASES}
+    for phase, methods in PHASES.items():
+        for method in methods:
+            original = getattr(processor, method)
+
+            def timed(*args, _original=original, _phase=phase, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    timings[_phase] += time.perf_counter() - start
+
+            setattr(processor, method, timed)
+    return timings
+
+
+def run_case(dataset_dir: str, mode: str, runner: str, target: int, workers: int, conn):
+    """Executa um caso num processo novo e envia as métricas pela conexão"""
+    dataset_dir = Path(dataset_dir)
+    target_size = (target, target)
+    image_files = sorted(path for path in dataset_dir.iterdir() if not path.name.startswith("."))
+    input_bytes = sum(path.stat().st_size for path in image_files)
+
+    processor = ImageProcessor(**MODES[mode])
+    timings = instrument(processor) if runner != "pool" else None
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_dir = Path(output_dir)
+        start = time.perf_counter()
+        if runner == "image":
+            failed = sum(not processor.process_image(path, processor._output_path(output_dir, path),
+                                                     target_size)
+                         for path in image_files)
+        else:
+            _, failed = processor.process_directory(
+                dataset_dir, output_dir, target_size,
+                workers=0 if runner == "directory" else workers,
+                image_files=image_files)
+        elapsed = time.perf_counter() - start
+
+    conn.send({
+        "images": len(image_files),
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_sec": len(image_files) / elapsed,
+        "mb_per_sec": input_bytes / 1e6 / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "phases_ms_per_image": ({phase: seconds * 1000 / len(image_files)
+                                 for phase, seconds in timings.items()} if timings else None),
+    })
+    conn.close()
+
+
+def measure(dataset_dir: Path, mode: str, runner: str, target: int, workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=run_case,
+                              args=(str(dataset_dir), mode, runner, target, workers, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        raise RuntimeError(f"Caso {mode}/{runner} terminou sem resultado "
+                           f"(código {process.exitcode})") from None
+    process.join()
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Imprime a variação de imagens/s em relação à baseline; False se houve regressão"""
+    ok = True
+    print(f"\nComparação com a baseline (tolerância {tolerance:.0%})")
+    print(f"{'caso':<28}{'baseline (img/s)':>18}{'atual (img/s)':>16}{'variação':>11}")
+    for case, result in results.items():
+        previous = baseline.get("results", {}).get(case)
+        if previous is None:
+            print(f"{case:<28}{'-':>18}{result['images_per_sec']:>16.2f}{'novo':>11}")
+            continue
+        change = result["images_per_sec"] / previous["images_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSÃO"
+            ok = False
+        print(f"{case:<28}{previous['images_per_sec']:>18.2f}{result['images_per_sec']:>16.2f}"
+              f"{change:>+10.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmark do ImageProcessor")
+    parser.add_argument("--formats", default="jpeg,png,webp", help="Formatos das origens")
+    parser.add_argument("--sizes", default="tiny,small,medium",
+                        help=f"Classes de tamanho ({', '.join(SIZE_CLASSES)}; large = 24 MP)")
+    parser.add_argument("--per-class", type=int, default=2,
+                        help="Imagens por formato e classe de tamanho")
+    parser.add_argument("--modes", default=",".join(MODES), help="Modos do ImageProcessor")
+    parser.add_argument("--runners", default=",".join(RUNNERS), help="Formas de execução")
+    parser.add_argument("--target", type=int, default=1024, help="Lado do target quadrado")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="Workers do runner pool")
+    parser.add_argument("--data-dir", type=Path,
+                        default=Path(tempfile.gettempdir()) / "lora_manager_bench",
+                        help="Onde o dataset sintético é gerado e mantido em cache")
+    parser.add_argument("--save", type=Path, help="Grava os resultados como baseline JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON para comparação")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Queda máxima aceita em imagens/s na comparação")
+    args = parser.parse_args()
+
+    formats = args.formats.split(",")
+    size_classes = args.sizes.split(",")
+    spec = dataset_spec(formats, size_classes, args.per_class)
+    print(f"Gerando dataset: {len(spec)} imagens ({args.formats}; {args.sizes})...")
+    dataset_dir = generate_dataset(args.data_dir, spec)
+
+    results = {}
+    print(f"\n{'caso':<28}{'img/s':>8}{'MB/s':>8}{'RSS (MB)':>10}  fases (ms/img)")
+    for mode in args.modes.split(","):
+        for runner in args.runners.split(","):
+            case = f"{mode}/{runner}"
+            result = measure(dataset_dir, mode, runner, args.target, args.workers)
+            results[case] = result
+            rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+            phases = result["phases_ms_per_image"]
+            phases = " ".join(f"{phase}={ms:.1f}" for phase, ms in phases.items() if round(ms, 1) > 0) \
+                if phases else "-"
+            print(f"{case:<28}{result['images_per_sec']:>8.2f}{result['mb_per_sec']:>8.1f}"
+                  f"{rss:>10}  {phases}")
+            if result["failed"]:
+                print(f"  {result['failed']} imagem(ns) falharam")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "target": args.target,
+            "workers": args.workers,
+            "dataset": spec,
+        },
+        "results": results,
+    }
+
+    ok = True
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("dataset") != json.loads(json.dumps(spec)):
+            print("\nAviso: a baseline foi medida com outro dataset")
+        ok = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nResultados gravados em {args.save}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,14 @@ import torch
 from transformers import AutoProcessor, AutoModelForCausalLM
 from PIL import Image
 from pathlib import Path
-from typing import Tuple, Optional, Callable
-import gc
+from typing import List, Tuple, Optional, Callable
 from unittest.mock import patch
 from transformers.dynamic_module_utils import get_imports
 import warnings
 import transformers
+from image_pipeline import iter_prefetch, iter_batches
+from concept_folders import caption_paths
+from memory_policy import MemoryPolicy, release_memory
 transformers.utils.TRUST_REMOTE_CODE = True
 
 
@@ -31,10 +33,26 @@ def fixed_get_imports(filename: str | os.PathLike) -> list[str]:
     return imports
 
 class CaptionGenerator:
-    def __init__(self, model_version="base"):
+    # Tarefa do Florence-2 usada nos captions
+    TASK_PROMPT = '<MORE_DETAILED_CAPTION>'
+
+    def __init__(self, model_version="base", batch_size: int = 1,
+                 memory_policy: Optional[MemoryPolicy] = None):
+        """
+        Args:
+            model_version: Variante do Florence-2 ("base" ou "large").
+            batch_size: Imagens por chamada de generate em process_directory.
+                Lotes maiores diluem o custo fixo de cada chamada e ocupam
+                melhor a GPU/CPU, ao custo de mais memória (o beam search
+                multiplica o lote por num_beams).
+            memory_policy: Quando liberar a memória entre os lotes (padrão:
+                só quando a memória alocada na GPU passa do limite).
+        """
         self.processor = None
         self.model = None
         self.model_version = model_version
+        self.batch_size = max(1, batch_size)
+        self.memory_policy = memory_policy or MemoryPolicy()
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
     def _init_model(self):
@@ -62,6 +80,74 @@ class CaptionGenerator:
             
             self.model.eval()
     
+    def model_key(self) -> tuple:
+        """Identificação do modelo carregado (ver model_registry)"""
+        return ("florence2", self.model_version, "float16", self.device)
+    
+    @staticmethod
+    def _load_image(image_path: Path) -> Image.Image:
+        """Abre a imagem em RGB, reduzida se necessário"""
+        image = Image.open(image_path).convert('RGB')
+        
+        # Redimensiona se necessário
+        max_size = 1024
+        if max(image.size) > max_size:
+            ratio = max_size / max(image.size)
+            new_size = tuple(int(dim * ratio) for dim in image.size)
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        return image
+    
+    def _generate(self, images: List[Image.Image]) -> List[str]:
+        """
+        Gera os captions de um lote de imagens numa única chamada de generate.
+        O processor redimensiona todas as imagens para a mesma entrada do
+        encoder visual, e os prompts são completados com padding (a
+        attention_mask marca o que é padding).
+        """
+        self._init_model()
+        
+        # Prepara inputs
+        task_prompt = self.TASK_PROMPT
+        inputs = self.processor(
+            text=[task_prompt] * len(images),
+            images=images,
+            return_tensors="pt",
+            padding=True
+        )
+        
+        # Move para GPU com tipos corretos
+        inputs['input_ids'] = inputs['input_ids'].to(self.device, dtype=torch.long)
+        inputs['attention_mask'] = inputs['attention_mask'].to(self.device, dtype=torch.long)
+        inputs['pixel_values'] = inputs['pixel_values'].to(self.device, dtype=torch.float16)
+        
+        # Gera captions
+        with torch.no_grad():
+            generated_ids = self.model.generate(
+                input_ids=inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                pixel_values=inputs['pixel_values'],
+                max_new_tokens=512,
+                num_beams=5,
+                do_sample=False,
+                length_penalty=1.0,
+                repetition_penalty=1.5
+            )
+            
+            generated_texts = self.processor.batch_decode(generated_ids, skip_special_tokens=False)
+            captions = []
+            for image, generated_text in zip(images, generated_texts):
+                parsed_answer = self.processor.post_process_generation(
+                    generated_text,
+                    task=task_prompt,
+                    image_size=(image.width, image.height)
+                )
+                captions.append(parsed_answer[task_prompt])
+        
+        del inputs, generated_ids
+        self.memory_policy.step(len(images))
+        
+        return captions
+    
     def generate_caption(self, image_path: Path, 
                         progress_callback: Optional[Callable[[str], None]] = None) -> str:
         """
@@ -75,58 +161,7 @@ class CaptionGenerator:
             str: Caption gerado
         """
         try:
-            self._init_model()
-            
-            # Abre e processa a imagem
-            image = Image.open(image_path).convert('RGB')
-            
-            # Redimensiona se necessário
-            max_size = 1024
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Prepara inputs
-            task_prompt = '<MORE_DETAILED_CAPTION>'
-            inputs = self.processor(
-                text=task_prompt,
-                images=image,
-                return_tensors="pt",
-                padding=True
-            )
-            
-            # Move para GPU com tipos corretos
-            inputs['input_ids'] = inputs['input_ids'].to(self.device, dtype=torch.long)
-            inputs['attention_mask'] = inputs['attention_mask'].to(self.device, dtype=torch.long)
-            inputs['pixel_values'] = inputs['pixel_values'].to(self.device, dtype=torch.float16)
-            
-            # Gera caption
-            with torch.no_grad():
-                generated_ids = self.model.generate(
-                    input_ids=inputs['input_ids'],
-                    attention_mask=inputs['attention_mask'],
-                    pixel_values=inputs['pixel_values'],
-                    max_new_tokens=512,
-                    num_beams=5,
-                    do_sample=False,
-                    length_penalty=1.0,
-                    repetition_penalty=1.5
-                )
-                
-                generated_text = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-                parsed_answer = self.processor.post_process_generation(
-                    generated_text,
-                    task=task_prompt,
-                    image_size=(image.width, image.height)
-                )
-                caption = parsed_answer[task_prompt]
-            
-            # Limpa memória GPU
-            del inputs, generated_ids
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                gc.collect()
+            caption = self._generate([self._load_image(image_path)])[0]
             
             if progress_callback:
                 progress_callback(f"Generated caption for {image_path.name}")
@@ -138,14 +173,64 @@ class CaptionGenerator:
                 progress_callback(f"Error processing {image_path.name}: {str(e)}")
             raise
     
+    def generate_captions(self, image_paths: List[Path]) -> List[Tuple[Path, Optional[str], Optional[Exception]]]:
+        """
+        Gera os captions de um lote de imagens numa única chamada de generate.
+        Se o lote falhar (ex.: falta de memória), cada imagem é tentada de novo
+        sozinha, para que só as imagens com problema falhem.
+        
+        Returns:
+            Lista de (imagem, caption, erro) na ordem de image_paths; erro é
+            None em caso de sucesso.
+        """
+        loaded = []
+        for image_path in image_paths:
+            try:
+                loaded.append((image_path, self._load_image(image_path), None))
+            except Exception as e:
+                loaded.append((image_path, None, e))
+        return self._caption_batch(loaded)
+    
+    def _caption_batch(self, loaded: List[Tuple[Path, Optional[Image.Image], Optional[Exception]]]
+                       ) -> List[Tuple[Path, Optional[str], Optional[Exception]]]:
+        """generate_captions para imagens já carregadas: (imagem, PIL, erro de leitura)"""
+        results = {}
+        images = {}
+        for image_path, image, error in loaded:
+            if error is not None:
+                results[image_path] = (image_path, None, error)
+            else:
+                images[image_path] = image
+        
+        if images:
+            try:
+                captions = self._generate(list(images.values()))
+                for image_path, caption in zip(images, captions):
+                    results[image_path] = (image_path, caption, None)
+            except Exception:
+                # Libera o que sobrou do lote antes das tentativas individuais
+                release_memory()
+                for image_path, image in images.items():
+                    try:
+                        results[image_path] = (image_path, self._generate([image])[0], None)
+                    except Exception as e:
+                        results[image_path] = (image_path, None, e)
+        
+        return [results[image_path] for image_path, _, _ in loaded]
+    
     def process_directory(self, images_dir: Path, captions_dir: Path,
                          prefix: str = "",
                          progress_callback: Optional[Callable[[str, int], None]] = None) -> Tuple[int, int]:
         """
-        Processa todas as imagens em um diretório
+        Processa todas as imagens em um diretório, em lotes de batch_size
+        imagens. As imagens do próximo lote são abertas e redimensionadas em
+        threads de fundo enquanto o modelo processa o lote atual. O progresso
+        e as falhas continuam sendo reportados por imagem, junto com a vazão
+        e o uso de memória (ver MemoryPolicy.stats).
         
         Args:
-            images_dir: Diretório com as imagens
+            images_dir: Diretório com as imagens (e subpastas de conceitos,
+                cada uma com os captions na pasta equivalente dentro dela)
             captions_dir: Diretório para salvar os captions
             prefix: Prefixo a ser adicionado no início de cada caption
             progress_callback: Função para reportar progresso (mensagem, valor)
@@ -155,39 +240,48 @@ class CaptionGenerator:
         processed = 0
         failed = 0
         
-        # Lista todas as imagens
-        image_files = []
-        for ext in ('*.jpg', '*.jpeg', '*.png'):
-            image_files.extend(images_dir.glob(ext))
+        # Imagens da raiz e das subpastas de conceitos (ex.: 10_alice/, ver
+        # concept_folders.caption_paths), cada uma com o seu arquivo de caption
+        caption_files = caption_paths(images_dir, captions_dir)
+        for caption_dir in {path.parent for path in caption_files.values()}:
+            caption_dir.mkdir(parents=True, exist_ok=True)
+        image_files = list(caption_files)
         
         total_files = len(image_files)
         
-        for idx, img_path in enumerate(image_files):
-            try:
-                # Gera caption
-                caption = self.generate_caption(img_path)
-                
-                # Adiciona prefixo se especificado
-                if prefix:
-                    caption = f"{prefix} {caption}"
-                
-                # Salva caption
-                caption_path = captions_dir / f"{img_path.stem}.txt"
-                caption_path.write_text(caption)
-                
-                processed += 1
-                
-                if progress_callback:
-                    progress_callback(f"Processing {img_path.name}...", int((idx + 1) * 100 / total_files))
-                
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(f"Failed to process {img_path.name}: {str(e)}", -1)
-                failed += 1
-            
-            # Limpa memória GPU periodicamente
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                gc.collect()
+        done = 0
+        if image_files:
+            # A linha de base da política de memória é medida com os pesos
+            # já na GPU
+            self._init_model()
+        
+        self.memory_policy.reset()
+        loaded = iter_prefetch(image_files, self._load_image, depth=2 * self.batch_size)
+        for batch in iter_batches(loaded, self.batch_size):
+            results = self._caption_batch(batch)
+            stats = self.memory_policy.stats()
+            for img_path, caption, error in results:
+                done += 1
+                try:
+                    if error is not None:
+                        raise error
+                    
+                    # Adiciona prefixo se especificado
+                    if prefix:
+                        caption = f"{prefix} {caption}"
+                    
+                    # Salva caption
+                    caption_files[img_path].write_text(caption)
+                    
+                    processed += 1
+                    
+                    if progress_callback:
+                        progress_callback(f"Processing {img_path.name}... ({stats})",
+                                          int(done * 100 / total_files))
+                    
+                except Exception as e:
+                    if progress_callback:
+                        progress_callback(f"Failed to process {img_path.name}: {str(e)}", -1)
+                    failed += 1
         
         return processed, failed
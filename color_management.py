@@ -0,0 +1,96 @@
+import io
+import hashlib
+import threading
+from PIL import Image, ImageCms
+from typing import Optional
+
+# Modo do Pillow correspondente ao espaço de cor declarado no perfil ICC
+_PROFILE_MODES = {"RGB": "RGB", "GRAY": "L", "CMYK": "CMYK"}
+
+_SRGB_PROFILE = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+
+# Transformações já montadas neste processo, por hash do perfil de origem.
+# None marca perfis que não precisam de conversão (sRGB) ou que não puderam
+# ser lidos. As transformações do LittleCMS não são serializáveis, então
+# cada worker monta as suas uma vez e as reaproveita até o fim do pool
+_transforms = {}
+_transforms_lock = threading.Lock()
+
+
+def _profile_hash(icc_profile: bytes) -> str:
+    return hashlib.sha256(icc_profile).hexdigest()
+
+
+def _build_transform(icc_profile: bytes):
+    """Transformação do perfil de origem para sRGB (None se não for necessária)"""
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+    except (OSError, ImageCms.PyCMSError):
+        # Perfil corrompido: a imagem segue sem gerenciamento de cor
+        return None
+    color_space = profile.profile.xcolor_space.strip()
+    mode = _PROFILE_MODES.get(color_space)
+    if mode is None:
+        return None
+    if mode == "RGB" and "srgb" in (profile.profile.profile_description or "").lower():
+        return None
+    try:
+        transform = ImageCms.buildTransform(profile, _SRGB_PROFILE, mode, "RGB")
+    except ImageCms.PyCMSError:
+        return None
+    return mode, transform
+
+
+def _get_transform(icc_profile: bytes):
+    key = _profile_hash(icc_profile)
+    if key not in _transforms:
+        transform = _build_transform(icc_profile)
+        with _transforms_lock:
+            _transforms.setdefault(key, transform)
+    return _transforms[key]
+
+
+def is_srgb(icc_profile: Optional[bytes]) -> bool:
+    """Se a imagem com esse perfil embutido já está em sRGB (ou não tem perfil)"""
+    return not icc_profile or _get_transform(icc_profile) is None
+
+
+def to_srgb(pil_image: Image.Image, icc_profile: Optional[bytes] = None) -> Image.Image:
+    """
+    Converte a imagem para RGB em sRGB, aplicando o perfil ICC embutido
+    (Display P3, Adobe RGB, CMYK...). Sem perfil, com perfil sRGB ou com
+    perfil ilegível, equivale a convert("RGB").
+
+    Args:
+        pil_image: Imagem em qualquer modo.
+        icc_profile: Perfil a aplicar (padrão: o de pil_image.info).
+    """
+    icc_profile = icc_profile or pil_image.info.get("icc_profile")
+    transform = _get_transform(icc_profile) if icc_profile else None
+    if transform is None:
+        return pil_image if pil_image.mode == "RGB" else pil_image.convert("RGB")
+
+    mode, transform = transform
+    if pil_image.mode != mode:
+        pil_image = pil_image.convert(mode)
+    converted = ImageCms.applyTransform(pil_image, transform)
+    # Os pixels agora são sRGB: o perfil original não pode ir para a saída
+    converted.info.pop("icc_profile", None)
+    return converted
+
+
+def to_rgb(pil_image: Image.Image) -> Image.Image:
+    """
+    Conversão para RGB na decodificação. Com perfil RGB (Display P3, Adobe
+    RGB), os pixels continuam no espaço de cor da origem e o perfil segue no
+    info (resize e crop o preservam), para que to_srgb o aplique na imagem
+    final: a transformação custa por pixel, e no tamanho da saída ela fica
+    desprezível. Como o resample já é feito sobre valores com gamma, a ordem
+    não muda o resultado de forma perceptível. Perfis CMYK e de cinza são
+    aplicados aqui, já que o convert("RGB") direto perderia a informação.
+    """
+    icc_profile = pil_image.info.get("icc_profile")
+    transform = _get_transform(icc_profile) if icc_profile else None
+    if transform is not None and transform[0] != "RGB":
+        return to_srgb(pil_image, icc_profile)
+    return pil_image.convert("RGB")
@@ -0,0 +1,114 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dataset_manifest import DatasetManifest
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".avif"}
+
+# Pastas no padrão do kohya: <repetições>_<class tokens> (ex.: 10_alice)
+_KOHYA_FOLDER = re.compile(r"^(\d+)_(.+)$")
+
+
+@dataclass
+class ConceptFolder:
+    """Pasta com imagens de um dataset com vários conceitos"""
+    path: Path
+    # Caminho relativo à raiz do dataset (Path(".") para a própria raiz)
+    relative: Path
+    images: List[Path]
+
+    @property
+    def repeats_and_tokens(self) -> Tuple[Optional[int], Optional[str]]:
+        return parse_concept_name(self.path.name) if self.relative != Path(".") else (None, None)
+
+
+def parse_concept_name(name: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Repetições e class tokens do nome de uma pasta no padrão do kohya
+    (ex.: "10_alice" -> (10, "alice")); (None, None) fora do padrão.
+    """
+    match = _KOHYA_FOLDER.match(name)
+    if match is None:
+        return None, None
+    return int(match.group(1)), match.group(2)
+
+
+def list_images(directory: Path) -> List[Path]:
+    """Imagens suportadas diretamente em directory (sem subpastas), em ordem"""
+    return sorted(path for path in Path(directory).iterdir()
+                  if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def find_concept_folders(root: Path, exclude: Iterable[Path] = (),
+                         skip_outputs: bool = False) -> List[ConceptFolder]:
+    """
+    Pastas com imagens em root e em todas as subpastas, em ordem.
+
+    Args:
+        root: Raiz do dataset.
+        exclude: Pastas ignoradas junto com as subpastas (ex.: a de saída).
+        skip_outputs: Se True, ignora também as pastas geradas por este
+            processamento (as que têm manifesto), como as de outras resoluções.
+    """
+    root = Path(root)
+    excluded = {Path(path).resolve() for path in exclude}
+    folders = []
+
+    def visit(directory: Path):
+        images = list_images(directory)
+        if images:
+            folders.append(ConceptFolder(directory, directory.relative_to(root), images))
+        for child in sorted(path for path in directory.iterdir() if path.is_dir()):
+            # Pastas ocultas guardam caches (ex.: .sr_cache), não imagens do dataset
+            if child.name.startswith(".") or child.resolve() in excluded:
+                continue
+            if skip_outputs and (child / DatasetManifest.FILENAME).exists():
+                continue
+            visit(child)
+
+    visit(root)
+    return folders
+
+
+def caption_paths(images_dir: Path, captions_dir: Path) -> Dict[Path, Path]:
+    """
+    Arquivo de caption (.txt) de cada imagem de images_dir e das subpastas
+    (as mesmas pastas de find_concept_folders e dataset_subsets), em ordem.
+    As imagens da raiz usam captions_dir; as de uma subpasta, a pasta
+    equivalente dentro dela (cropped_images/captions/x.txt e
+    cropped_images/10_alice/captions/y.txt), para que cada subset tenha os
+    seus captions. Se captions_dir não estiver dentro de images_dir, a
+    estrutura das subpastas é espelhada nele.
+    """
+    images_dir = Path(images_dir)
+    captions_dir = Path(captions_dir)
+    try:
+        inner = captions_dir.relative_to(images_dir)
+    except ValueError:
+        inner = None
+
+    paths = {}
+    for folder in find_concept_folders(images_dir, exclude=[captions_dir]):
+        folder_captions = folder.path / inner if inner is not None else captions_dir / folder.relative
+        for image_path in folder.images:
+            paths[image_path] = folder_captions / f"{image_path.stem}.txt"
+    return paths
+
+
+def dataset_subsets(cropped_dir: Path, num_repeats: int, class_tokens: str) -> List[dict]:
+    """
+    Subsets do dataset.toml para um diretório processado, um por pasta com
+    imagens. Pastas no padrão do kohya (10_alice) usam as repetições e os
+    class tokens do nome; as demais, os valores informados.
+    """
+    subsets = []
+    for folder in find_concept_folders(cropped_dir):
+        repeats, tokens = folder.repeats_and_tokens
+        subsets.append({
+            "image_dir": str(folder.path.resolve()),
+            "class_tokens": tokens if tokens is not None else class_tokens,
+            "num_repeats": repeats if repeats is not None else num_repeats,
+        })
+    return subsets
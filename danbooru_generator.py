@@ -9,13 +9,18 @@ import numpy as np
 from dataclasses import dataclass
 from huggingface_hub import hf_hub_download
 from timm.data import create_transform, resolve_data_config
+from image_pipeline import iter_prefetch, iter_batches
+from concept_folders import caption_paths
+from memory_policy import MemoryPolicy, release_memory
 
 @dataclass
 class LabelData:
-    names: list[str]
-    rating: list[np.int64]
-    general: list[np.int64]
-    character: list[np.int64]
+    # Nomes de todas as tags, na ordem das saídas do modelo
+    names: np.ndarray
+    # Índices das tags de cada categoria
+    rating: np.ndarray
+    general: np.ndarray
+    character: np.ndarray
 
 class DanbooruGenerator:
     MODEL_REPOS = {
@@ -24,7 +29,8 @@ class DanbooruGenerator:
         "convnext": "SmilingWolf/wd-convnext-tagger-v3",
     }
     
-    def __init__(self, model_type="vit", general_threshold=0.35, character_threshold=0.75):
+    def __init__(self, model_type="vit", general_threshold=0.35, character_threshold=0.75,
+                 batch_size: int = 8, memory_policy: Optional[MemoryPolicy] = None):
         """
         Inicializa o WD14 Tagger
         
@@ -32,6 +38,9 @@ class DanbooruGenerator:
             model_type: Tipo de modelo ('vit', 'swinv2' ou 'convnext')
             general_threshold: Limiar para tags gerais
             character_threshold: Limiar para tags de personagens
+            batch_size: Imagens por forward do modelo em process_directory
+            memory_policy: Quando liberar a memória entre os lotes (padrão:
+                só quando a memória alocada na GPU passa do limite)
         """
         if model_type not in self.MODEL_REPOS:
             raise ValueError(f"Modelo deve ser um de: {list(self.MODEL_REPOS.keys())}")
@@ -42,19 +51,26 @@ class DanbooruGenerator:
         self.labels = None
         self.general_threshold = general_threshold
         self.character_threshold = character_threshold
+        self.batch_size = max(1, batch_size)
+        self.memory_policy = memory_policy or MemoryPolicy()
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         
+    def model_key(self) -> tuple:
+        """Identificação do modelo carregado (ver model_registry)"""
+        return ("danbooru", self.model_type, "float32", str(self.device))
+    
     def _load_labels(self) -> LabelData:
         """Carrega e organiza as tags do modelo"""
         repo_id = self.MODEL_REPOS[self.model_type]
         csv_path = hf_hub_download(repo_id=repo_id, filename="selected_tags.csv")
         
         df = pd.read_csv(csv_path, usecols=["name", "category"])
+        categories = df["category"].to_numpy()
         return LabelData(
-            names=df["name"].tolist(),
-            rating=list(np.where(df["category"] == 9)[0]),
-            general=list(np.where(df["category"] == 0)[0]),
-            character=list(np.where(df["category"] == 4)[0])
+            names=df["name"].to_numpy(dtype=object),
+            rating=np.flatnonzero(categories == 9),
+            general=np.flatnonzero(categories == 0),
+            character=np.flatnonzero(categories == 4)
         )
     
     def _ensure_rgb(self, image: Image.Image) -> Image.Image:
@@ -94,38 +110,69 @@ class DanbooruGenerator:
             # Carrega as labels
             self.labels = self._load_labels()
     
-    def _process_tags(self, probs: torch.Tensor) -> Tuple[str, Dict, Dict, Dict]:
+    def _select_tags(self, probs: np.ndarray, indices: np.ndarray, mask: np.ndarray) -> Dict[str, float]:
+        """
+        Tags de uma categoria que passaram no limiar (mask, alinhada com
+        indices), ordenadas da maior para a menor probabilidade. Só as
+        sobreviventes são ordenadas; empates mantêm a ordem das labels.
         """
-        Processa as probabilidades em tags organizadas
+        survivors = indices[mask]
+        scores = probs[survivors]
+        order = np.argsort(-scores, kind="stable")
+        return dict(zip(self.labels.names[survivors[order]].tolist(), scores[order].tolist()))
+    
+    def _process_batch(self, probs: np.ndarray) -> List[Tuple[str, Dict, Dict, Dict]]:
+        """
+        Processa as probabilidades de um lote (imagens x labels) em tags
+        organizadas. Os limiares são aplicados de uma vez ao lote inteiro,
+        com máscaras sobre os índices de cada categoria.
         
         Returns:
-            Tuple contendo:
+            Lista, por imagem, de tuplas contendo:
             - caption: string com todas as tags
             - ratings: dict com ratings
             - char_tags: dict com tags de personagens
             - general_tags: dict com tags gerais
         """
-        probs = list(zip(self.labels.names, probs.numpy()))
-        
-        # Processa ratings
-        rating_tags = dict([probs[i] for i in self.labels.rating])
+        labels = self.labels
+        general_masks = probs[:, labels.general] > self.general_threshold
+        char_masks = probs[:, labels.character] > self.character_threshold
         
-        # Processa tags gerais
-        general_tags = [probs[i] for i in self.labels.general]
-        general_tags = dict([x for x in general_tags if x[1] > self.general_threshold])
-        general_tags = dict(sorted(general_tags.items(), key=lambda x: x[1], reverse=True))
-        
-        # Processa tags de personagens
-        char_tags = [probs[i] for i in self.labels.character]
-        char_tags = dict([x for x in char_tags if x[1] > self.character_threshold])
-        char_tags = dict(sorted(char_tags.items(), key=lambda x: x[1], reverse=True))
-        
-        # Combina as tags num caption
-        combined_names = list(general_tags.keys())
-        combined_names.extend(list(char_tags.keys()))
-        caption = ", ".join(combined_names)
+        results = []
+        for row, general_mask, char_mask in zip(probs, general_masks, char_masks):
+            rating_tags = dict(zip(labels.names[labels.rating].tolist(), row[labels.rating].tolist()))
+            general_tags = self._select_tags(row, labels.general, general_mask)
+            char_tags = self._select_tags(row, labels.character, char_mask)
+            
+            # Combina as tags num caption
+            caption = ", ".join([*general_tags, *char_tags])
+            results.append((caption, rating_tags, char_tags, general_tags))
+        return results
+    
+    def _process_tags(self, probs: np.ndarray) -> Tuple[str, Dict, Dict, Dict]:
+        """Processa as probabilidades de uma imagem (ver _process_batch)"""
+        return self._process_batch(probs[np.newaxis])[0]
+    
+    def _load_image(self, image_path: str | Path) -> torch.Tensor:
+        """Carrega e pré-processa a imagem (tensor C x H x W, em BGR)"""
+        image = Image.open(image_path)
+        image = self._ensure_rgb(image)
+        image = self._pad_square(image)
         
-        return caption, rating_tags, char_tags, general_tags
+        # Aplica as transformações do modelo
+        inputs = self.transform(image)
+        return inputs[[2, 1, 0]]  # RGB para BGR
+    
+    def _infer(self, inputs: List[torch.Tensor]) -> np.ndarray:
+        """Probabilidades (imagens x labels) de um lote numa única passada do modelo"""
+        batch = torch.stack(inputs).to(self.device)
+        with torch.inference_mode():
+            outputs = self.model(batch)
+            outputs = F.sigmoid(outputs)
+        probs = outputs.float().cpu().numpy()
+        del batch, outputs
+        self.memory_policy.step(len(inputs))
+        return probs
     
     def generate_tags(self, image_path: str | Path,
                      progress_callback: Optional[Callable[[str], None]] = None) -> str:
@@ -142,24 +189,9 @@ class DanbooruGenerator:
         try:
             self._init_model()
             
-            # Carrega e pré-processa a imagem
-            image = Image.open(image_path)
-            image = self._ensure_rgb(image)
-            image = self._pad_square(image)
-            
-            # Aplica as transformações do modelo
-            inputs = self.transform(image).unsqueeze(0)
-            inputs = inputs[:, [2, 1, 0]]  # RGB para BGR
-            inputs = inputs.to(self.device)
-            
-            # Faz a inferência
-            with torch.inference_mode():
-                outputs = self.model(inputs)
-                outputs = F.sigmoid(outputs)
-                outputs = outputs.cpu()
-            
-            # Processa as tags
-            caption, ratings, char_tags, general_tags = self._process_tags(outputs.squeeze(0))
+            # Faz a inferência e processa as tags
+            probs = self._infer([self._load_image(image_path)])
+            caption, ratings, char_tags, general_tags = self._process_tags(probs[0])
             
             if progress_callback:
                 progress_callback(f"Generated tags for {image_path}")
@@ -171,14 +203,68 @@ class DanbooruGenerator:
                 progress_callback(f"Error processing {image_path}: {str(e)}")
             raise
     
+    def generate_tags_batch(self, image_paths: List[Path]) -> List[Tuple[Path, Optional[str], Optional[Exception]]]:
+        """
+        Gera as tags de um lote de imagens numa única passada do modelo. Se
+        o lote falhar, cada imagem é tentada de novo sozinha, para que só as
+        imagens com problema falhem.
+        
+        Returns:
+            Lista de (imagem, tags, erro) na ordem de image_paths; erro é
+            None em caso de sucesso.
+        """
+        self._init_model()
+        
+        loaded = []
+        for image_path in image_paths:
+            try:
+                loaded.append((image_path, self._load_image(image_path), None))
+            except Exception as e:
+                loaded.append((image_path, None, e))
+        return self._tag_batch(loaded)
+    
+    def _tag_batch(self, loaded: List[Tuple[Path, Optional[torch.Tensor], Optional[Exception]]]
+                   ) -> List[Tuple[Path, Optional[str], Optional[Exception]]]:
+        """generate_tags_batch para imagens já pré-processadas: (imagem, tensor, erro de leitura)"""
+        results = {}
+        inputs = {}
+        for image_path, tensor, error in loaded:
+            if error is not None:
+                results[image_path] = (image_path, None, error)
+            else:
+                inputs[image_path] = tensor
+        
+        if inputs:
+            try:
+                batch_tags = self._process_batch(self._infer(list(inputs.values())))
+                for image_path, (caption, _, _, _) in zip(inputs, batch_tags):
+                    results[image_path] = (image_path, caption, None)
+            except Exception:
+                # Libera o que sobrou do lote antes das tentativas individuais
+                release_memory()
+                for image_path, tensor in inputs.items():
+                    try:
+                        caption = self._process_tags(self._infer([tensor])[0])[0]
+                        results[image_path] = (image_path, caption, None)
+                    except Exception as e:
+                        results[image_path] = (image_path, None, e)
+        
+        return [results[image_path] for image_path, _, _ in loaded]
+    
     def process_directory(self, images_dir: Path, tags_dir: Path,
                          prefix: str = "",
                          progress_callback: Optional[Callable[[str, int], None]] = None) -> Tuple[int, int]:
         """
-        Processa todas as imagens em um diretório
+        Processa todas as imagens em um diretório, em lotes de batch_size
+        imagens. As imagens do próximo lote são abertas e pré-processadas
+        (pad e transform do modelo) em threads de fundo enquanto o modelo
+        processa o lote atual. O progresso e as falhas continuam sendo
+        reportados por imagem, junto com a vazão e o uso de memória (ver
+        MemoryPolicy.stats).
         
         Args:
-            images_dir: Diretório com as imagens
+            images_dir: Diretório com as imagens (e subpastas de conceitos,
+                cada uma com os captions na pasta equivalente dentro dela)
             tags_dir: Diretório para salvar os arquivos de tags
             prefix: Prefixo opcional para adicionar às tags
             progress_callback: Função para reportar progresso
@@ -188,35 +274,47 @@ class DanbooruGenerator:
         processed = 0
         failed = 0
         
-        # Lista todas as imagens
-        image_files = []
-        for ext in ('*.jpg', '*.jpeg', '*.png'):
-            image_files.extend(Path(images_dir).glob(ext))
+        # Imagens da raiz e das subpastas de conceitos (ex.: 10_alice/, ver
+        # concept_folders.caption_paths), cada uma com o seu arquivo de caption
+        caption_files = caption_paths(Path(images_dir), tags_dir)
+        for caption_dir in {path.parent for path in caption_files.values()}:
+            caption_dir.mkdir(parents=True, exist_ok=True)
+        image_files = list(caption_files)
         
         total_files = len(image_files)
         
-        for idx, img_path in enumerate(image_files):
-            try:
-                # Gera tags
-                tags = self.generate_tags(img_path)
-                
-                # Adiciona prefixo se especificado
-                if prefix:
-                    tags = f"{prefix} {tags}"
-                
-                # Salva tags
-                tags_path = tags_dir / f"{img_path.stem}.txt"
-                tags_path.write_text(tags)
-                
-                processed += 1
-                
-                if progress_callback:
-                    progress_callback(f"Processing {img_path.name}...", 
-                                   int((idx + 1) * 100 / total_files))
-                
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(f"Failed to process {img_path.name}: {str(e)}", -1)
-                failed += 1
+        if image_files:
+            # O pré-processamento depende do transform do modelo
+            self._init_model()
+        
+        done = 0
+        self.memory_policy.reset()
+        loaded = iter_prefetch(image_files, self._load_image, depth=2 * self.batch_size)
+        for batch in iter_batches(loaded, self.batch_size):
+            results = self._tag_batch(batch)
+            stats = self.memory_policy.stats()
+            for img_path, tags, error in results:
+                done += 1
+                try:
+                    if error is not None:
+                        raise error
+                    
+                    # Adiciona prefixo se especificado
+                    if prefix:
+                        tags = f"{prefix} {tags}"
+                    
+                    # Salva tags
+                    caption_files[img_path].write_text(tags)
+                    
+                    processed += 1
+                    
+                    if progress_callback:
+                        progress_callback(f"Processing {img_path.name}... ({stats})", 
+                                       int(done * 100 / total_files))
+                    
+                except Exception as e:
+                    if progress_callback:
+                        progress_callback(f"Failed to process {img_path.name}: {str(e)}", -1)
+                    failed += 1
         
-        return processed, failed
\ No newline at end of file
+        return processed, failed
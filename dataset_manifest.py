@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+
+class DatasetManifest:
+    """
+    Registro das saídas geradas a partir de cada imagem de origem.
+
+    Cada entrada é indexada pelo caminho absoluto da origem e guarda a
+    "impressão digital" do arquivo (tamanho, mtime e, opcionalmente, hash do
+    conteúdo), os parâmetros de processamento usados e o nome da saída.
+    Com isso o processamento pode pular as imagens que não mudaram.
+
+    Cada entrada também tem um cache de dados derivados apenas da origem
+    (ex.: rostos detectados), que continua válido quando os parâmetros de
+    processamento mudam e é descartado quando o arquivo muda.
+    """
+
+    FILENAME = ".manifest.json"
+    VERSION = 1
+
+    def __init__(self, path: Path, use_content_hash: bool = False):
+        self.path = Path(path)
+        self.use_content_hash = use_content_hash
+        self.entries = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, output_dir: Path, use_content_hash: bool = False) -> "DatasetManifest":
+        """Carrega o manifesto de um diretório de saída (ou cria um vazio)"""
+        manifest = cls(Path(output_dir) / cls.FILENAME, use_content_hash)
+        if manifest.path.exists():
+            try:
+                data = json.loads(manifest.path.read_text(encoding="utf-8"))
+                if data.get("version") == cls.VERSION:
+                    manifest.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                # Manifesto corrompido: começa do zero, as saídas serão refeitas
+                manifest.entries = {}
+        return manifest
+
+    @staticmethod
+    def _key(source: Path) -> str:
+        return str(Path(source).resolve())
+
+    @staticmethod
+    def _hash_file(source: Path) -> str:
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def fingerprint(self, source: Path) -> dict:
+        """Retorna a impressão digital atual de um arquivo de origem"""
+        stat = Path(source).stat()
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if self.use_content_hash:
+            fingerprint["sha256"] = self._hash_file(source)
+        return fingerprint
+
+    @staticmethod
+    def _same_file(a: dict, b: dict) -> bool:
+        return a.get("size") == b.get("size") and a.get("mtime_ns") == b.get("mtime_ns")
+
+    def _matches(self, source: Path, entry: dict) -> bool:
+        """Compara o arquivo atual com a impressão digital registrada"""
+        recorded = entry.get("fingerprint", {})
+        stat = Path(source).stat()
+        if stat.st_size != recorded.get("size"):
+            return False
+        if stat.st_mtime_ns == recorded.get("mtime_ns"):
+            return True
+
+        # Mesmo tamanho mas mtime diferente (ex.: arquivo copiado): só o hash decide
+        if not self.use_content_hash or "sha256" not in recorded:
+            return False
+        if self._hash_file(source) != recorded["sha256"]:
+            return False
+        recorded["mtime_ns"] = stat.st_mtime_ns
+        self._dirty = True
+        return True
+
+    def is_up_to_date(self, source: Path, output: Path, params: dict) -> bool:
+        """Verifica se a saída registrada para a origem ainda é válida"""
+        entry = self.entries.get(self._key(source))
+        if entry is None or entry.get("params") != params:
+            return False
+        if entry.get("output") != Path(output).name or not Path(output).exists():
+            return False
+        try:
+            return self._matches(source, entry)
+        except OSError:
+            return False
+
+    def output_name(self, source: Path) -> Optional[str]:
+        """Nome da saída registrada para a origem, se houver"""
+        entry = self.entries.get(self._key(source))
+        return entry.get("output") if entry else None
+
+    def _entry_for(self, source: Path, fingerprint: dict) -> dict:
+        """Entrada da origem, zerada se o arquivo mudou desde o registro"""
+        key = self._key(source)
+        entry = self.entries.get(key)
+        if entry is None or not self._same_file(entry.get("fingerprint", {}), fingerprint):
+            entry = {"fingerprint": fingerprint, "cache": {}}
+            self.entries[key] = entry
+        else:
+            entry["fingerprint"] = {**entry["fingerprint"], **fingerprint}
+        return entry
+
+    def record(self, source: Path, output: Path, params: dict,
+               fingerprint: Optional[dict] = None):
+        """Registra a saída gerada para uma origem"""
+        entry = self._entry_for(source, fingerprint or self.fingerprint(source))
+        entry["params"] = params
+        entry["output"] = Path(output).name
+        self._dirty = True
+
+    def forget(self, source: Path):
+        """Invalida a saída registrada de uma origem (ex.: após falha no processamento)"""
+        entry = self.entries.get(self._key(source))
+        if entry is not None and "output" in entry:
+            entry.pop("params", None)
+            entry.pop("output", None)
+            self._dirty = True
+
+    def get_cached(self, source: Path, key: str, default=None):
+        """Lê um dado em cache da origem, se o arquivo não mudou desde então"""
+        entry = self.entries.get(self._key(source))
+        if entry is None or key not in entry.get("cache", {}):
+            return default
+        try:
+            if not self._matches(source, entry):
+                return default
+        except OSError:
+            return default
+        return entry["cache"][key]
+
+    def set_cached(self, source: Path, key: str, value,
+                   fingerprint: Optional[dict] = None):
+        """Guarda um dado derivado da origem no cache da entrada"""
+        entry = self._entry_for(source, fingerprint or self.fingerprint(source))
+        entry.setdefault("cache", {})[key] = value
+        self._dirty = True
+
+    def pop_cached(self, source: Path, key: str):
+        """Remove um dado do cache da origem, se houver"""
+        entry = self.entries.get(self._key(source))
+        if entry is not None and entry.get("cache", {}).pop(key, None) is not None:
+            self._dirty = True
+
+    def clear_cached(self, key: str) -> int:
+        """Remove um dado do cache de todas as entradas; retorna quantas tinham o dado"""
+        cleared = 0
+        for entry in self.entries.values():
+            if entry.get("cache", {}).pop(key, None) is not None:
+                cleared += 1
+        if cleared:
+            self._dirty = True
+        return cleared
+
+    def save(self):
+        """Grava o manifesto de forma atômica"""
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps({"version": self.VERSION, "entries": self.entries}),
+                            encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,253 @@
+import math
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from image_processor import ImageProcessor, open_source
+from aspect_buckets import closest_bucket
+from color_management import is_srgb
+from dataset_manifest import DatasetManifest
+
+# Classificação de cada arquivo na pré-varredura
+UPSCALE = "upscale"        # menor que o target: será ampliada
+CROP = "crop"              # proporção diferente do target: será cortada
+RESIZE = "resize"          # só redução, sem crop
+AT_TARGET = "at_target"    # já no tamanho final
+CORRUPT = "corrupt"        # cabeçalho ilegível
+UP_TO_DATE = "up_to_date"  # saída já atualizada no manifesto: será pulada
+
+
+@dataclass
+class ScanEntry:
+    """Informações de uma imagem lidas apenas do cabeçalho"""
+    path: Path
+    category: str
+    size: Optional[Tuple[int, int]] = None
+    mode: Optional[str] = None
+    format: Optional[str] = None
+    error: Optional[str] = None
+    # False quando há perfil ICC de outro espaço de cor (precisa de conversão)
+    srgb: bool = True
+
+
+@dataclass
+class CostModel:
+    """
+    Custo médio por megapixel de cada fase do processamento, em ms.
+    Os valores padrão foram medidos com benchmarks/bench_fast_decode.py num
+    único núcleo; calibrate() mede os custos reais sobre uma amostra do dataset.
+    """
+    decode_ms_per_mp: Dict[str, float] = field(default_factory=lambda: {
+        "JPEG": 22.0, "PNG": 40.0, "WEBP": 60.0,
+    })
+    default_decode_ms_per_mp: float = 50.0
+    resample_ms_per_mp: float = 25.0
+    encode_ms_per_mp: float = 390.0
+
+    def decode_cost(self, image_format: Optional[str]) -> float:
+        return self.decode_ms_per_mp.get(image_format or "", self.default_decode_ms_per_mp)
+
+
+@dataclass
+class ScanReport:
+    """Resultado da pré-varredura: classificação por arquivo e estimativa de tempo"""
+    entries: List[ScanEntry]
+    estimated_seconds: float
+    workers: int
+
+    @property
+    def counts(self) -> Counter:
+        return Counter(entry.category for entry in self.entries)
+
+    @property
+    def readable_files(self) -> List[Path]:
+        return [entry.path for entry in self.entries if entry.category != CORRUPT]
+
+    def summary(self) -> str:
+        """Resumo legível do plano de trabalho"""
+        counts = self.counts
+        minutes, seconds = divmod(int(math.ceil(self.estimated_seconds)), 60)
+        hours, minutes = divmod(minutes, 60)
+        eta = f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+        return (
+            f"Images found: {len(self.entries)}\n"
+            f"- Need upscale: {counts[UPSCALE]}\n"
+            f"- Need crop: {counts[CROP]}\n"
+            f"- Resize only: {counts[RESIZE]}\n"
+            f"- Already at target: {counts[AT_TARGET]}\n"
+            f"- Up to date (skipped): {counts[UP_TO_DATE]}\n"
+            f"- Unreadable (skipped): {counts[CORRUPT]}\n\n"
+            f"Estimated time with {self.workers} worker(s): {eta}"
+        )
+
+
+def read_header(image_path: Path) -> ScanEntry:
+    """
+    Lê tamanho, modo e formato sem decodificar os pixels. Aceita origens até
+    ImageProcessor.MAX_SOURCE_PIXELS, como o processamento com o orçamento de
+    pixels ligado (ver image_processor.open_source).
+    """
+    try:
+        with open_source(image_path, ImageProcessor.MAX_SOURCE_PIXELS) as pil_image:
+            return ScanEntry(image_path, "", pil_image.size, pil_image.mode, pil_image.format,
+                             srgb=is_srgb(pil_image.info.get("icc_profile")))
+    except Exception as e:
+        return ScanEntry(image_path, CORRUPT, error=f"{type(e).__name__}: {e}")
+
+
+def classify(entry: ScanEntry, target_size: Tuple[int, int]) -> str:
+    """Classifica a imagem pelo trabalho que o process_image vai fazer nela"""
+    width, height = entry.size
+    target_width, target_height = target_size
+    if (width, height) == tuple(target_size):
+        return AT_TARGET
+    if width < target_width or height < target_height:
+        return UPSCALE
+    if ImageProcessor._is_near_square((width, height)):
+        return RESIZE
+    return CROP
+
+
+def is_passthrough(entry: ScanEntry, target_size: Tuple[int, int], output_format: str = "png") -> bool:
+    """Se a saída será só um link/cópia da origem (ver ImageProcessor._passthrough_size)"""
+    return (output_format == "png" and entry.format == "PNG" and entry.mode == "RGB"
+            and entry.srgb and entry.size == tuple(target_size))
+
+
+def estimate_ms(entry: ScanEntry, target_size: Tuple[int, int],
+                costs: CostModel, fast_decode: bool = False,
+                output_format: str = "png") -> float:
+    """Tempo estimado de processamento de uma imagem, em ms"""
+    if is_passthrough(entry, target_size, output_format):
+        return 0.0
+
+    source_mp = entry.size[0] * entry.size[1] / 1e6
+    output_mp = target_size[0] * target_size[1] / 1e6
+
+    decoded_mp = source_mp
+    if fast_decode and entry.format == "JPEG":
+        # draft() reduz até 1/8 por lado, mantendo a margem de FAST_DECODE_GAP
+        cover_mp = output_mp * max(entry.size[0] / entry.size[1], entry.size[1] / entry.size[0])
+        decoded_mp = max(source_mp / 64, min(source_mp, cover_mp * ImageProcessor.FAST_DECODE_GAP ** 2))
+
+    return (costs.decode_cost(entry.format) * decoded_mp
+            + costs.resample_ms_per_mp * decoded_mp
+            + costs.encode_ms_per_mp * output_mp)
+
+
+def scan_images(image_files: List[Path], target_size: Tuple[int, int],
+                costs: Optional[CostModel] = None, workers: int = 1,
+                fast_decode: bool = False, output_format: str = "png") -> ScanReport:
+    """
+    Pré-varredura do dataset lendo só os cabeçalhos: classifica cada arquivo
+    (ampliar, cortar, só reduzir, já no tamanho, ilegível) e estima o tempo
+    total a partir do custo por megapixel de cada fase.
+    """
+    entries = []
+    for image_path in image_files:
+        entry = read_header(image_path)
+        if entry.category != CORRUPT:
+            entry.category = classify(entry, target_size)
+        entries.append(entry)
+    return estimate_report(entries, target_size, costs, workers, fast_decode, output_format)
+
+
+def estimate_report(entries: List[ScanEntry], target_size: Tuple[int, int],
+                    costs: Optional[CostModel] = None, workers: int = 1,
+                    fast_decode: bool = False, output_format: str = "png") -> ScanReport:
+    """
+    Refaz a estimativa de tempo sobre entradas já lidas por scan_images (ex.:
+    com os custos de calibrate), sem ler os cabeçalhos de novo. Arquivos
+    ilegíveis e já atualizados no manifesto não custam nada.
+    """
+    costs = costs or CostModel()
+    total_ms = sum(estimate_ms(entry, target_size, costs, fast_decode, output_format)
+                   for entry in entries if entry.category not in (CORRUPT, UP_TO_DATE))
+    workers = max(1, workers)
+    return ScanReport(entries, total_ms / 1000 / workers, workers)
+
+
+def mark_up_to_date(entries: List[ScanEntry], processor: ImageProcessor,
+                    output_dir_for: Callable[[Path], Path], target_size: Tuple[int, int],
+                    buckets: Optional[List[Tuple[int, int]]] = None) -> int:
+    """
+    Marca como UP_TO_DATE as entradas cuja saída já está atualizada no
+    manifesto do diretório de saída (output_dir_for(origem)), com os
+    parâmetros atuais do processor: o processamento incremental vai pulá-las.
+    Usa o tamanho já lido do cabeçalho para escolher o bucket.
+
+    Returns:
+        int: Número de entradas marcadas.
+    """
+    manifests = {}
+    marked = 0
+    for entry in entries:
+        if entry.category == CORRUPT:
+            continue
+        output_dir = output_dir_for(entry.path)
+        manifest = manifests.get(output_dir)
+        if manifest is None:
+            manifest = manifests[output_dir] = DatasetManifest.load(output_dir)
+        image_target = closest_bucket(entry.size, buckets) if buckets else target_size
+        output_path = processor._output_path(output_dir, entry.path)
+        if manifest.is_up_to_date(entry.path, output_path, processor._processing_params(image_target)):
+            entry.category = UP_TO_DATE
+            marked += 1
+    return marked
+
+
+def calibrate(processor: ImageProcessor, report: ScanReport, target_size: Tuple[int, int],
+              samples: int = 3, workers: int = 1) -> CostModel:
+    """
+    Mede o custo por megapixel de cada fase processando algumas imagens do
+    próprio dataset (as saídas vão para um diretório temporário). Formatos
+    sem amostra ficam com o custo padrão.
+
+    As amostras rodam nos workers supervisionados do processor, como o
+    processamento em si: uma amostra que trava ou derruba o decodificador só
+    fica sem medição, sem travar ou derrubar a GUI. Com um único worker (o
+    padrão) as medições não disputam núcleos entre si; com workers = 0,
+    roda no próprio processo.
+    """
+    costs = CostModel()
+    readable = [entry for entry in report.entries if entry.category not in (CORRUPT, UP_TO_DATE)
+                and not is_passthrough(entry, target_size, processor.output_format)]
+    if not readable:
+        return costs
+
+    # Uma amostra por formato primeiro, depois completa até o limite
+    by_format = {}
+    for entry in readable:
+        by_format.setdefault(entry.format, entry)
+    sample = list(by_format.values())[:samples]
+    sample += [entry for entry in readable if entry not in sample][:samples - len(sample)]
+
+    decode = {}
+    resample = []
+    encode = []
+    output_mp = target_size[0] * target_size[1] / 1e6
+    formats = {entry.path: entry.format for entry in sample}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Nomes numerados: duas amostras com o mesmo nome em pastas diferentes
+        # não gravam no mesmo arquivo
+        tasks = [(entry.path, tuple(target_size),
+                  processor._output_path(Path(tmp), Path(f"{i}_{entry.path.name}")))
+                 for i, entry in enumerate(sample)]
+        for (image_path, _, _), result, error in processor._map_in_workers("_measure_phases",
+                                                                            tasks, workers):
+            if error is not None:
+                continue
+            decode_s, decoded_mp, resample_s, encode_s = result
+            decode.setdefault(formats[image_path], []).append(decode_s * 1000 / decoded_mp)
+            resample.append(resample_s * 1000 / decoded_mp)
+            encode.append(encode_s * 1000 / output_mp)
+
+    for image_format, values in decode.items():
+        costs.decode_ms_per_mp[image_format] = sum(values) / len(values)
+    if resample:
+        costs.resample_ms_per_mp = sum(resample) / len(resample)
+    if encode:
+        costs.encode_ms_per_mp = sum(encode) / len(encode)
+    return costs
@@ -1,6 +1,7 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTreeView, QGroupBox, 
-    QPushButton, QMessageBox, QLabel, QSpinBox, QFileDialog, QProgressDialog
+    QPushButton, QMessageBox, QLabel, QSpinBox, QFileDialog, QProgressDialog,
+    QComboBox
 )
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
 from PyQt6.QtCore import Qt
@@ -118,6 +119,14 @@ class DatasetManagerGUI(DatasetActionsMixin, QMainWindow):
         size_layout.addWidget(self.crop_height)
         layout.addLayout(size_layout)
         
+        # Formato de saída (custo de encode x tamanho em disco)
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Output Format:"))
+        self.output_format = QComboBox()
+        self.output_format.addItems(["PNG", "PNG (fast)", "WebP (lossless)", "JPEG (q95)"])
+        format_layout.addWidget(self.output_format)
+        layout.addLayout(format_layout)
+        
         # Botão para alternar detecção facial
         self.face_detection = QPushButton("Face Detection: ON")
         self.face_detection.setCheckable(True)
@@ -125,11 +134,58 @@ class DatasetManagerGUI(DatasetActionsMixin, QMainWindow):
         self.face_detection.clicked.connect(self.toggle_face_detection)
         layout.addWidget(self.face_detection)
         
+        # Botão para alternar o smart crop (crop na região mais saliente quando não há rostos)
+        self.smart_crop = QPushButton("Smart Crop: OFF")
+        self.smart_crop.setCheckable(True)
+        self.smart_crop.setChecked(False)
+        self.smart_crop.clicked.connect(self.toggle_smart_crop)
+        layout.addWidget(self.smart_crop)
+        
+        # Botão para ampliar por super-resolução as imagens menores que o target
+        self.sr_upscale = QPushButton("SR Upscale: OFF")
+        self.sr_upscale.setCheckable(True)
+        self.sr_upscale.setChecked(False)
+        self.sr_upscale.clicked.connect(self.toggle_sr_upscale)
+        layout.addWidget(self.sr_upscale)
+        
+        # Botão para alternar o bucketing por proporção (Target Size vira a resolução máxima)
+        self.aspect_buckets = QPushButton("Aspect Ratio Buckets: OFF")
+        self.aspect_buckets.setCheckable(True)
+        self.aspect_buckets.setChecked(False)
+        self.aspect_buckets.clicked.connect(self.toggle_aspect_buckets)
+        layout.addWidget(self.aspect_buckets)
+        
+        # Botão para processar também as subpastas (datasets com vários conceitos, ex.: 10_alice/)
+        self.include_subfolders = QPushButton("Include Subfolders: OFF")
+        self.include_subfolders.setCheckable(True)
+        self.include_subfolders.setChecked(False)
+        self.include_subfolders.clicked.connect(self.toggle_include_subfolders)
+        layout.addWidget(self.include_subfolders)
+        
+        # Botão para excluir imagens quase duplicadas antes do processamento
+        self.skip_duplicates = QPushButton("Skip Duplicates: OFF")
+        self.skip_duplicates.setCheckable(True)
+        self.skip_duplicates.setChecked(False)
+        self.skip_duplicates.clicked.connect(self.toggle_skip_duplicates)
+        layout.addWidget(self.skip_duplicates)
+        
+        # Botão para excluir imagens borradas, estouradas ou pequenas demais para o target
+        self.quality_filter = QPushButton("Quality Filter: OFF")
+        self.quality_filter.setCheckable(True)
+        self.quality_filter.setChecked(False)
+        self.quality_filter.clicked.connect(self.toggle_quality_filter)
+        layout.addWidget(self.quality_filter)
+        
         # Botão para processar as imagens
         process_button = QPushButton("Process Images")
         process_button.clicked.connect(self.process_images)
         layout.addWidget(process_button)
         
+        # Libera as imagens que travaram ou derrubaram o decodificador
+        clear_quarantine_button = QPushButton("Clear Quarantine")
+        clear_quarantine_button.clicked.connect(self.clear_quarantine)
+        layout.addWidget(clear_quarantine_button)
+        
         group.setLayout(layout)
         return group
 
@@ -143,6 +199,10 @@ class DatasetManagerGUI(DatasetActionsMixin, QMainWindow):
         generate_captions_btn.clicked.connect(self.generate_captions)
         layout.addWidget(generate_captions_btn)
         
+        unload_models_btn = QPushButton("Unload Caption Models")
+        unload_models_btn.clicked.connect(self.unload_caption_models)
+        layout.addWidget(unload_models_btn)
+        
         group.setLayout(layout)
         return group
 
@@ -1,6 +1,7 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                            QPushButton, QLineEdit, QSpinBox, QFormLayout,
                            QComboBox, QTextEdit, QCheckBox)
+from memory_policy import NEVER, EVERY_N, THRESHOLD
 
 class SuffixInputDialog(QDialog):
     def __init__(self, parent=None):
@@ -51,6 +52,34 @@ class CaptionConfigDialog(QDialog):
         self.model_combo.setVisible(False)
         layout.addRow("Danbooru Model:", self.model_combo)
         
+        # Imagens por lote de inferência
+        self.batch_size = QSpinBox()
+        self.batch_size.setRange(1, 32)
+        self.batch_size.setValue(4)
+        layout.addRow("Batch Size:", self.batch_size)
+        
+        # Quando liberar a memória da GPU entre os lotes
+        self.memory_modes = {"When Above Threshold": THRESHOLD, "Every N Images": EVERY_N,
+                             "Never": NEVER}
+        self.memory_combo = QComboBox()
+        self.memory_combo.addItems(list(self.memory_modes))
+        layout.addRow("Memory Cleanup:", self.memory_combo)
+        
+        self.memory_every_n = QSpinBox()
+        self.memory_every_n.setRange(1, 10000)
+        self.memory_every_n.setValue(32)
+        self.memory_every_n.setVisible(False)
+        layout.addRow("Cleanup Every (images):", self.memory_every_n)
+        
+        # 0 usa 25% da memória da GPU
+        self.memory_threshold = QSpinBox()
+        self.memory_threshold.setRange(0, 1000000)
+        self.memory_threshold.setSuffix(" MB")
+        self.memory_threshold.setSpecialValueText("Auto (25% of GPU)")
+        layout.addRow("Cleanup Threshold:", self.memory_threshold)
+        
+        self.memory_combo.currentTextChanged.connect(self.on_memory_mode_changed)
+        
         # Janus options
         self.janus_context = QTextEdit()
         self.janus_context.setPlaceholderText("Enter additional context for Janus prompt (optional)")
@@ -83,14 +112,23 @@ class CaptionConfigDialog(QDialog):
     
     def on_method_changed(self, text):
         self.model_combo.setVisible(text == "Danbooru")
+        self.batch_size.setVisible(text in ("Florence-2", "Danbooru"))
         self.janus_context.setVisible(text == "Janus-7B")
         self.replace_prompt.setVisible(text == "Janus-7B")
+    
+    def on_memory_mode_changed(self, text):
+        self.memory_every_n.setVisible(self.memory_modes[text] == EVERY_N)
+        self.memory_threshold.setVisible(self.memory_modes[text] == THRESHOLD)
         
     def get_values(self):
         return {
             'method': self.method_combo.currentText(),
             'prefix': self.prefix.text(),
             'model_type': self.model_combo.currentText() if self.method_combo.currentText() == "Danbooru" else None,
+            'batch_size': self.batch_size.value(),
+            'memory_mode': self.memory_modes[self.memory_combo.currentText()],
+            'memory_every_n': self.memory_every_n.value(),
+            'memory_threshold_mb': self.memory_threshold.value() or None,
             'janus_context': self.janus_context.toPlainText() if self.method_combo.currentText() == "Janus-7B" else None,
             'replace_prompt': self.replace_prompt.isChecked() if self.method_combo.currentText() == "Janus-7B" else False
         }
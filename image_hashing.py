@@ -0,0 +1,166 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Lado do hash: 8 gera um dHash de 64 bits
+HASH_SIZE = 8
+
+
+def thumbnail_from_image(pil_image: Image.Image, hash_size: int = HASH_SIZE) -> np.ndarray:
+    """Miniatura em tons de cinza de (hash_size) x (hash_size + 1) de uma imagem já aberta"""
+    thumbnail = pil_image.convert("L").resize((hash_size + 1, hash_size),
+                                              Image.Resampling.BOX, reducing_gap=2.0)
+    return np.asarray(thumbnail, dtype=np.int16)
+
+
+def load_thumbnail(image_path: Path, hash_size: int = HASH_SIZE) -> np.ndarray:
+    """
+    Decodifica a miniatura de um arquivo. Para JPEG, draft() decodifica
+    direto em escala reduzida.
+    """
+    with Image.open(image_path) as pil_image:
+        pil_image.draft("L", ((hash_size + 1) * 4, hash_size * 4))
+        return thumbnail_from_image(pil_image, hash_size)
+
+
+def dhash_batch(thumbnails: np.ndarray) -> List[int]:
+    """
+    Calcula o dHash de várias miniaturas de uma vez.
+    thumbnails tem formato (N, hash_size, hash_size + 1); cada bit indica se o
+    pixel é mais claro que o vizinho da direita.
+    """
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbnails), -1), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Árvore BK sobre a distância de Hamming: a busca por vizinhos a até d bits
+    só visita os ramos cuja distância ao nó está em [dist - d, dist + d], o
+    que evita comparar cada hash com todos os outros.
+    """
+
+    def __init__(self):
+        self._root = None  # (hash, item, {distância: filho})
+
+    def add(self, value: int, item):
+        if self._root is None:
+            self._root = (value, item, {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """Retorna (distância, item) de todos os hashes a até max_distance bits"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, item))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found, key=lambda x: x[0])
+
+
+def compute_hashes(image_files: Iterable[Path], workers: int = 4,
+                   cache_get: Optional[Callable[[Path], Optional[str]]] = None,
+                   cache_set: Optional[Callable[[Path, str], None]] = None,
+                   load_thumbnails: Optional[Callable[[List[Path]],
+                                                      Iterator[Tuple[Path, Optional[np.ndarray]]]]] = None
+                   ) -> Dict[Path, int]:
+    """
+    Calcula o dHash de cada imagem, reaproveitando os hashes em cache.
+    Imagens ilegíveis ficam de fora do resultado.
+
+    Args:
+        load_thumbnails: Decodifica as miniaturas das imagens fora do
+            cache, produzindo (imagem, miniatura ou None se ilegível) em
+            qualquer ordem (ex.: nos workers supervisionados do
+            ImageProcessor). Padrão: load_thumbnail em threads no próprio
+            processo. Os hashes de todas as miniaturas são calculados num
+            único lote (dhash_batch).
+    """
+    hashes = {}
+    missing = []
+    for image_path in image_files:
+        cached = cache_get(image_path) if cache_get else None
+        if cached is not None:
+            hashes[image_path] = int(cached, 16)
+        else:
+            missing.append(image_path)
+
+    def load(image_path: Path) -> Optional[np.ndarray]:
+        try:
+            return load_thumbnail(image_path)
+        except Exception:
+            return None
+
+    if missing and load_thumbnails is not None:
+        loaded = list(load_thumbnails(missing))
+    elif missing:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            loaded = list(zip(missing, executor.map(load, missing)))
+    else:
+        loaded = []
+
+    valid = [(path, thumb) for path, thumb in loaded if thumb is not None]
+    if valid:
+        values = dhash_batch(np.stack([thumb for _, thumb in valid]))
+        for (image_path, _), value in zip(valid, values):
+            hashes[image_path] = value
+            if cache_set:
+                cache_set(image_path, f"{value:016x}")
+
+    return hashes
+
+
+def _keep_priority(image_path: Path, open_image: Callable = Image.open) -> Tuple[int, int]:
+    """Prioridade para manter uma imagem: resolução (só o cabeçalho) e tamanho do arquivo"""
+    try:
+        with open_image(image_path) as pil_image:
+            pixels = pil_image.width * pil_image.height
+    except Exception:
+        pixels = 0
+    return pixels, image_path.stat().st_size
+
+
+def find_duplicates(hashes: Dict[Path, int], max_distance: int = 6,
+                    open_image: Callable = Image.open) -> Dict[Path, Tuple[Path, int]]:
+    """
+    Agrupa imagens quase idênticas. Entre as duplicatas, mantém a de maior
+    resolução e, no empate, a de maior arquivo. open_image abre as imagens
+    para ler a resolução do cabeçalho (ex.: com o limite de tamanho do
+    ImageProcessor).
+
+    Returns:
+        {duplicata: (imagem mantida, distância em bits)}
+    """
+    tree = BKTree()
+    duplicates = {}
+    order = sorted(hashes, key=lambda path: _keep_priority(path, open_image), reverse=True)
+    for image_path in order:
+        matches = tree.search(hashes[image_path], max_distance)
+        if matches:
+            distance, kept = matches[0]
+            duplicates[image_path] = (kept, distance)
+        else:
+            tree.add(hashes[image_path], image_path)
+    return duplicates
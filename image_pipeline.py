@@ -0,0 +1,201 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Marca o fim do fluxo numa fila entre estágios
+_DONE = object()
+
+
+class _Stage:
+    """Grupo de threads de um estágio do pipeline"""
+
+    def __init__(self, name: str, count: int, target: Callable[[], None]):
+        self.name = name
+        self.count = max(1, count)
+        self._remaining = self.count
+        self._lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+            for i in range(self.count)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def finish_one(self) -> bool:
+        """Marca o fim de uma thread; retorna True para a última do estágio"""
+        with self._lock:
+            self._remaining -= 1
+            return self._remaining == 0
+
+
+def iter_pipeline(items: Iterable[Any],
+                  read: Callable[[Any], Any],
+                  compute: Callable[[Any, Any], Any],
+                  write: Callable[[Any, Any], Any],
+                  readers: int = 2,
+                  compute_workers: int = 4,
+                  writers: int = 2,
+                  queue_size: int = 8) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Executa read -> compute -> write sobre cada item com threads separadas por
+    estágio, ligadas por filas limitadas (queue_size) que seguram a memória
+    em uso: no máximo queue_size itens lidos e queue_size itens processados
+    aguardam entre os estágios.
+
+    Produz (item, retorno de write, erro) na ordem em que cada item termina.
+    Se um estágio levantar exceção, o item sai imediatamente com o erro e não
+    passa pelos estágios seguintes. Fechar o gerador antes do fim interrompe
+    as threads.
+    """
+    items = iter(items)
+    items_lock = threading.Lock()
+    read_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def put(q: queue.Queue, value) -> bool:
+        # put bloqueante que desiste quando o pipeline é interrompido
+        while not stop.is_set():
+            try:
+                q.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def next_item():
+        with items_lock:
+            return next(items, _DONE)
+
+    def reader():
+        try:
+            while not stop.is_set():
+                item = next_item()
+                if item is _DONE:
+                    break
+                try:
+                    data = read(item)
+                except Exception as e:
+                    results.put((item, None, e))
+                    continue
+                if not put(read_q, (item, data)):
+                    break
+        finally:
+            if read_stage.finish_one():
+                for _ in range(compute_stage.count):
+                    put(read_q, _DONE)
+
+    def computer():
+        try:
+            while True:
+                entry = get(read_q)
+                if entry is _DONE:
+                    break
+                item, data = entry
+                try:
+                    value = compute(item, data)
+                except Exception as e:
+                    results.put((item, None, e))
+                    continue
+                del data
+                if not put(write_q, (item, value)):
+                    break
+        finally:
+            if compute_stage.finish_one():
+                for _ in range(write_stage.count):
+                    put(write_q, _DONE)
+
+    def writer():
+        try:
+            while True:
+                entry = get(write_q)
+                if entry is _DONE:
+                    break
+                item, value = entry
+                try:
+                    results.put((item, write(item, value), None))
+                except Exception as e:
+                    results.put((item, None, e))
+        finally:
+            if write_stage.finish_one():
+                results.put(_DONE)
+
+    read_stage = _Stage("pipeline-read", readers, reader)
+    compute_stage = _Stage("pipeline-compute", compute_workers, computer)
+    write_stage = _Stage("pipeline-write", writers, writer)
+
+    for stage in (read_stage, compute_stage, write_stage):
+        stage.start()
+
+    try:
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        stop.set()
+
+
+def iter_prefetch(items: Iterable[Any],
+                  load: Callable[[Any], Any],
+                  workers: int = 2,
+                  depth: int = 8) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Executa load(item) em threads de fundo, à frente do consumidor, e produz
+    (item, retorno de load, erro) na ordem de items. No máximo depth itens
+    ficam carregados à espera, o que limita a memória; enquanto o consumidor
+    processa um item (ex.: inferência de um modelo), os seguintes já estão
+    sendo lidos e pré-processados. Um erro em load sai junto com o seu item,
+    sem interromper os demais. Fechar o gerador antes do fim cancela o que
+    ainda não começou.
+    """
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+    pending = deque()
+
+    def submit_next() -> bool:
+        item = next(items, _DONE)
+        if item is _DONE:
+            return False
+        pending.append((item, executor.submit(load, item)))
+        return True
+
+    try:
+        for _ in range(max(1, depth)):
+            if not submit_next():
+                break
+        while pending:
+            item, future = pending.popleft()
+            submit_next()
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Agrupa items em listas de até size elementos, na ordem"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
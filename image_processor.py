@@ -1,20 +1,249 @@
+import io
 import os
+import math
+import time
+import shutil
+import threading
+import multiprocessing
 import cv2
 import numpy as np
+from dataclasses import dataclass, field
 from pathlib import Path
 from PIL import Image  # Pillow já suporta AVIF nativamente nas versões recentes
-from typing import Tuple, Optional, Callable
+from typing import Tuple, Optional, Callable, List, Iterator
+
+from aspect_buckets import closest_bucket, write_bucket_index
+from dataset_manifest import DatasetManifest
+from image_hashing import HASH_SIZE, compute_hashes, find_duplicates, thumbnail_from_image
+from image_quality import (PROXY_SIZE, QualityScore, QualityThresholds, compute_scores,
+                           filter_quality, proxy_from_image, score_proxy)
+from image_pipeline import iter_pipeline
+from smart_crop import saliency_map, best_window
+from color_management import to_rgb, to_srgb, is_srgb
+from concept_folders import find_concept_folders
+from super_resolution import SuperResolver, SuperResolutionUnavailable
+from virtual_crops import VirtualCrop, write_crop_index, load_crop_index
+from worker_pool import SupervisedPool, WorkerSlots, WorkerCrashed, WorkerTimeout
+
+
+@dataclass
+class ProcessResult:
+    """Resultado do processamento de uma imagem"""
+    source: Path
+    output: Path
+    success: bool
+    error: Optional[str] = None
+    messages: List[str] = field(default_factory=list)
+    # Rostos detectados (caixas normalizadas), quando houve detecção
+    faces: Optional[list] = None
+    # Se a origem derrubou ou travou o worker e foi posta em quarentena
+    quarantined: bool = False
+    # Se a quarentena foi por tempo limite (e não por queda do worker)
+    timed_out: bool = False
+
+
+# Processador usado pelos workers do pool de processos (um por processo)
+_worker_processor = None
+
+# Classificador Haar carregado uma única vez por processo (e por thread, já que
+# o CascadeClassifier do OpenCV não é garantidamente thread-safe)
+_face_cascades = threading.local()
+
+
+def _get_face_cascade():
+    """Retorna o classificador facial em cache do processo/thread atual"""
+    cascade = getattr(_face_cascades, "cascade", None)
+    if cascade is None:
+        cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        cascade = cv2.CascadeClassifier(cascade_path)
+        _face_cascades.cascade = cascade
+    return cascade
+
+
+def _reflink(source: Path, destination: Path) -> bool:
+    """Cópia copy-on-write (btrfs, XFS...) via ioctl FICLONE; False se não suportada"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        destination.unlink(missing_ok=True)
+        return False
+
+
+def _link_or_copy(source: Path, destination: Path) -> str:
+    """
+    Cria destination com o mesmo conteúdo de source sem recodificar: reflink
+    se o sistema de arquivos suportar, senão hardlink (mesmo volume), senão
+    cópia simples. O reflink vem primeiro porque, com hardlink, editar a saída
+    no lugar altera também a origem: por isso _save_image nunca grava por
+    cima de uma saída existente, e sim num arquivo novo que a substitui.
+    Retorna o método usado.
+    """
+    destination.unlink(missing_ok=True)
+    if _reflink(source, destination):
+        return "reflink"
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError:
+        shutil.copyfile(source, destination)
+        return "copy"
+
+
+# Serializa a troca temporária de Image.MAX_IMAGE_PIXELS em open_source
+_pixel_limit_lock = threading.Lock()
+
+
+def open_source(fp, max_source_pixels: Optional[int] = None) -> Image.Image:
+    """
+    Image.open de uma imagem de origem. Com max_source_pixels, aceita origens
+    acima do limite contra "decompression bombs" do Pillow até esse tamanho:
+    o limite global fica desligado só durante a leitura do cabeçalho, e o
+    tamanho é verificado aqui. Os demais Image.open do programa (geradores de
+    caption, etc.) continuam com o limite do Pillow. Sem max_source_pixels,
+    é o Image.open normal.
+    """
+    if max_source_pixels is None:
+        return Image.open(fp)
+    with _pixel_limit_lock:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            pil_image = Image.open(fp)
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+    pixels = pil_image.width * pil_image.height
+    if pixels > max_source_pixels:
+        pil_image.close()
+        raise Image.DecompressionBombError(
+            f"Image size ({pixels} pixels) exceeds limit of {max_source_pixels} pixels")
+    return pil_image
+
+
+def _init_worker(config: dict, large_image_slots=None):
+    """
+    Cria o ImageProcessor do processo worker a partir da configuração do pai.
+    large_image_slots são as vagas compartilhadas entre os workers que limitam
+    quantas imagens acima do orçamento de pixels são decodificadas ao mesmo tempo.
+    """
+    global _worker_processor
+    _worker_processor = ImageProcessor(**config)
+    if large_image_slots is not None:
+        _worker_processor._large_image_slots = large_image_slots
+
+
+def _worker_call(method: str, *args):
+    """
+    Tarefa do pool de workers: executa um método do ImageProcessor do
+    processo worker (ver ImageProcessor._map_in_workers)
+    """
+    return getattr(_worker_processor, method)(*args)
+
 
 class ImageProcessor:
-    def __init__(self, use_face_detection: bool = True):
+    # Maior lado da cópia reduzida usada na detecção facial
+    FACE_PROXY_SIZE = 512
+
+    # Formatos de saída: extensão e formato do Pillow (opções em _encode_options).
+    # Custo medido com benchmarks/bench_output_codecs.py (1024x1024, 1 núcleo):
+    #   PNG nível 1: ~185 ms, ~1.8 MB | PNG nível 6 (padrão): ~410 ms, ~1.6 MB
+    #   PNG nível 9: ~430 ms, ~1.6 MB | WebP lossless: ~480 ms, ~1.4 MB
+    #   JPEG q95 4:4:4 (com perdas): ~10 ms, ~0.4 MB
+    OUTPUT_FORMATS = {
+        "png": (".png", "PNG"),
+        "webp": (".webp", "WEBP"),
+        "jpeg": (".jpg", "JPEG"),
+    }
+
+    # Margem mantida acima do tamanho final na decodificação reduzida, para que
+    # o resample LANCZOS final ainda tenha pixels de sobra. Com 1.5 a saída fica
+    # a ~48-51 dB de PSNR da decodificação completa (ver benchmarks/bench_fast_decode.py)
+    FAST_DECODE_GAP = 1.5
+
+    # Pixels por faixa na conversão/redução em faixas de _bounded_decode
+    STRIP_PIXELS = 4_000_000
+
+    # Limite de proteção contra "decompression bombs" das origens com o
+    # orçamento de pixels ligado (ver open_source). O padrão do Pillow
+    # (~179 MP) recusa scans legítimos de 200 MP; com max_pixels, a memória
+    # dessas imagens já é limitada pela decodificação em faixas e pelo governador
+    MAX_SOURCE_PIXELS = 1_000_000_000
+
+    def __init__(self, use_face_detection: bool = True, fast_decode: bool = False,
+                 output_format: str = "png", png_compress_level: int = 6,
+                 max_pixels: Optional[int] = 64_000_000, max_large_images: int = 1,
+                 image_timeout: Optional[float] = 300.0, smart_crop: bool = False,
+                 upscale_model: Optional[str] = None, sr_cache_dir: Optional[str] = None):
+        """
+        Args:
+            use_face_detection: Posiciona o crop sobre os rostos detectados.
+            fast_decode: Decodifica em resolução reduzida imagens muito maiores que o target.
+            output_format: Formato das saídas (chave de OUTPUT_FORMATS).
+            png_compress_level: Nível de compressão zlib das saídas PNG (0-9).
+            max_pixels: Orçamento de pixels por imagem. Imagens maiores passam
+                pela decodificação com memória limitada (None desliga). Com o
+                orçamento ligado, as origens podem ter até MAX_SOURCE_PIXELS,
+                acima do limite do Pillow (que continua valendo no resto do
+                programa).
+            max_large_images: Quantas imagens acima de max_pixels podem estar
+                sendo decodificadas ao mesmo tempo, somando todos os workers.
+            image_timeout: Tempo limite, em segundos, de cada imagem nos workers.
+                Imagens que passam do limite ou derrubam o worker vão para a
+                quarentena (None desliga o limite).
+            smart_crop: Sem rostos para centralizar, posiciona o crop na região
+                de maior saliência em vez do centro geométrico.
+            upscale_model: Modelo do dnn_superres (.pb) usado para ampliar as
+                imagens menores que o target antes do resize final. None usa
+                só Lanczos (ver super_resolution.py).
+            sr_cache_dir: Pasta do cache das imagens ampliadas por
+                super-resolução, normalmente CACHE_DIRNAME dentro do diretório
+                de saída. None amplia sem cache.
+        """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Formato de saída deve ser um de: {list(self.OUTPUT_FORMATS.keys())}")
         self.use_face_detection = use_face_detection
+        self.fast_decode = fast_decode
+        self.output_format = output_format
+        self.png_compress_level = png_compress_level
+        self.max_pixels = max_pixels
+        self.max_large_images = max_large_images
+        self.image_timeout = image_timeout
+        self.smart_crop = smart_crop
+        self.upscale_model = upscale_model
+        self.sr_cache_dir = sr_cache_dir
+        self._super_resolver = None
+        self._super_resolution_error = None
         self._face_cascade = None
+        # Governador de memória: no pool de processos é trocado pelas vagas compartilhadas
+        self._large_image_slots = threading.BoundedSemaphore(max_large_images)
+        # Origens postas em quarentena na última execução: {origem: motivo}
+        self.quarantine = {}
         
     def _init_face_cascade(self):
         """Inicializa o detector facial sob demanda"""
         if self._face_cascade is None:
-            cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-            self._face_cascade = cv2.CascadeClassifier(cascade_path)
+            self._face_cascade = _get_face_cascade()
+
+    def _worker_config(self) -> dict:
+        """Argumentos usados para recriar este processador nos workers"""
+        return {
+            "use_face_detection": self.use_face_detection,
+            "fast_decode": self.fast_decode,
+            "output_format": self.output_format,
+            "png_compress_level": self.png_compress_level,
+            "max_pixels": self.max_pixels,
+            "max_large_images": self.max_large_images,
+            "image_timeout": self.image_timeout,
+            "smart_crop": self.smart_crop,
+            "upscale_model": self.upscale_model,
+            "sr_cache_dir": self.sr_cache_dir,
+        }
     
     def detect_faces(self, image: np.ndarray) -> list:
         """Detecta rostos em uma imagem usando OpenCV"""
@@ -24,80 +253,460 @@ class ImageProcessor:
                                                   minNeighbors=5, minSize=(30, 30))
         return faces
 
-    def process_image(self, image_path: Path, output_path: Path, 
-                    target_size: Tuple[int, int],
-                    progress_callback: Optional[Callable[[str], None]] = None) -> bool:
+    def _detect_faces_proxy(self, pil_image: Image.Image) -> list:
         """
-        Processa uma única imagem com redimensionamento inteligente e/ou crop.
-        - Se a imagem for quadrada e maior/menor que o target, faz resize mantendo proporções
-        - Se a imagem não for quadrada, redimensiona mantendo a menor dimensão igual ao target
-          e depois faz crop do excesso da dimensão maior
-        - Para imagens menores que o target, amplia usando Lanczos mantendo proporções
-          antes de fazer o crop
+        Detecta rostos numa cópia reduzida em tons de cinza (maior lado igual a
+        FACE_PROXY_SIZE), o que mantém o Haar cascade barato mesmo em fotos
+        grandes. As caixas voltam normalizadas, [x, y, w, h] em frações do
+        tamanho da imagem, e valem para qualquer escala da mesma origem.
+        """
+        width, height = pil_image.size
+        proxy = pil_image.convert("L")
+        scale = self.FACE_PROXY_SIZE / max(width, height)
+        if scale < 1:
+            proxy = proxy.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                                 Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+        gray = cv2.equalizeHist(np.asarray(proxy))
+        faces = _get_face_cascade().detectMultiScale(gray, scaleFactor=1.1,
+                                                     minNeighbors=5, minSize=(24, 24))
+        proxy_width, proxy_height = proxy.size
+        return [[round(x / proxy_width, 4), round(y / proxy_height, 4),
+                 round(w / proxy_width, 4), round(h / proxy_height, 4)]
+                for x, y, w, h in faces]
+
+    @staticmethod
+    def _is_near_square(size: Tuple[int, int]) -> bool:
+        """Imagem quadrada ou quase quadrada (margem de 5%): resize sem crop"""
+        width, height = size
+        return abs(width - height) <= min(width, height) * 0.05
+
+    @staticmethod
+    def _crop_box(size: Tuple[int, int], target_size: Tuple[int, int],
+                  faces: Optional[list] = None) -> Tuple[int, int, int, int]:
+        """
+        Janela de crop do target_size dentro de uma imagem de tamanho size.
+        Sem rostos, fica centralizada. Com rostos, centraliza na união das
+        caixas, ou no maior rosto se a união não couber, respeitando as bordas.
+        """
+        width, height = size
+        target_width, target_height = target_size
+        left = (width - target_width) // 2
+        top = (height - target_height) // 2
+
+        if faces:
+            x0 = min(f[0] for f in faces) * width
+            y0 = min(f[1] for f in faces) * height
+            x1 = max(f[0] + f[2] for f in faces) * width
+            y1 = max(f[1] + f[3] for f in faces) * height
+            if x1 - x0 > target_width or y1 - y0 > target_height:
+                fx, fy, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+                x0, y0 = fx * width, fy * height
+                x1, y1 = (fx + fw) * width, (fy + fh) * height
+
+            left = min(max(round((x0 + x1 - target_width) / 2), 0), width - target_width)
+            top = min(max(round((y0 + y1 - target_height) / 2), 0), height - target_height)
+
+        return left, top, left + target_width, top + target_height
+
+    @staticmethod
+    def _cover_size(size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int]:
+        """Menor tamanho, mantendo a proporção, que ainda cobre o target_size"""
+        width, height = size
+        scale = max(target_size[0] / width, target_size[1] / height)
+        return math.ceil(width * scale), math.ceil(height * scale)
+
+    def _decode_request(self, size: Tuple[int, int],
+                        target_size: Tuple[int, int]) -> Tuple[int, int]:
+        """Menor resolução de decodificação aceita: cobre o target com a margem FAST_DECODE_GAP"""
+        cover_width, cover_height = self._cover_size(size, target_size)
+        return (math.ceil(cover_width * self.FAST_DECODE_GAP),
+                math.ceil(cover_height * self.FAST_DECODE_GAP))
+
+    def _is_over_budget(self, size: Tuple[int, int]) -> bool:
+        return self.max_pixels is not None and size[0] * size[1] > self.max_pixels
+
+    def _bounded_decode(self, pil_image: Image.Image,
+                        target_size: Tuple[int, int]) -> Image.Image:
+        """
+        Decodificação com memória limitada para imagens acima de max_pixels,
+        em etapas:
+        - JPEG: draft() já decodifica na menor escala DCT que cobre o target
+        - Conversão para RGB e reduce() por um fator inteiro feitos em faixas
+          horizontais: além da imagem decodificada no modo original, só uma
+          faixa convertida fica em memória, em vez de uma cópia RGB inteira
+        O resample LANCZOS final trabalha então sobre a imagem reduzida.
+        Retorna a imagem em RGB.
+        """
+        request = self._decode_request(pil_image.size, target_size)
+        if pil_image.format == "JPEG":
+            pil_image.draft(None, request)
+
+        width, height = pil_image.size
+        factor = max(1, min(width // request[0], height // request[1]))
+        reduced = Image.new("RGB", (math.ceil(width / factor), math.ceil(height / factor)))
+
+        # Faixas com altura múltipla do fator, para que os blocos do reduce() não
+        # atravessem a divisão entre faixas (resultado idêntico ao reduce() inteiro)
+        rows = max(1, self.STRIP_PIXELS // (width * factor)) * factor
+        for top in range(0, height, rows):
+            strip = to_rgb(pil_image.crop((0, top, width, min(top + rows, height))))
+            if factor > 1:
+                strip = strip.reduce(factor)
+            reduced.paste(strip, (0, top // factor))
+        # Perfil RGB ainda não aplicado (ver color_management.to_rgb)
+        if "icc_profile" in strip.info:
+            reduced.info["icc_profile"] = strip.info["icc_profile"]
+        return reduced
+
+    def _reduced_decode(self, pil_image: Image.Image,
+                        target_size: Tuple[int, int]) -> Image.Image:
+        """
+        Decodifica a imagem na menor escala que ainda cobre o target_size
+        (com a margem FAST_DECODE_GAP).
+        - JPEG: usa draft(), que reduz no domínio DCT (1/2, 1/4 ou 1/8) sem
+          decodificar os pixels descartados
+        - Demais formatos: não há decodificação reduzida no Pillow, então
+          decodifica e aplica reduce() por um fator inteiro antes da conversão
+          para RGB, evitando o resample LANCZOS sobre a resolução cheia
+        """
+        request = self._decode_request(pil_image.size, target_size)
+        if request[0] >= pil_image.width or request[1] >= pil_image.height:
+            return pil_image
+
+        if pil_image.format == "JPEG":
+            pil_image.draft(None, request)
+            return pil_image
+
+        factor = min(pil_image.width // request[0], pil_image.height // request[1])
+        if factor >= 2 and pil_image.mode in ("RGB", "RGBA", "L", "LA", "I", "F"):
+            return pil_image.reduce(factor)
+        return pil_image
+
+    def _open_source(self, fp) -> Image.Image:
+        """Abre uma origem com o limite de tamanho do processador (ver open_source)"""
+        return open_source(fp, self.MAX_SOURCE_PIXELS if self.max_pixels is not None else None)
+
+    def _open_image(self, image_path: Path, data: Optional[bytes] = None) -> Image.Image:
+        """
+        Abre a imagem do arquivo ou dos bytes já lidos dele. Com bytes, o erro
+        de formato não reconhecido citaria só o BytesIO: é refeito com o caminho.
+        """
+        if data is None:
+            return self._open_source(image_path)
+        try:
+            return self._open_source(io.BytesIO(data))
+        except Image.UnidentifiedImageError:
+            raise Image.UnidentifiedImageError(f"cannot identify image file {str(image_path)!r}") from None
+
+    def _load_image(self, image_path: Path, target_size: Tuple[int, int],
+                    progress_callback: Optional[Callable[[str], None]] = None,
+                    data: Optional[bytes] = None) -> Image.Image:
+        """
+        Abre e decodifica a imagem de origem em RGB. Um perfil ICC RGB de
+        outro espaço de cor segue no info e é aplicado por _save_image, já no
+        tamanho da saída (ver color_management.to_rgb). Se data for informado,
+        decodifica esses bytes já lidos do disco em vez de abrir o arquivo.
+        """
+        # Verifica se é AVIF e tenta importar o plugin se necessário
+        if image_path.suffix.lower() == '.avif':
+            try:
+                from pillow_avif import AvifImagePlugin
+                if progress_callback:
+                    progress_callback("Plugin AVIF carregado com sucesso")
+            except ImportError as e:
+                if progress_callback:
+                    progress_callback(f"Erro ao carregar plugin AVIF: {str(e)}")
+                raise ImportError("Para processar imagens AVIF, instale: pip install pillow-avif-plugin")
+        
+        if progress_callback:
+            progress_callback("Tentando abrir a imagem...")
+            
+        # Abre imagem com PIL
+        with self._open_image(image_path, data) as pil_image:
+            if self._is_over_budget(pil_image.size):
+                # Acima do orçamento: decodifica em etapas, e só max_large_images
+                # imagens grandes ficam em memória ao mesmo tempo (em todos os workers)
+                if progress_callback:
+                    progress_callback(f"Imagem grande ({pil_image.width}x{pil_image.height}), "
+                                      f"decodificação com memória limitada")
+                with self._large_image_slots:
+                    return self._bounded_decode(pil_image, target_size)
+
+            if self.fast_decode:
+                pil_image = self._reduced_decode(pil_image, target_size)
+            return to_rgb(pil_image)
+
+    def _load_proxy(self, image_path: Path,
+                    proxy_size: int) -> Tuple[Image.Image, Tuple[int, int]]:
+        """
+        Cópia reduzida para as análises dos filtros (hash, qualidade), que
+        cobre proxy_size x proxy_size: a mesma decodificação reduzida de
+        _load_image, sempre ligada, e com o mesmo orçamento de pixels para
+        imagens grandes. Retorna a cópia em RGB e o tamanho original.
+        """
+        target_size = (proxy_size, proxy_size)
+        with self._open_source(image_path) as pil_image:
+            size = pil_image.size
+            if self._is_over_budget(size):
+                with self._large_image_slots:
+                    return self._bounded_decode(pil_image, target_size), size
+            return to_rgb(self._reduced_decode(pil_image, target_size)), size
+
+    def _hash_thumbnail(self, image_path: Path) -> np.ndarray:
+        """
+        Miniatura do dHash da origem, decodificada num worker. Os hashes são
+        calculados em lote no processo principal (ver image_hashing.compute_hashes).
+        """
+        pil_image, _ = self._load_proxy(image_path, (HASH_SIZE + 1) * 4)
+        return thumbnail_from_image(pil_image)
+
+    def _quality_score(self, image_path: Path) -> QualityScore:
+        """Métricas do filtro de qualidade (ver image_quality), calculadas num worker"""
+        pil_image, size = self._load_proxy(image_path, PROXY_SIZE)
+        return score_proxy(proxy_from_image(pil_image), size)
+
+    def _scaled_size(self, size: Tuple[int, int],
+                     target_size: Tuple[int, int]) -> Tuple[int, int]:
+        """Tamanho para o qual a imagem é redimensionada antes do crop"""
+        width, height = size
+        target_width, target_height = target_size
+
+        # Se a imagem for quadrada (ou quase quadrada, com margem de 5%)
+        # faz resize direto para o target, independente do tamanho original
+        if self._is_near_square(size):
+            return target_size
+
+        # Imagem não é quadrada
+        # Determina qual dimensão (largura ou altura) deve ser usada como referência
+        # para manter o aspect ratio ao redimensionar
+        width_ratio = target_width / width
+        height_ratio = target_height / height
+        
+        # Usa a maior razão para garantir que a imagem cubra o target_size
+        scale = max(width_ratio, height_ratio)
+        return int(width * scale), int(height * scale)
+
+    def _resize_and_crop(self, pil_image: Image.Image,
+                         target_size: Tuple[int, int],
+                         faces: Optional[list] = None,
+                         saliency: Optional[np.ndarray] = None) -> Image.Image:
+        """
+        Redimensiona e faz o crop para o target_size (centrado nos rostos, se
+        houver, ou na região mais saliente, se houver mapa de saliência)
+        """
+        return self._crop_scaled(self._scale_for(pil_image, target_size), target_size,
+                                 faces, saliency)
+
+    def _scale_for(self, pil_image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+        """Redimensiona mantendo proporção (ou direto ao target, se quase quadrada)"""
+        return pil_image.resize(self._scaled_size(pil_image.size, target_size),
+                                Image.Resampling.LANCZOS)
+
+    def _crop_scaled(self, scaled: Image.Image, target_size: Tuple[int, int],
+                     faces: Optional[list] = None,
+                     saliency: Optional[np.ndarray] = None) -> Image.Image:
+        """Crop do target_size numa imagem já redimensionada por _scale_for"""
+        if scaled.size == tuple(target_size):
+            return scaled
+        # Sem rostos, a melhor janela do mapa de saliência faz o papel da caixa
+        # de rosto: o crop centraliza nela
+        if not faces and saliency is not None:
+            faces = [best_window(saliency, scaled.size, target_size)]
+        # Sempre fará crop pois redimensionamos para maior que o necessário
+        # Centraliza o crop (nos rostos, se houver)
+        return scaled.crop(self._crop_box(scaled.size, target_size, faces))
+
+    def _upscale_if_needed(self, image_path: Path, pil_image: Image.Image,
+                           target_sizes: List[Tuple[int, int]],
+                           progress_callback: Optional[Callable[[str], None]] = None) -> Image.Image:
+        """
+        Com upscale_model, amplia por super-resolução as imagens menores que
+        algum dos targets; o resize Lanczos final parte então da imagem
+        ampliada. Se o modelo não puder ser usado, avisa uma vez e segue só
+        com Lanczos.
+        """
+        if not self.upscale_model or self._super_resolution_error is not None:
+            return pil_image
+        width, height = pil_image.size
+        if all(max(w / width, h / height) <= 1 for w, h in target_sizes):
+            return pil_image
+
+        try:
+            if self._super_resolver is None:
+                self._super_resolver = SuperResolver(self.upscale_model)
+            if self.sr_cache_dir:
+                upscaled = self._super_resolver.upscale_cached(image_path, pil_image,
+                                                               Path(self.sr_cache_dir))
+            else:
+                upscaled = self._super_resolver.upscale(pil_image)
+        except (SuperResolutionUnavailable, ValueError) as e:
+            self._super_resolution_error = str(e)
+            if progress_callback:
+                progress_callback(f"Super-resolução indisponível, usando Lanczos: {e}")
+            return pil_image
+
+        # A rede não altera o espaço de cor: o perfil ainda não aplicado continua valendo
+        if "icc_profile" in pil_image.info:
+            upscaled.info["icc_profile"] = pil_image.info["icc_profile"]
+        if progress_callback:
+            progress_callback(f"Ampliada por super-resolução para {upscaled.width}x{upscaled.height}")
+        return upscaled
+
+    def _find_faces(self, pil_image: Image.Image, faces: Optional[list]) -> Optional[list]:
+        """
+        Rostos usados para posicionar o crop: os já conhecidos, ou detectados
+        agora se a detecção está ligada e a imagem vai ser cortada.
+        Retorna None se não houve detecção.
+        """
+        if not self.use_face_detection:
+            return None
+        if faces is None and not self._is_near_square(pil_image.size):
+            faces = self._detect_faces_proxy(pil_image)
+        return faces
+
+    def _find_saliency(self, pil_image: Image.Image,
+                       faces: Optional[list]) -> Optional[np.ndarray]:
+        """
+        Mapa de saliência para o smart crop: só quando ligado, sem rostos para
+        centralizar e se a imagem vai ser cortada. Calculado numa cópia de
+        ~64 px, custa poucos ms mesmo em fotos grandes.
+        """
+        if not self.smart_crop or faces or self._is_near_square(pil_image.size):
+            return None
+        return saliency_map(pil_image)
+
+    def _crop_image(self, pil_image: Image.Image, target_size: Tuple[int, int],
+                    faces: Optional[list] = None) -> Tuple[Image.Image, Optional[list]]:
+        """
+        Aplica o resize/crop, detectando rostos (ou a saliência) antes quando necessário.
+        Retorna a imagem final e os rostos usados (None se não houve detecção).
+        """
+        faces = self._find_faces(pil_image, faces)
+        saliency = self._find_saliency(pil_image, faces)
+        return self._resize_and_crop(pil_image, target_size, faces, saliency), faces
+
+    def _render_variants(self, pil_image: Image.Image, target_sizes: List[Tuple[int, int]],
+                         faces: Optional[list] = None,
+                         saliency: Optional[np.ndarray] = None) -> List[Image.Image]:
+        """
+        Gera uma imagem final por target a partir de uma única decodificação.
+        Os targets são feitos do maior para o menor, e cada um parte da menor
+        imagem intermediária (já redimensionada, sem crop) que ainda o cobre,
+        em vez da original.
+        """
+        order = sorted(range(len(target_sizes)),
+                       key=lambda i: target_sizes[i][0] * target_sizes[i][1], reverse=True)
+        intermediates = [pil_image]
+        variants = [None] * len(target_sizes)
+
+        for i in order:
+            target_size = target_sizes[i]
+            needed = self._scaled_size(pil_image.size, target_size)
+            covering = [im for im in intermediates
+                        if im.width >= needed[0] and im.height >= needed[1]]
+            source = min(covering, key=lambda im: im.width * im.height, default=pil_image)
+
+            scaled = self._scale_for(source, target_size)
+            intermediates.append(scaled)
+            variants[i] = self._crop_scaled(scaled, target_size, faces, saliency)
+
+        return variants
+
+    def _encode_options(self) -> dict:
+        """Argumentos do encoder para o formato de saída configurado"""
+        if self.output_format == "png":
+            # Sem optimize: a passada extra custa muito e quase não reduz o arquivo
+            return {"compress_level": self.png_compress_level, "optimize": False}
+        if self.output_format == "webp":
+            return {"lossless": True, "quality": 80, "method": 4}
+        return {"quality": 95, "subsampling": 0, "optimize": False}
+
+    def _save_image(self, pil_image: Image.Image, output_path: Path):
+        """
+        Salva o resultado no formato de saída configurado, em sRGB. Grava num
+        nome temporário e renomeia por cima da saída: se a saída anterior for
+        um hardlink da origem (ver _link_or_copy), gravar no próprio arquivo
+        sobrescreveria a origem também.
+        """
+        pil_image = to_srgb(pil_image)
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(
+            f"{output_path.stem}.{os.getpid()}_{threading.get_ident()}.tmp")
+        try:
+            pil_image.save(tmp_path, self.OUTPUT_FORMATS[self.output_format][1],
+                           **self._encode_options())
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _passthrough_size(self, image_path: Path) -> Optional[Tuple[int, int]]:
+        """
+        Tamanho da origem se ela pode ser usada como saída sem decodificar:
+        PNG RGB em sRGB com saída em PNG. Lê apenas o cabeçalho.
+        """
+        if self.output_format != "png":
+            return None
+        try:
+            with self._open_source(image_path) as pil_image:
+                if (pil_image.format == "PNG" and pil_image.mode == "RGB"
+                        and is_srgb(pil_image.info.get("icc_profile"))):
+                    return pil_image.size
+        except Exception:
+            pass
+        return None
+
+    def _process_variants(self, image_path: Path,
+                          outputs: List[Tuple[Path, Tuple[int, int]]],
+                          progress_callback: Optional[Callable[[str], None]] = None,
+                          faces: Optional[list] = None) -> List[ProcessResult]:
+        """
+        Decodifica a imagem uma vez e grava uma saída por (caminho, tamanho
+        final) em outputs. Retorna um ProcessResult por saída.
         """
         try:
             # Debug info
             if progress_callback:
                 progress_callback(f"Iniciando processamento de: {image_path}")
                 progress_callback(f"Formato do arquivo: {image_path.suffix}")
-            
-            # Verifica se é AVIF e tenta importar o plugin se necessário
-            if image_path.suffix.lower() == '.avif':
-                try:
-                    from pillow_avif import AvifImagePlugin
-                    if progress_callback:
-                        progress_callback("Plugin AVIF carregado com sucesso")
-                except ImportError as e:
+
+            # Saídas em que a origem já está no tamanho final (PNG RGB) são
+            # ligadas/copiadas diretamente, sem decodificar nem recodificar
+            passthrough_size = self._passthrough_size(image_path)
+            pending = []
+            for output_path, target_size in outputs:
+                if passthrough_size == tuple(target_size):
+                    method = _link_or_copy(image_path, output_path)
                     if progress_callback:
-                        progress_callback(f"Erro ao carregar plugin AVIF: {str(e)}")
-                    raise ImportError("Para processar imagens AVIF, instale: pip install pillow-avif-plugin")
-            
-            if progress_callback:
-                progress_callback("Tentando abrir a imagem...")
-                
-            # Abre imagem com PIL
-            with Image.open(image_path) as pil_image:
-                pil_image = pil_image.convert("RGB")
-                
-                width, height = pil_image.size
-                target_width, target_height = target_size
-                
-                # Se a imagem for quadrada (ou quase quadrada, com margem de 5%)
-                if abs(width - height) <= min(width, height) * 0.05:
-                    # Faz resize independente do tamanho original
-                    pil_image = pil_image.resize(target_size, Image.Resampling.LANCZOS)
+                        progress_callback(f"Já no tamanho final, saída por {method}")
                 else:
-                    # Imagem não é quadrada
-                    # Determina qual dimensão (largura ou altura) deve ser usada como referência
-                    # para manter o aspect ratio ao redimensionar
-                    width_ratio = target_width / width
-                    height_ratio = target_height / height
-                    
-                    # Usa a maior razão para garantir que a imagem cubra o target_size
-                    scale = max(width_ratio, height_ratio)
-                    
-                    # Redimensiona mantendo proporção
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    pil_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Sempre fará crop pois redimensionamos para maior que o necessário
-                    # Centraliza o crop
-                    left = (new_width - target_width) // 2
-                    top = (new_height - target_height) // 2
-                    right = left + target_width
-                    bottom = top + target_height
-                    
-                    # Faz o crop
-                    pil_image = pil_image.crop((left, top, right, bottom))
-
-                # Salva resultado
-                pil_image.save(output_path, "PNG")
+                    pending.append((output_path, target_size))
 
-                if progress_callback:
-                    progress_callback(f"Processed {image_path.name}")
-                    
-                return True
+            if pending:
+                target_sizes = [target_size for _, target_size in pending]
+                # A decodificação reduzida precisa cobrir todos os targets
+                decode_target = (max(w for w, _ in target_sizes), max(h for _, h in target_sizes))
+                pil_image = self._load_image(image_path, decode_target, progress_callback)
+                pil_image = self._upscale_if_needed(image_path, pil_image, target_sizes,
+                                                    progress_callback)
+                faces = self._find_faces(pil_image, faces)
+                saliency = self._find_saliency(pil_image, faces)
+
+                if len(pending) == 1:
+                    variants = [self._resize_and_crop(pil_image, target_sizes[0], faces, saliency)]
+                else:
+                    variants = self._render_variants(pil_image, target_sizes, faces, saliency)
+
+                for (output_path, _), variant in zip(pending, variants):
+                    self._save_image(variant, output_path)
+
+            if progress_callback:
+                if faces:
+                    progress_callback(f"Crop centrado em {len(faces)} rosto(s)")
+                progress_callback(f"Processed {image_path.name}")
+                
+            return [ProcessResult(image_path, output_path, True, faces=faces)
+                    for output_path, _ in outputs]
 
         except Exception as e:
             import traceback
@@ -106,12 +715,564 @@ class ImageProcessor:
                 progress_callback(f"Tipo do erro: {type(e).__name__}")
                 progress_callback(f"Mensagem de erro: {str(e)}")
                 progress_callback(f"Stack trace:\n{traceback.format_exc()}")
-            return False
+            error = f"{type(e).__name__}: {e}"
+            return [ProcessResult(image_path, output_path, False, error, faces=faces)
+                    for output_path, _ in outputs]
+
+    def process_image(self, image_path: Path, output_path: Path, 
+                    target_size: Tuple[int, int],
+                    progress_callback: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        Processa uma única imagem com redimensionamento inteligente e/ou crop.
+        - Se a imagem for quadrada e maior/menor que o target, faz resize mantendo proporções
+        - Se a imagem não for quadrada, redimensiona mantendo a menor dimensão igual ao target
+          e depois faz crop do excesso da dimensão maior
+        - Para imagens menores que o target, amplia usando Lanczos mantendo proporções
+          antes de fazer o crop
+        - Com a detecção facial ligada, o crop é posicionado sobre os rostos
+          em vez do centro geométrico
+        - Com smart_crop, imagens sem rostos têm o crop posicionado na região
+          de maior saliência (ver smart_crop.py)
+        - Com fast_decode, imagens muito maiores que o target são decodificadas
+          em resolução reduzida antes do resample final
+        - Imagens com perfil ICC (Display P3, Adobe RGB, CMYK...) são convertidas
+          para sRGB (ver color_management.py)
+        - Se a origem já for um PNG RGB sRGB no tamanho final (e a saída for PNG), a
+          saída é um reflink/hardlink/cópia do arquivo, sem decodificar
+        """
+        results = self._process_variants(image_path, [(output_path, target_size)],
+                                         progress_callback)
+        return results[0].success
+
+    def _measure_phases(self, image_path: Path, target_size: Tuple[int, int],
+                        output_path: Path) -> Tuple[float, float, float, float]:
+        """
+        Processa uma imagem medindo cada fase (usado por dataset_scan.calibrate,
+        num worker). Retorna (decodificação em s, megapixels decodificados,
+        resample em s, codificação em s).
+        """
+        start = time.perf_counter()
+        pil_image = self._load_image(image_path, target_size)
+        decoded = time.perf_counter()
+        decoded_mp = pil_image.width * pil_image.height / 1e6
+        pil_image = self._resize_and_crop(pil_image, target_size)
+        resampled = time.perf_counter()
+        self._save_image(pil_image, output_path)
+        encoded = time.perf_counter()
+        return decoded - start, decoded_mp, resampled - decoded, encoded - resampled
+
+    def _processing_params(self, target_size: Tuple[int, int]) -> dict:
+        """Parâmetros que determinam o conteúdo da saída (usados no manifesto)"""
+        return {
+            "target_size": list(target_size),
+            "face_detection": self.use_face_detection,
+            "fast_decode": self.fast_decode,
+            "output_format": self.output_format,
+            "encode_options": self._encode_options(),
+            "max_pixels": self.max_pixels,
+            "smart_crop": self.smart_crop,
+            "upscale_model": Path(self.upscale_model).name if self.upscale_model else None,
+            "color_space": "srgb",
+        }
+
+    def _output_path(self, output_dir: Path, image_path: Path) -> Path:
+        """Caminho de saída de uma imagem de origem"""
+        return output_dir / f"{image_path.stem}{self.OUTPUT_FORMATS[self.output_format][0]}"
+
+    def _map_in_workers(self, method: str, tasks: List[tuple],
+                        workers: int) -> Iterator[Tuple[tuple, object, Optional[Exception]]]:
+        """
+        Executa self.<method>(*task) para cada task e produz (task, resultado,
+        erro) na ordem em que as tarefas terminam; erro é None em caso de sucesso.
+
+        Com workers >= 1, as tarefas rodam em processos worker supervisionados:
+        um worker que trava (passa de image_timeout) ou morre é substituído, e
+        a tarefa dele volta com WorkerTimeout ou WorkerCrashed como erro. Com
+        workers = 0, roda no próprio processo.
+        """
+        if not tasks:
+            return
+
+        if workers <= 0:
+            for task in tasks:
+                try:
+                    yield task, getattr(self, method)(*task), None
+                except Exception as e:
+                    yield task, None, e
+            return
+
+        # As vagas do governador de memória são criadas no mesmo contexto do pool
+        # e herdadas pelos workers na criação de cada processo
+        workers = min(workers, len(tasks))
+        context = multiprocessing.get_context()
+        large_image_slots = WorkerSlots(context, self.max_large_images, workers)
+        with SupervisedPool(workers,
+                            initializer=_init_worker,
+                            initargs=(self._worker_config(), large_image_slots),
+                            timeout=self.image_timeout,
+                            context=context,
+                            on_worker_lost=large_image_slots.release_worker) as pool:
+            for task, result, error in pool.imap_unordered(_worker_call,
+                                                           [(method, *task) for task in tasks]):
+                yield task[1:], result, error
+
+    def _process_job(self, image_path: Path, outputs: List[Tuple[Path, Tuple[int, int]]],
+                     faces: Optional[list] = None) -> List[ProcessResult]:
+        """
+        Processa uma imagem (dentro de um worker, normalmente), gerando uma
+        saída por (caminho, tamanho final) em outputs.
+        As mensagens de progresso são acumuladas e devolvidas ao processo principal,
+        já que o callback da GUI não pode ser chamado de outro processo.
+        """
+        messages = []
+        results = self._process_variants(image_path, outputs, messages.append, faces)
+        results[0].messages = messages
+        return results
+
+    def _run_jobs(self, jobs: List[Tuple[Path, List[Tuple[Path, Tuple[int, int]]], Optional[list]]],
+                  workers: int) -> Iterator[List[ProcessResult]]:
+        """
+        Executa os jobs (origem, [(saída, tamanho final)], rostos conhecidos) e
+        produz a lista de ProcessResult de cada origem, na ordem em que cada
+        uma termina. Uma origem que trava ou derruba o worker volta como falha
+        marcada para quarentena (ver _map_in_workers).
+        """
+        for (image_path, outputs, _), results, error in self._map_in_workers("_process_job",
+                                                                             jobs, workers):
+            if error is None:
+                yield results
+                continue
+
+            # Falha do próprio worker: processo encerrado abruptamente, tempo
+            # limite excedido ou erro fora do tratamento de _process_variants
+            quarantined = isinstance(error, (WorkerCrashed, WorkerTimeout))
+            message = f"{type(error).__name__}: {error}"
+            results = [ProcessResult(image_path, output_path, False, message,
+                                     quarantined=quarantined,
+                                     timed_out=isinstance(error, WorkerTimeout))
+                       for output_path, _ in outputs]
+            results[0].messages = [f"Erro ao processar {image_path.name}: {message}"]
+            if quarantined:
+                results[0].messages.append(f"{image_path.name} posta em quarentena")
+            yield results
+
+    def iter_process(self, image_files: List[Path], output_dir: Path,
+                     target_size: Tuple[int, int],
+                     readers: int = 2,
+                     compute_workers: Optional[int] = None,
+                     writers: int = 2,
+                     queue_size: int = 8) -> Iterator[ProcessResult]:
+        """
+        Processa as imagens em um pipeline de três estágios e produz um
+        ProcessResult por imagem, na ordem em que cada uma termina.
+
+        API avulsa, para quem usa o ImageProcessor como biblioteca sobre um
+        armazenamento lento: a GUI usa process_directory. Tudo roda em threads
+        do próprio processo, sem o isolamento dos workers supervisionados
+        (uma imagem que derruba o decodificador derruba o processo), sem
+        manifesto, quarentena, passthrough nem orçamento compartilhado entre
+        processos.
 
+        - Leitura: threads de I/O leem os bytes dos arquivos
+        - Processamento: pool de threads decodifica, redimensiona e faz o crop,
+          detectando rostos se ligado (o Pillow libera o GIL durante a
+          decodificação e o resample)
+        - Escrita: threads codificam e gravam as saídas
+
+        As filas entre os estágios são limitadas a queue_size itens, o que
+        limita a memória em uso independentemente do tamanho do lote. Assim a
+        latência de leitura e escrita (rede, disco mecânico) fica escondida
+        atrás do processamento.
+
+        Args:
+            image_files: Imagens de entrada.
+            output_dir: Diretório para salvar as imagens processadas.
+            target_size: Dimensão final desejada (largura, altura).
+            readers: Número de threads de leitura.
+            compute_workers: Número de threads de processamento
+                (padrão: número de CPUs).
+            writers: Número de threads de escrita.
+            queue_size: Capacidade de cada fila entre estágios.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        def read(image_path: Path) -> bytes:
+            return image_path.read_bytes()
+
+        def compute(image_path: Path, data: bytes) -> Image.Image:
+            pil_image = self._load_image(image_path, target_size, data=data)
+            pil_image = self._upscale_if_needed(image_path, pil_image, [target_size])
+            return self._crop_image(pil_image, target_size)[0]
+
+        def write(image_path: Path, pil_image: Image.Image) -> Path:
+            output_path = self._output_path(output_dir, image_path)
+            self._save_image(pil_image, output_path)
+            return output_path
+
+        for image_path, output_path, error in iter_pipeline(
+                image_files, read, compute, write,
+                readers=readers,
+                compute_workers=compute_workers or os.cpu_count() or 1,
+                writers=writers,
+                queue_size=queue_size):
+            if error is not None:
+                yield ProcessResult(image_path, self._output_path(output_dir, image_path), False,
+                                    f"{image_path.name}: {type(error).__name__}: {error}")
+            else:
+                yield ProcessResult(image_path, output_path, True)
+
+    def _assign_bucket(self, image_path: Path, buckets: List[Tuple[int, int]],
+                       default: Tuple[int, int]) -> Tuple[int, int]:
+        """Escolhe o bucket de uma imagem lendo apenas o cabeçalho"""
+        try:
+            with self._open_source(image_path) as pil_image:
+                return closest_bucket(pil_image.size, buckets)
+        except Exception:
+            # Arquivo ilegível: a falha será reportada no processamento
+            return default
+
+    @staticmethod
+    def _list_images(input_dir: Path) -> List[Path]:
+        """Lista todos os arquivos de imagem suportados"""
+        image_files = []
+        for ext in ['*.jpg', '*.jpeg', '*.png', '*.webp', '*.avif']:  # Added AVIF extension
+            image_files.extend(input_dir.glob(ext))
+        return image_files
+
+    def _map_sources(self, method: str, image_files: List[Path], workers: int,
+                     crashed: dict) -> Iterator[Tuple[Path, object]]:
+        """
+        Executa self.<method>(imagem) para cada imagem nos workers
+        supervisionados e produz (imagem, resultado), com None no lugar do
+        resultado em caso de erro. As imagens que derrubam ou travam o worker
+        entram em crashed ({imagem: (erro, se foi por tempo limite)}), para
+        irem para a quarentena.
+        """
+        for (image_path,), result, error in self._map_in_workers(
+                method, [(image_path,) for image_path in image_files], workers):
+            if isinstance(error, (WorkerCrashed, WorkerTimeout)):
+                crashed[image_path] = (f"{type(error).__name__}: {error}",
+                                       isinstance(error, WorkerTimeout))
+            yield image_path, result if error is None else None
+
+    def _exclude_duplicates(self, image_files: List[Path], max_distance: int, workers: int,
+                            manifest: Optional[DatasetManifest],
+                            progress_callback: Optional[Callable[[str], None]],
+                            crashed: dict) -> List[Path]:
+        """
+        Remove da lista as imagens quase idênticas a outra (dHash a até
+        max_distance bits). As miniaturas são decodificadas nos workers
+        supervisionados e os hashes calculados em lote sobre todas elas; as
+        imagens que derrubam ou travam o worker também saem da lista e entram
+        em crashed. Os hashes ficam no cache do manifesto, então só imagens
+        novas ou alteradas são decodificadas de novo.
+        """
+        cache_get = cache_set = None
+        if manifest is not None:
+            cache_get = lambda path: manifest.get_cached(path, "dhash")
+            cache_set = lambda path, value: manifest.set_cached(path, "dhash", value)
+
+        hashes = compute_hashes(image_files, workers, cache_get, cache_set,
+                                lambda missing: self._map_sources("_hash_thumbnail", missing,
+                                                                  workers, crashed))
+        duplicates = find_duplicates(hashes, max_distance, self._open_source)
+
+        if progress_callback:
+            for duplicate, (kept, distance) in duplicates.items():
+                progress_callback(f"Skipping {duplicate.name}: near-duplicate of {kept.name} "
+                                  f"(distance {distance})")
+            if duplicates:
+                progress_callback(f"Excluded {len(duplicates)} near-duplicate images")
+
+        return [image_path for image_path in image_files
+                if image_path not in duplicates and image_path not in crashed]
+
+    def _exclude_low_quality(self, image_files: List[Path], thresholds: QualityThresholds,
+                             target_size: Tuple[int, int], workers: int,
+                             manifest: Optional[DatasetManifest],
+                             progress_callback: Optional[Callable[[str], None]],
+                             crashed: dict) -> List[Path]:
+        """
+        Remove da lista as imagens abaixo dos limites de qualidade (borradas,
+        estouradas ou pequenas demais para o target). Os proxies são
+        decodificados nos workers supervisionados; as imagens que derrubam ou
+        travam o worker também saem da lista e entram em crashed. As métricas
+        ficam no cache do manifesto, então mudar os limites não exige
+        decodificar de novo.
+        """
+        cache_get = cache_set = None
+        if manifest is not None:
+            cache_get = lambda path: manifest.get_cached(path, "quality")
+            cache_set = lambda path, value: manifest.set_cached(path, "quality", value)
+
+        scores = compute_scores(image_files, workers, cache_get, cache_set,
+                                lambda missing: self._map_sources("_quality_score", missing,
+                                                                  workers, crashed))
+        rejected = filter_quality(scores, thresholds, target_size)
+
+        if progress_callback:
+            for image_path, reason in rejected.items():
+                progress_callback(f"Skipping {image_path.name}: {reason}")
+            if rejected:
+                progress_callback(f"Excluded {len(rejected)} low-quality images")
+
+        return [image_path for image_path in image_files
+                if image_path not in rejected and image_path not in crashed]
+
+    def _quarantine_record(self, reason: str, timed_out: bool) -> dict:
+        """
+        Registro da quarentena no manifesto. Com tempo limite, guarda o limite
+        usado: uma imagem válida mas lenta volta a ser tentada quando ele muda.
+        """
+        return {"reason": reason, "timeout": self.image_timeout if timed_out else None}
+
+    def _quarantine_reason(self, record) -> Optional[str]:
+        """Motivo de uma quarentena ainda válida, ou None se a origem deve ser tentada de novo"""
+        if not record:
+            return None
+        if isinstance(record, str):
+            # Registro sem o tempo limite, de versões anteriores
+            return record
+        if record.get("timeout") is not None and record["timeout"] != self.image_timeout:
+            return None
+        return record.get("reason")
+
+    def clear_quarantine(self, output_dir: Path) -> int:
+        """
+        Tira da quarentena as origens registradas nos manifestos de output_dir
+        e das subpastas (modo recursivo), para que sejam tentadas de novo no
+        próximo processamento.
+
+        Returns:
+            int: Número de origens liberadas.
+        """
+        output_dir = Path(output_dir)
+        cleared = 0
+        for manifest_path in sorted(output_dir.rglob(DatasetManifest.FILENAME)):
+            manifest = DatasetManifest.load(manifest_path.parent)
+            cleared += manifest.clear_cached("quarantine")
+            manifest.save()
+        return cleared
+
+    def _remove_excluded_outputs(self, excluded: List[Path], kept: List[Path],
+                                 destinations: List[Tuple[Path, Tuple[int, int],
+                                                          Optional[List[Tuple[int, int]]]]],
+                                 manifests: dict,
+                                 progress_callback: Optional[Callable[[str], None]]):
+        """
+        Apaga as saídas registradas no manifesto das origens excluídas pelos
+        filtros (duplicatas, qualidade) e as tira do manifesto: sem isso, as
+        saídas de uma execução anterior continuariam no dataset e seriam
+        legendadas e usadas no treino. O cache da origem (hash, métricas) é
+        mantido. Uma saída com o mesmo nome da de uma origem mantida (ex.:
+        a.jpg e a.png) não é apagada.
+        """
+        removed = 0
+        for output_dir, _, _ in destinations:
+            manifest = manifests.get(output_dir)
+            if manifest is None:
+                continue
+            kept_names = {self._output_path(output_dir, image_path).name for image_path in kept}
+            for image_path in excluded:
+                name = manifest.output_name(image_path)
+                if name is None:
+                    continue
+                if name not in kept_names:
+                    (output_dir / name).unlink(missing_ok=True)
+                manifest.forget(image_path)
+                removed += 1
+        if progress_callback and removed:
+            progress_callback(f"Removed {removed} previous outputs of excluded images")
+
+    def _process_files(self, groups: List[Tuple[List[Path], List[Tuple[Path, Tuple[int, int],
+                                                                     Optional[List[Tuple[int, int]]]]]]],
+                       progress_callback: Optional[Callable[[str], None]],
+                       workers: int, incremental: bool, content_hash: bool,
+                       duplicate_distance: Optional[int] = None,
+                       quality: Optional[QualityThresholds] = None) -> Tuple[int, int]:
+        """
+        Processa grupos de (imagens, destinos): cada imagem do grupo vai para
+        cada um dos seus destinos (diretório, tamanho final, buckets), e cada
+        origem é decodificada uma única vez. Cada diretório de saída tem seu
+        próprio manifesto e índice de buckets. As imagens de todos os grupos
+        são distribuídas num único pool de workers, sem esperar um grupo
+        terminar para começar o seguinte. Duplicatas e o filtro de qualidade
+        são avaliados dentro de cada grupo.
+
+        Retorna (processadas, falhas) contando por imagem de origem: uma
+        origem só conta como processada se todas as suas saídas deram certo.
+        Duplicatas excluídas não entram em nenhuma das contagens; origens em
+        quarentena (ver self.quarantine) contam como falhas.
+        """
+        self.quarantine = {}
+        all_destinations = [destination for _, destinations in groups
+                            for destination in destinations]
+        for output_dir, _, _ in all_destinations:
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+        manifests = {}
+        if incremental:
+            manifests = {output_dir: DatasetManifest.load(output_dir, content_hash)
+                         for output_dir, _, _ in all_destinations}
+        assignments = {output_dir: {} for output_dir, _, buckets in all_destinations if buckets}
+
+        total_processed = 0
+        total_failed = 0
+
+        jobs = []
+        pending = {}
+        for image_files, destinations in groups:
+            group_manifests = [manifests[output_dir] for output_dir, _, _ in destinations
+                               if output_dir in manifests]
+
+            # Origem que derrubou ou travou um worker numa execução anterior e não
+            # mudou desde então: não é decodificada de novo, nem pelos filtros
+            candidates = []
+            for image_path in image_files:
+                reason = next((reason for reason in (
+                    self._quarantine_reason(manifest.get_cached(image_path, "quarantine"))
+                    for manifest in group_manifests) if reason), None)
+                if reason is not None:
+                    self.quarantine[image_path] = reason
+                    total_failed += 1
+                else:
+                    candidates.append(image_path)
+            image_files = candidates
+
+            crashed = {}
+            if quality is not None:
+                # A resolução é avaliada contra o maior target (o mais exigente)
+                largest_target = max((target_size for _, target_size, _ in destinations),
+                                     key=lambda size: size[0] * size[1])
+                image_files = self._exclude_low_quality(image_files, quality, largest_target,
+                                                        workers,
+                                                        manifests.get(destinations[0][0]),
+                                                        progress_callback, crashed)
+            if duplicate_distance is not None:
+                image_files = self._exclude_duplicates(image_files, duplicate_distance, workers,
+                                                       manifests.get(destinations[0][0]),
+                                                       progress_callback, crashed)
+            # Origens que derrubaram ou travaram o worker já nos filtros
+            for image_path, (message, timed_out) in crashed.items():
+                self.quarantine[image_path] = message
+                total_failed += 1
+                for manifest in group_manifests:
+                    manifest.set_cached(image_path, "quarantine",
+                                        self._quarantine_record(message, timed_out))
+                if progress_callback:
+                    progress_callback(f"{image_path.name} posta em quarentena: {message}")
+            kept = set(image_files)
+            excluded = [image_path for image_path in candidates
+                        if image_path not in kept and image_path not in crashed]
+            if excluded:
+                self._remove_excluded_outputs(excluded, image_files, destinations, manifests,
+                                              progress_callback)
+
+            for image_path in image_files:
+                outputs = []
+                fingerprint = None
+                faces = None
+                for output_dir, target_size, buckets in destinations:
+                    output_path = self._output_path(output_dir, image_path)
+                    image_target = target_size
+                    if buckets:
+                        image_target = self._assign_bucket(image_path, buckets, target_size)
+                        assignments[output_dir][output_path.name] = image_target
+                    params = self._processing_params(image_target)
+
+                    manifest = manifests.get(output_dir)
+                    if manifest is not None:
+                        if manifest.is_up_to_date(image_path, output_path, params):
+                            continue
+                        # Impressão digital tirada antes do processamento: se a origem
+                        # mudar durante o job, a próxima execução a processa de novo
+                        if fingerprint is None:
+                            fingerprint = manifest.fingerprint(image_path)
+                        # Rostos já detectados não dependem do target: evita redetectar
+                        if self.use_face_detection and faces is None:
+                            faces = manifest.get_cached(image_path, "faces")
+                    outputs.append((output_path, image_target, params))
+
+                if not outputs:
+                    total_processed += 1
+                    continue
+                pending[image_path] = ({output_path: params for output_path, _, params in outputs},
+                                       fingerprint)
+                jobs.append((image_path, [(output_path, target) for output_path, target, _ in outputs],
+                             faces))
+
+        if progress_callback and total_processed:
+            progress_callback(f"Skipped {total_processed} up-to-date images")
+        if progress_callback and self.quarantine:
+            progress_callback(f"Skipped {len(self.quarantine)} quarantined images")
+
+        try:
+            for results in self._run_jobs(jobs, workers):
+                if progress_callback:
+                    for result in results:
+                        for message in result.messages:
+                            progress_callback(message)
+
+                source = results[0].source
+                for result in results:
+                    output_dir = result.output.parent
+                    manifest = manifests.get(output_dir)
+                    if manifest is not None and result.faces is not None:
+                        manifest.set_cached(source, "faces", result.faces, pending[source][1])
+                    if result.quarantined:
+                        self.quarantine[source] = result.error
+                        if manifest is not None:
+                            manifest.set_cached(source, "quarantine",
+                                                self._quarantine_record(result.error,
+                                                                        result.timed_out),
+                                                pending[source][1])
+                    if result.success:
+                        if manifest is not None:
+                            # Saída antiga em outro formato: removida para não
+                            # duplicar a imagem no dataset
+                            previous = manifest.output_name(source)
+                            if previous and previous != result.output.name:
+                                (output_dir / previous).unlink(missing_ok=True)
+                            params = pending[source][0][result.output]
+                            manifest.record(source, result.output, params, pending[source][1])
+                            # Quarentena por tempo limite que deu certo com outro limite
+                            manifest.pop_cached(source, "quarantine")
+                    else:
+                        if output_dir in assignments:
+                            assignments[output_dir].pop(result.output.name, None)
+                        if manifest is not None:
+                            manifest.forget(source)
+
+                if all(result.success for result in results):
+                    total_processed += 1
+                else:
+                    total_failed += 1
+
+                # Salva periodicamente para não perder o progresso se o lote for interrompido
+                if (total_processed + total_failed) % 100 == 0:
+                    for manifest in manifests.values():
+                        manifest.save()
+        finally:
+            for manifest in manifests.values():
+                manifest.save()
+
+        for output_dir, _, buckets in all_destinations:
+            if buckets:
+                write_bucket_index(output_dir, buckets, assignments[output_dir])
+
+        return total_processed, total_failed
 
     def process_directory(self, input_dir: Path, output_dir: Path, 
                         target_size: Tuple[int, int],
-                        progress_callback: Optional[Callable[[str], None]] = None) -> Tuple[int, int]:
+                        progress_callback: Optional[Callable[[str], None]] = None,
+                        workers: int = 1,
+                        image_files: Optional[List[Path]] = None,
+                        incremental: bool = False,
+                        content_hash: bool = False,
+                        buckets: Optional[List[Tuple[int, int]]] = None,
+                        skip_duplicates: bool = False,
+                        duplicate_distance: int = 6,
+                        quality: Optional[QualityThresholds] = None) -> Tuple[int, int]:
         """
         Processa todas as imagens em um diretório.
 
@@ -120,30 +1281,316 @@ class ImageProcessor:
             output_dir: Diretório para salvar as imagens processadas.
             target_size: Dimensão final desejada (largura, altura).
             progress_callback: Função para reportar progresso.
+            workers: Número de processos worker supervisionados. As imagens
+                são decodificadas fora do processo principal: uma imagem que
+                trava ou derruba o worker vai para a quarentena sem interromper
+                o lote. O progresso é reportado na ordem em que as imagens
+                terminam. Com 0, processa no próprio processo, sem isolamento.
+            image_files: Lista explícita de imagens. Se omitida, usa as imagens
+                encontradas em input_dir.
+            incremental: Se True, usa o manifesto salvo em output_dir para pular
+                imagens cuja saída já está atualizada.
+            content_hash: Se True, o manifesto também compara o hash do conteúdo
+                quando o mtime muda mas o tamanho não.
+            buckets: Conjunto de resoluções para bucketing por proporção (ver
+                aspect_buckets.make_buckets). Se informado, cada imagem vai para
+                o bucket de proporção mais próxima em vez do target_size, e o
+                índice de buckets é gravado em output_dir.
+            skip_duplicates: Se True, exclui antes do processamento as imagens
+                quase idênticas a outra (hash perceptual), mantendo a de maior
+                resolução e, no empate, a de maior arquivo.
+            duplicate_distance: Distância máxima, em bits do dHash de 64 bits,
+                para considerar duas imagens duplicadas.
+            quality: Limites do filtro de qualidade. Se informado, exclui antes
+                do processamento as imagens borradas, com exposição estourada
+                ou pequenas demais para o target (ver image_quality). Com
+                incremental, as saídas de execuções anteriores das imagens
+                excluídas por este filtro ou por skip_duplicates são apagadas.
 
         Returns:
-            Tuple[int, int]: Número de imagens processadas e falhas.
+            Tuple[int, int]: Número de imagens processadas e falhas. Imagens
+            puladas por já estarem atualizadas contam como processadas; as em
+            quarentena (ver self.quarantine), como falhas. Com incremental, a
+            quarentena fica no manifesto e a origem só é tentada de novo se o
+            arquivo mudar, se image_timeout mudar (quarentena por tempo
+            limite) ou depois de clear_quarantine.
         """
-        # Cria diretório de saída se não existir
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        # Lista todos os arquivos de imagem suportados
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.webp', '*.avif']:  # Added AVIF extension
-            image_files.extend(input_dir.glob(ext))
+        if image_files is None:
+            image_files = self._list_images(input_dir)
 
         if not image_files:
+            output_dir.mkdir(parents=True, exist_ok=True)
             return 0, 0
 
-        total_processed = 0
-        total_failed = 0
+        return self._process_files([(image_files, [(output_dir, target_size, buckets)])],
+                                   progress_callback, workers, incremental, content_hash,
+                                   duplicate_distance if skip_duplicates else None,
+                                   quality)
+
+    def process_directory_recursive(self, input_dir: Path, output_base: Path,
+                                    target_size: Tuple[int, int],
+                                    progress_callback: Optional[Callable[[str], None]] = None,
+                                    workers: int = 1,
+                                    image_files: Optional[List[Path]] = None,
+                                    incremental: bool = False,
+                                    content_hash: bool = False,
+                                    buckets: Optional[List[Tuple[int, int]]] = None,
+                                    skip_duplicates: bool = False,
+                                    duplicate_distance: int = 6,
+                                    quality: Optional[QualityThresholds] = None) -> Tuple[int, int]:
+        """
+        Processa input_dir e todas as subpastas com imagens (datasets com
+        vários conceitos, ex.: 10_alice/ e 5_bob/ no padrão do kohya),
+        espelhando a estrutura em output_base: input_dir/10_alice/x.jpg vai
+        para output_base/10_alice/x.png. As imagens de todas as pastas
+        dividem o mesmo pool de workers. Cada pasta de saída tem seu próprio
+        manifesto e índice de buckets, e duplicatas e o filtro de qualidade
+        são avaliados dentro de cada pasta.
+
+        Ficam de fora output_base, as pastas ocultas e as pastas de saída
+        deste processamento (com manifesto) que estejam dentro de input_dir.
+
+        Args:
+            input_dir: Raiz do dataset.
+            output_base: Raiz das saídas (ex.: dataset/cropped_images).
+            image_files: Se informada, processa só as imagens dessa lista.
+            Demais argumentos: ver process_directory.
+
+        Returns:
+            Tuple[int, int]: Número de imagens processadas e falhas, somando
+            todas as pastas.
+        """
+        folders = find_concept_folders(input_dir, exclude=[output_base], skip_outputs=True)
+        if image_files is not None:
+            selected = set(image_files)
+            for folder in folders:
+                folder.images = [image_path for image_path in folder.images
+                                 if image_path in selected]
+
+        groups = [(folder.images, [(output_base / folder.relative, target_size, buckets)])
+                  for folder in folders if folder.images]
+        if not groups:
+            output_base.mkdir(parents=True, exist_ok=True)
+            return 0, 0
+        if progress_callback:
+            progress_callback(f"Found {sum(len(images) for images, _ in groups)} images "
+                              f"in {len(groups)} folders")
+
+        return self._process_files(groups, progress_callback, workers, incremental,
+                                   content_hash,
+                                   duplicate_distance if skip_duplicates else None,
+                                   quality)
+
+    def _plan_crop(self, size: Tuple[int, int], target_size: Tuple[int, int],
+                   faces: Optional[list] = None,
+                   saliency: Optional[np.ndarray] = None) -> Tuple[float, float, float, float]:
+        """
+        Janela da origem, em pixels da origem, que vira a saída: o equivalente
+        de _scale_for seguido de _crop_scaled, sem tocar nos pixels.
+        """
+        scaled = self._scaled_size(size, target_size)
+        if not faces and saliency is not None:
+            faces = [best_window(saliency, scaled, target_size)]
+        left, top, right, bottom = self._crop_box(scaled, target_size, faces)
+        scale_x, scale_y = scaled[0] / size[0], scaled[1] / size[1]
+        return left / scale_x, top / scale_y, right / scale_x, bottom / scale_y
+
+    def _plan_virtual_crop(self, image_path: Path, output_name: str,
+                           target_size: Tuple[int, int],
+                           faces: Optional[list] = None) -> Tuple[VirtualCrop, Optional[list]]:
+        """
+        Crop virtual de uma origem. Lê só o cabeçalho, a menos que o crop
+        dependa de rostos (ainda não detectados) ou de saliência: aí decodifica
+        apenas uma cópia reduzida. Retorna o crop e os rostos usados.
+        """
+        with self._open_source(image_path) as pil_image:
+            size = pil_image.size
+            proxy = None
+            if not self._is_near_square(size) and (
+                    (self.use_face_detection and faces is None) or self.smart_crop):
+                side = self.FACE_PROXY_SIZE
+                proxy = self._reduced_decode(pil_image, (side, side)).convert("RGB")
+
+        saliency = None
+        if proxy is not None:
+            faces = self._find_faces(proxy, faces)
+            saliency = self._find_saliency(proxy, faces)
+        box = self._plan_crop(size, target_size, faces, saliency)
+        crop = VirtualCrop(str(Path(image_path).resolve()), output_name, size[0], size[1],
+                           *(round(value, 2) for value in box), *target_size)
+        return crop, faces
+
+    def render_virtual_crop(self, crop: VirtualCrop) -> Image.Image:
+        """
+        Gera os pixels de um crop virtual: decodifica a origem (com as mesmas
+        otimizações do processamento normal) e redimensiona só a janela, num
+        único resample.
+        """
+        source = Path(crop.source)
+        with self._open_source(source) as pil_image:
+            if pil_image.size != (crop.width, crop.height):
+                raise ValueError(f"Origem mudou desde o registro do crop: {pil_image.width}x"
+                                 f"{pil_image.height}, esperado {crop.width}x{crop.height}")
+
+        # Tamanho da origem inteira na escala da saída, usado pela
+        # decodificação reduzida e pela super-resolução
+        scale_x = crop.target_width / (crop.x1 - crop.x0)
+        scale_y = crop.target_height / (crop.y1 - crop.y0)
+        full_target = (math.ceil(crop.width * scale_x), math.ceil(crop.height * scale_y))
+        pil_image = self._load_image(source, full_target)
+        pil_image = self._upscale_if_needed(source, pil_image, [full_target])
+
+        factor_x, factor_y = pil_image.width / crop.width, pil_image.height / crop.height
+        box = (crop.x0 * factor_x, crop.y0 * factor_y, crop.x1 * factor_x, crop.y1 * factor_y)
+        return to_srgb(pil_image.resize(crop.target_size, Image.Resampling.LANCZOS, box=box))
+
+    def _materialize_crop(self, crop: VirtualCrop, output_path: Path) -> Path:
+        self._save_image(self.render_virtual_crop(crop), output_path)
+        return output_path
+
+    def plan_virtual_crops(self, input_dir: Path, output_dir: Path,
+                           target_size: Tuple[int, int],
+                           progress_callback: Optional[Callable[[str], None]] = None,
+                           workers: int = 1,
+                           image_files: Optional[List[Path]] = None,
+                           buckets: Optional[List[Tuple[int, int]]] = None) -> Tuple[int, int]:
+        """
+        Modo de crops virtuais: em vez de gravar as imagens, registra em
+        output_dir/crops.csv, uma linha por imagem, a janela da origem e o
+        tamanho final de cada saída (ver virtual_crops.py). Refazer o plano
+        com outros tamanhos ou posições custa só a leitura dos cabeçalhos;
+        os pixels são gerados depois com materialize_virtual_crops ou, sob
+        demanda, com render_virtual_crop.
+
+        Com detecção facial ou smart crop, as origens são decodificadas em
+        escala reduzida nos workers, e os rostos detectados ficam em cache no
+        manifesto de output_dir para os próximos planos.
+
+        Args:
+            input_dir, output_dir, target_size, progress_callback, workers,
+            image_files, buckets: ver process_directory.
 
+        Returns:
+            Tuple[int, int]: Número de imagens registradas no índice e falhas.
+        """
+        if image_files is None:
+            image_files = self._list_images(input_dir)
+        manifest = DatasetManifest.load(output_dir)
+
+        tasks = []
         for image_path in image_files:
-            output_path = output_dir / f"{image_path.stem}.png"
-            success = self.process_image(image_path, output_path, target_size, progress_callback)
-            if success:
-                total_processed += 1
+            image_target = target_size
+            if buckets:
+                image_target = self._assign_bucket(image_path, buckets, target_size)
+            faces = manifest.get_cached(image_path, "faces") if self.use_face_detection else None
+            tasks.append((image_path, self._output_path(output_dir, image_path).name,
+                          tuple(image_target), faces))
+
+        # Sem rostos nem saliência o plano só lê cabeçalhos: não compensa subir workers
+        if not (self.use_face_detection or self.smart_crop):
+            workers = 0
+
+        crops = []
+        failed = 0
+        for (image_path, _, _, cached_faces), result, error in self._map_in_workers(
+                "_plan_virtual_crop", tasks, workers):
+            if error is not None:
+                failed += 1
+                if progress_callback:
+                    progress_callback(f"Erro ao planejar {image_path.name}: "
+                                      f"{type(error).__name__}: {error}")
+                continue
+            crop, faces = result
+            crops.append(crop)
+            if faces is not None and cached_faces is None:
+                manifest.set_cached(image_path, "faces", faces)
+
+        crops.sort(key=lambda crop: crop.output)
+        write_crop_index(output_dir, crops)
+        manifest.save()
+        if progress_callback:
+            progress_callback(f"Planned {len(crops)} virtual crops")
+        return len(crops), failed
+
+    def materialize_virtual_crops(self, output_dir: Path,
+                                  export_dir: Optional[Path] = None,
+                                  progress_callback: Optional[Callable[[str], None]] = None,
+                                  workers: int = 1,
+                                  names: Optional[List[str]] = None) -> Tuple[int, int]:
+        """
+        Grava os pixels dos crops virtuais registrados em output_dir.
+
+        Args:
+            output_dir: Diretório com o índice crops.csv.
+            export_dir: Destino das imagens (padrão: output_dir).
+            names: Só as saídas com esses nomes (padrão: todas do índice).
+
+        Returns:
+            Tuple[int, int]: Número de imagens gravadas e falhas.
+        """
+        export_dir = export_dir or output_dir
+        export_dir.mkdir(parents=True, exist_ok=True)
+        crops = load_crop_index(output_dir)
+        if names is not None:
+            wanted = set(names)
+            crops = [crop for crop in crops if crop.output in wanted]
+
+        processed = failed = 0
+        tasks = [(crop, export_dir / crop.output) for crop in crops]
+        for (crop, _), _, error in self._map_in_workers("_materialize_crop", tasks, workers):
+            if error is None:
+                processed += 1
+                if progress_callback:
+                    progress_callback(f"Processed {crop.output}")
             else:
-                total_failed += 1
+                failed += 1
+                if progress_callback:
+                    progress_callback(f"Erro ao gerar {crop.output}: {type(error).__name__}: {error}")
+        return processed, failed
+
+    @staticmethod
+    def variant_dir(output_base: Path, target_size: Tuple[int, int]) -> Path:
+        """Diretório de uma resolução no modo multi-resolução (ex.: cropped_images_512)"""
+        width, height = target_size
+        suffix = f"{width}" if width == height else f"{width}x{height}"
+        return output_base.parent / f"{output_base.name}_{suffix}"
+
+    def process_directory_multi(self, input_dir: Path, output_base: Path,
+                                target_sizes: List[Tuple[int, int]],
+                                progress_callback: Optional[Callable[[str], None]] = None,
+                                workers: int = 1,
+                                image_files: Optional[List[Path]] = None,
+                                incremental: bool = False,
+                                content_hash: bool = False,
+                                skip_duplicates: bool = False,
+                                duplicate_distance: int = 6,
+                                quality: Optional[QualityThresholds] = None) -> Tuple[int, int]:
+        """
+        Processa as imagens para várias resoluções de uma vez: cada origem é
+        decodificada uma única vez e todas as variantes são gravadas, uma por
+        diretório (ex.: cropped_images_512/ e cropped_images_1024/, ver
+        variant_dir). Cada variante é reduzida a partir da menor intermediária
+        maior que ela, não da original.
+
+        Args:
+            input_dir: Diretório com as imagens de entrada.
+            output_base: Base dos diretórios de saída (ex.: dataset/cropped_images).
+            target_sizes: Lista de dimensões finais (largura, altura).
+            Demais argumentos: ver process_directory.
+
+        Returns:
+            Tuple[int, int]: Número de imagens de origem processadas (todas as
+            variantes) e falhas.
+        """
+        if image_files is None:
+            image_files = self._list_images(input_dir)
+
+        destinations = [(self.variant_dir(output_base, tuple(size)), tuple(size), None)
+                        for size in dict.fromkeys(tuple(size) for size in target_sizes)]
+        if not image_files or not destinations:
+            return 0, 0
 
-        return total_processed, total_failed
\ No newline at end of file
+        return self._process_files([(image_files, destinations)], progress_callback,
+                                   workers, incremental, content_hash,
+                                   duplicate_distance if skip_duplicates else None,
+                                   quality)
@@ -0,0 +1,164 @@
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from PIL import Image
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Maior lado da cópia reduzida em que as métricas são medidas. Fixo para que
+# a nitidez (variância do Laplaciano) seja comparável entre imagens de
+# resoluções diferentes
+PROXY_SIZE = 512
+
+# Níveis de cinza considerados estourados nas pontas do histograma
+CLIP_LEVEL = 4
+
+
+@dataclass
+class QualityScore:
+    """Métricas de qualidade de uma imagem (só dependem da origem, não do target)"""
+    width: int
+    height: int
+    # Variância do Laplaciano no proxy: valores baixos indicam imagem borrada
+    sharpness: float
+    # Fração dos pixels no preto ou no branco estourado
+    clipped_dark: float
+    clipped_bright: float
+
+    def resolution(self, target_size: Tuple[int, int]) -> float:
+        """
+        Resolução efetiva em relação ao target: 1.0 quando a origem cobre o
+        target exatamente, 0.5 quando precisa ser ampliada 2x
+        """
+        return min(self.width / target_size[0], self.height / target_size[1])
+
+
+@dataclass
+class QualityThresholds:
+    """Limites do filtro de qualidade (None desliga o critério)"""
+    # Nitidez mínima. Conservador: a referência usual para fotos de ~500 px
+    # é 100, aqui só as claramente borradas ficam de fora
+    min_sharpness: Optional[float] = 50.0
+    # Fração máxima de pixels estourados em cada ponta. Alta porque fundos
+    # brancos ou pretos lisos (produtos, logos) são legítimos
+    max_clipped: Optional[float] = 0.75
+    # Ampliação máxima aceita: 0.5 = origem com pelo menos metade do target
+    min_resolution: Optional[float] = 0.5
+
+    def check(self, score: QualityScore, target_size: Tuple[int, int]) -> Optional[str]:
+        """Motivo da rejeição da imagem, ou None se ela passa em todos os critérios"""
+        if self.min_sharpness is not None and score.sharpness < self.min_sharpness:
+            return f"blurry (sharpness {score.sharpness:.1f} < {self.min_sharpness:g})"
+        if self.max_clipped is not None:
+            if score.clipped_dark > self.max_clipped:
+                return f"underexposed ({score.clipped_dark:.0%} clipped to black)"
+            if score.clipped_bright > self.max_clipped:
+                return f"overexposed ({score.clipped_bright:.0%} clipped to white)"
+        resolution = score.resolution(target_size)
+        if self.min_resolution is not None and resolution < self.min_resolution:
+            return f"low resolution ({score.width}x{score.height}, {resolution:.2f}x the target)"
+        return None
+
+
+def proxy_from_image(pil_image: Image.Image, proxy_size: int = PROXY_SIZE) -> np.ndarray:
+    """Proxy em tons de cinza, com o maior lado igual a proxy_size, de uma imagem já aberta"""
+    gray = pil_image.convert("L")
+    scale = proxy_size / max(gray.size)
+    if scale < 1:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                           Image.Resampling.BOX, reducing_gap=2.0)
+    return np.asarray(gray)
+
+
+def load_proxy(image_path: Path, proxy_size: int = PROXY_SIZE) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decodifica uma cópia em tons de cinza com o maior lado igual a proxy_size.
+    Para JPEG, draft() decodifica direto em escala reduzida; nos demais
+    formatos, reduce() no modo original evita a conversão em resolução cheia.
+    Retorna o proxy e o tamanho original da imagem.
+    """
+    with Image.open(image_path) as pil_image:
+        size = pil_image.size
+        pil_image.draft("L", (proxy_size, proxy_size))
+        factor = max(pil_image.size) // proxy_size
+        if factor >= 2 and pil_image.mode in ("RGB", "RGBA", "L", "LA"):
+            pil_image = pil_image.reduce(factor)
+        return proxy_from_image(pil_image, proxy_size), size
+
+
+def score_proxy(gray: np.ndarray, size: Tuple[int, int]) -> QualityScore:
+    """Calcula as métricas sobre o proxy em tons de cinza"""
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    total = max(1, gray.size)
+    return QualityScore(
+        width=size[0],
+        height=size[1],
+        sharpness=sharpness,
+        clipped_dark=float(histogram[:CLIP_LEVEL + 1].sum() / total),
+        clipped_bright=float(histogram[255 - CLIP_LEVEL:].sum() / total),
+    )
+
+
+def compute_scores(image_files: Iterable[Path], workers: int = 4,
+                   cache_get: Optional[Callable[[Path], Optional[dict]]] = None,
+                   cache_set: Optional[Callable[[Path, dict], None]] = None,
+                   score_images: Optional[Callable[[List[Path]],
+                                                   Iterator[Tuple[Path, Optional[QualityScore]]]]] = None
+                   ) -> Dict[Path, QualityScore]:
+    """
+    Calcula as métricas de qualidade de cada imagem, reaproveitando as que
+    estão em cache. Imagens ilegíveis ficam de fora do resultado.
+
+    Args:
+        score_images: Mede as imagens fora do cache, produzindo (imagem,
+            métricas ou None se ilegível) em qualquer ordem (ex.: nos workers
+            supervisionados do ImageProcessor). Padrão: proxies decodificados
+            e medidos em threads no próprio processo (o Pillow e o OpenCV
+            liberam o GIL).
+    """
+    scores = {}
+    missing = []
+    for image_path in image_files:
+        cached = cache_get(image_path) if cache_get else None
+        if cached is not None:
+            scores[image_path] = QualityScore(**cached)
+        else:
+            missing.append(image_path)
+
+    def score(image_path: Path) -> Optional[QualityScore]:
+        try:
+            return score_proxy(*load_proxy(image_path))
+        except Exception:
+            return None
+
+    def store(results: Iterable[Tuple[Path, Optional[QualityScore]]]):
+        for image_path, result in results:
+            if result is None:
+                continue
+            scores[image_path] = result
+            if cache_set:
+                cache_set(image_path, asdict(result))
+
+    if missing and score_images is not None:
+        store(score_images(missing))
+    elif missing:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            store(zip(missing, executor.map(score, missing)))
+
+    return scores
+
+
+def filter_quality(scores: Dict[Path, QualityScore], thresholds: QualityThresholds,
+                   target_size: Tuple[int, int]) -> Dict[Path, str]:
+    """
+    Returns:
+        {imagem rejeitada: motivo}
+    """
+    rejected = {}
+    for image_path, score in scores.items():
+        reason = thresholds.check(score, target_size)
+        if reason is not None:
+            rejected[image_path] = reason
+    return rejected
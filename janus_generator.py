@@ -6,13 +6,22 @@ from PIL import Image
 import numpy as np
 from pathlib import Path
 from typing import Tuple, Optional, Callable
-import gc
 import warnings
 import transformers
+from image_pipeline import iter_prefetch
+from concept_folders import caption_paths
+from memory_policy import MemoryPolicy
 transformers.utils.TRUST_REMOTE_CODE = True
 
 class JanusGenerator:
-    def __init__(self):
+    MODEL_PATH = "deepseek-ai/Janus-Pro-7B"
+    
+    def __init__(self, memory_policy: Optional[MemoryPolicy] = None):
+        """
+        Args:
+            memory_policy: Quando liberar a memória entre as imagens (padrão:
+                só quando a memória alocada na GPU passa do limite).
+        """
         print("Initializing JanusGenerator...")
         self.processor = None
         self.model = None
@@ -21,6 +30,7 @@ class JanusGenerator:
         self.default_prompt = "Please describe the image in a continuous paragraph, without using line breaks, bullet points, or numbered lists. "\
         "Provide a detailed and coherent description of the scene, objects, and any relevant details in a single block of text."
         self.custom_prompt = None
+        self.memory_policy = memory_policy or MemoryPolicy()
         
     def set_prompt(self, prompt: str):
         """Define um prompt personalizado completo"""
@@ -32,12 +42,17 @@ class JanusGenerator:
         print(f"Adding context to default prompt: {context}")
         self.custom_prompt = f"{self.default_prompt} {context}"
     
+    def model_key(self) -> tuple:
+        """Identificação do modelo carregado (ver model_registry)"""
+        dtype = "bfloat16" if self.device == "cuda" else "float16"
+        return ("janus", self.MODEL_PATH.split("/")[-1], dtype, self.device)
+    
     def _init_model(self):
         """Inicializa o modelo Janus sob demanda"""
         if self.processor is None:
             try:
                 print("Starting model initialization...")
-                model_path = "deepseek-ai/Janus-Pro-7B"
+                model_path = self.MODEL_PATH
                 print(f"Loading model from: {model_path}")
                 
                 config = AutoConfig.from_pretrained(model_path)
@@ -71,28 +86,38 @@ class JanusGenerator:
                 print(f"Error during model initialization: {str(e)}")
                 raise
     
+    @staticmethod
+    def _load_image(image_path: Path) -> Image.Image:
+        """Abre a imagem em RGB, reduzida se necessário"""
+        image = Image.open(image_path).convert('RGB')
+        
+        # Redimensiona se necessário
+        max_size = 768  # Janus trabalha melhor com imagens 768x768
+        if max(image.size) > max_size:
+            ratio = max_size / max(image.size)
+            new_size = tuple(int(dim * ratio) for dim in image.size)
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        return image
+    
     def generate_caption(self, image_path: Path, 
-                        progress_callback: Optional[Callable[[str], None]] = None) -> str:
+                        progress_callback: Optional[Callable[[str], None]] = None,
+                        image: Optional[Image.Image] = None) -> str:
         """
         Gera caption para uma única imagem usando Janus
+        
+        Args:
+            image: Imagem já carregada com _load_image (ex.: por prefetch);
+                se omitida, abre image_path
         """
         try:
             print(f"\nProcessing image: {image_path}")
             self._init_model()
             
             # Abre e processa a imagem
-            print("Opening image...")
-            image = Image.open(image_path).convert('RGB')
-            print(f"Image opened successfully. Size: {image.size}")
-            
-            # Redimensiona se necessário
-            max_size = 768  # Janus trabalha melhor com imagens 768x768
-            if max(image.size) > max_size:
-                print(f"Resizing image from {image.size}", end="")
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f" to {image.size}")
+            if image is None:
+                print("Opening image...")
+                image = self._load_image(image_path)
+            print(f"Image ready. Size: {image.size}")
             
             # Prepara a conversação
             prompt = self.custom_prompt if self.custom_prompt else self.default_prompt
@@ -140,12 +165,9 @@ class JanusGenerator:
                 caption = self.tokenizer.decode(outputs[0].cpu().tolist(), skip_special_tokens=True)
                 print(f"Caption generated: {caption[:100]}...")
             
-            # Limpa memória GPU
-            print("Cleaning up memory...")
             del prepare_inputs, outputs, inputs_embeds
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                gc.collect()
+            if self.memory_policy.step(1):
+                print("Memory released")
             
             if progress_callback:
                 progress_callback(f"Generated caption for {image_path.name}")
@@ -163,7 +185,11 @@ class JanusGenerator:
                          prefix: str = "",
                          progress_callback: Optional[Callable[[str, int], None]] = None) -> Tuple[int, int]:
         """
-        Processa todas as imagens em um diretório
+        Processa todas as imagens em um diretório. A próxima imagem é aberta
+        e redimensionada em threads de fundo enquanto o modelo gera o caption
+        da atual. O progresso inclui a vazão e o uso de memória (ver
+        MemoryPolicy.stats). As subpastas de conceitos também são processadas,
+        com os captions na pasta equivalente dentro de cada uma.
         """
         print(f"\nStarting directory processing...")
         print(f"Images directory: {images_dir}")
@@ -175,44 +201,51 @@ class JanusGenerator:
         processed = 0
         failed = 0
         
-        # Lista todas as imagens
-        image_files = []
-        for ext in ('*.jpg', '*.jpeg', '*.png'):
-            image_files.extend(images_dir.glob(ext))
+        # Imagens da raiz e das subpastas de conceitos (ex.: 10_alice/, ver
+        # concept_folders.caption_paths), cada uma com o seu arquivo de caption
+        caption_files = caption_paths(images_dir, captions_dir)
+        for caption_dir in {path.parent for path in caption_files.values()}:
+            caption_dir.mkdir(parents=True, exist_ok=True)
+        image_files = list(caption_files)
         
         total_files = len(image_files)
         print(f"Found {total_files} images to process")
         
-        for idx, img_path in enumerate(image_files):
+        if image_files:
+            # A linha de base da política de memória é medida com os pesos
+            # já na GPU
+            self._init_model()
+        
+        self.memory_policy.reset()
+        loaded = iter_prefetch(image_files, self._load_image, depth=2)
+        for idx, (img_path, image, load_error) in enumerate(loaded):
             try:
                 print(f"\nProcessing image {idx + 1}/{total_files}: {img_path.name}")
+                if load_error is not None:
+                    raise load_error
                 # Gera caption
-                caption = self.generate_caption(img_path)
+                caption = self.generate_caption(img_path, image=image)
                 
                 # Adiciona prefixo se especificado
                 if prefix:
                     caption = f"{prefix} {caption}"
                 
                 # Salva caption
-                caption_path = captions_dir / f"{img_path.stem}.txt"
+                caption_path = caption_files[img_path]
                 caption_path.write_text(caption)
                 print(f"Caption saved to: {caption_path}")
                 
                 processed += 1
                 
                 if progress_callback:
-                    progress_callback(f"Processing {img_path.name}...", int((idx + 1) * 100 / total_files))
+                    progress_callback(f"Processing {img_path.name}... ({self.memory_policy.stats()})",
+                                      int((idx + 1) * 100 / total_files))
                 
             except Exception as e:
                 print(f"Failed to process {img_path.name}: {str(e)}")
                 if progress_callback:
                     progress_callback(f"Failed to process {img_path.name}: {str(e)}", -1)
                 failed += 1
-            
-            # Limpa memória GPU periodicamente
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                gc.collect()
         
         print(f"\nDirectory processing complete.")
         print(f"Successfully processed: {processed}")
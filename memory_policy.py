@@ -0,0 +1,143 @@
+import gc
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Quando liberar a memória entre as inferências dos geradores de caption
+NEVER = "never"
+EVERY_N = "every_n"
+THRESHOLD = "threshold"
+MEMORY_MODES = (NEVER, EVERY_N, THRESHOLD)
+
+# Fração da memória da GPU que a memória reservada pode crescer, além da
+# que já estava reservada depois de carregar o modelo, antes de THRESHOLD
+# liberar, se threshold_mb não for informado
+DEFAULT_THRESHOLD_FRACTION = 0.25
+
+
+def _cuda():
+    """torch.cuda, se o torch já foi carregado e há GPU; senão None"""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return torch.cuda
+    return None
+
+
+def release_memory():
+    """Coleta o lixo do Python e devolve ao driver a memória livre do cache da GPU"""
+    gc.collect()
+    cuda = _cuda()
+    if cuda is not None:
+        cuda.empty_cache()
+
+
+def _host_peak_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+@dataclass
+class MemoryPolicy:
+    """
+    Política de liberação de memória dos geradores de caption. Chamar
+    torch.cuda.empty_cache() e gc.collect() depois de cada imagem obriga o
+    alocador a pedir a memória ao driver de novo na imagem seguinte e faz
+    uma coleta completa a cada chamada; aqui a liberação é feita:
+
+    - NEVER: nunca (o cache do alocador é reaproveitado entre os lotes)
+    - EVERY_N: a cada every_n imagens
+    - THRESHOLD: só quando a memória reservada na GPU cresce mais que
+      threshold_mb (padrão: 25% da memória da GPU) desde o reset(). Os pesos
+      do modelo já estão na linha de base, então o limite mede só o que as
+      inferências acumularam (ativações e o cache do alocador, que é o que
+      empty_cache() devolve). Sem GPU, nunca.
+
+    Também acumula as estatísticas mostradas no progresso (stats()).
+    """
+    mode: str = THRESHOLD
+    every_n: int = 32
+    threshold_mb: Optional[float] = None
+    images: int = field(default=0, init=False)
+    releases: int = field(default=0, init=False)
+    _since_release: int = field(default=0, init=False, repr=False)
+    # Memória reservada na GPU no reset() (None: sem GPU ou ainda não medida)
+    _baseline: Optional[int] = field(default=None, init=False, repr=False)
+    _started: float = field(default_factory=time.perf_counter, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.mode not in MEMORY_MODES:
+            raise ValueError(f"Modo deve ser um de: {list(MEMORY_MODES)}")
+        self.every_n = max(1, self.every_n)
+
+    def reset(self):
+        """
+        Zera as estatísticas e mede a linha de base do THRESHOLD (início de
+        um process_directory, depois de carregar o modelo)
+        """
+        self.images = 0
+        self.releases = 0
+        self._since_release = 0
+        self._started = time.perf_counter()
+        cuda = _cuda()
+        self._baseline = cuda.memory_reserved() if cuda is not None else None
+
+    def _threshold_bytes(self, cuda) -> float:
+        if self.threshold_mb is not None:
+            return self.threshold_mb * 1e6
+        total = cuda.get_device_properties(cuda.current_device()).total_memory
+        return total * DEFAULT_THRESHOLD_FRACTION
+
+    def _should_release(self) -> bool:
+        if self.mode == EVERY_N:
+            return self._since_release >= self.every_n
+        if self.mode == THRESHOLD:
+            cuda = _cuda()
+            if cuda is None:
+                return False
+            if self._baseline is None:
+                # Sem reset() depois do carregamento (ex.: generate_caption
+                # avulso): a primeira inferência vira a linha de base
+                self._baseline = cuda.memory_reserved()
+                return False
+            return cuda.memory_reserved() - self._baseline > self._threshold_bytes(cuda)
+        return False
+
+    def step(self, n_images: int = 1) -> bool:
+        """
+        Registra n_images inferidas e libera a memória se a política mandar.
+
+        Returns:
+            bool: Se a memória foi liberada.
+        """
+        self.images += n_images
+        self._since_release += n_images
+        if not self._should_release():
+            return False
+        release_memory()
+        self.releases += 1
+        self._since_release = 0
+        return True
+
+    def stats(self) -> str:
+        """Resumo para o progresso: vazão, memória da GPU e do processo, liberações"""
+        elapsed = time.perf_counter() - self._started
+        parts = [f"{self.images / elapsed if elapsed > 0 else 0.0:.2f} img/s"]
+        cuda = _cuda()
+        if cuda is not None:
+            parts.append(f"GPU {cuda.memory_allocated() / 1e6:.0f}/"
+                         f"{cuda.memory_reserved() / 1e6:.0f} MB alloc/reserved, "
+                         f"peak {cuda.max_memory_allocated() / 1e6:.0f} MB")
+        host_peak = _host_peak_mb()
+        if host_peak is not None:
+            parts.append(f"host peak {host_peak:.0f} MB")
+        parts.append(f"{self.releases} cleanups")
+        return ", ".join(parts)
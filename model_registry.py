@@ -0,0 +1,225 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from memory_policy import release_memory
+
+# Orçamento padrão de memória dos modelos residentes, em MB. Cabe o
+# Janus-Pro-7B em meia precisão (~14 GB) ou os modelos menores juntos
+DEFAULT_MEMORY_BUDGET_MB = 16_000
+
+# Tempo sem uso, em segundos, depois do qual um modelo é descarregado
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+
+
+def model_bytes(generator: Any) -> int:
+    """Memória ocupada pelos pesos (parâmetros e buffers) do modelo de um gerador"""
+    model = getattr(generator, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def release_generator(generator: Any):
+    """
+    Solta as referências do gerador ao modelo e libera a memória. O gerador
+    continua utilizável: o _init_model carrega tudo de novo na próxima chamada.
+    """
+    for attribute in ("model", "processor", "tokenizer", "transform", "labels"):
+        if getattr(generator, attribute, None) is not None:
+            setattr(generator, attribute, None)
+    release_memory()
+
+
+class _Entry:
+    """Gerador carregado e o seu uso"""
+
+    def __init__(self, generator: Any, size: int):
+        self.generator = generator
+        self.size = size
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """
+    Mantém os geradores de caption (com os modelos já carregados) entre as
+    execuções, indexados por (backend, variante, dtype, device), para que uma
+    segunda geração de captions comece sem recarregar os pesos do disco.
+
+    - Orçamento de memória: antes de carregar um modelo, os menos usados
+      recentemente (LRU) são descarregados até ele caber no orçamento junto
+      com os que ficam, para que o pico da carga não passe do orçamento. O
+      tamanho vem da carga anterior do mesmo modelo; na primeira carga ele é
+      desconhecido, e todos os que não estão em uso são descarregados
+    - Tempo ocioso: modelos sem uso há mais de idle_timeout segundos são
+      descarregados por uma thread de fundo
+    - unload() descarrega um modelo ou todos explicitamente
+
+    Modelos em uso (dentro de use()) nunca são descarregados.
+    """
+
+    def __init__(self, memory_budget_mb: Optional[float] = DEFAULT_MEMORY_BUDGET_MB,
+                 idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+                 loader: Optional[Callable[[Any], None]] = None,
+                 sizeof: Callable[[Any], int] = model_bytes,
+                 release: Callable[[Any], None] = release_generator):
+        """
+        Args:
+            memory_budget_mb: Memória máxima dos modelos residentes (None: sem limite).
+            idle_timeout: Segundos sem uso até descarregar (None: nunca).
+            loader: Carrega o modelo de um gerador recém-criado (padrão:
+                chama _init_model, se existir).
+            sizeof: Memória, em bytes, de um gerador carregado.
+            release: Libera o modelo de um gerador descarregado.
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+        self._loader = loader
+        self._sizeof = sizeof
+        self._release = release
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # Tamanho medido de cada modelo já carregado, em bytes (continua
+        # valendo depois de descarregado, para a próxima carga)
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def _load(self, generator: Any):
+        if self._loader is not None:
+            self._loader(generator)
+        elif hasattr(generator, "_init_model"):
+            generator._init_model()
+
+    @property
+    def resident_mb(self) -> float:
+        """Memória dos modelos carregados, em MB"""
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values()) / 1e6
+
+    def loaded(self) -> List[Hashable]:
+        """Chaves dos modelos carregados, do menos para o mais usado recentemente"""
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Gerador carregado para key: o residente, ou um novo criado por
+        factory() e carregado agora (descarregando outros se preciso).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = time.monotonic()
+                return entry.generator
+            if self.memory_budget_mb is not None:
+                # Abre espaço antes de carregar: com o novo modelo e os antigos
+                # residentes ao mesmo tempo, o pico passaria do orçamento
+                self._evict(incoming=self._sizes.get(key, self.memory_budget_mb * 1e6))
+
+        # Carrega fora do lock: pode levar minutos e não deve travar a thread
+        # de tempo ocioso nem outras consultas
+        generator = factory()
+        self._load(generator)
+        size = self._sizeof(generator)
+
+        with self._lock:
+            self._sizes[key] = size
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Outra thread carregou o mesmo modelo enquanto isso
+                self._release(generator)
+                return entry.generator
+            self._entries[key] = _Entry(generator, size)
+            # O tamanho real pode passar do esperado
+            self._evict(keep=key)
+        self._start_reaper()
+        return generator
+
+    @contextmanager
+    def use(self, key: Hashable, factory: Callable[[], Any]) -> Iterator[Any]:
+        """Como get(), mas protege o modelo de ser descarregado durante o bloco"""
+        generator = self.get(key, factory)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.in_use += 1
+        try:
+            yield generator
+        finally:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.in_use -= 1
+                    entry.last_used = time.monotonic()
+
+    def _evict(self, keep: Optional[Hashable] = None, incoming: float = 0):
+        """
+        Descarrega os menos usados recentemente até os residentes, mais
+        incoming bytes de um modelo a carregar, caberem no orçamento
+        """
+        if self.memory_budget_mb is None:
+            return
+        budget = self.memory_budget_mb * 1e6 - incoming
+        total = sum(entry.size for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= budget:
+                break
+            entry = self._entries[key]
+            if key == keep or entry.in_use:
+                continue
+            total -= entry.size
+            self._unload(key)
+
+    def _unload(self, key: Hashable) -> float:
+        entry = self._entries.pop(key)
+        self._release(entry.generator)
+        return entry.size / 1e6
+
+    def unload(self, key: Optional[Hashable] = None) -> float:
+        """
+        Descarrega o modelo de key, ou todos os que não estão em uso.
+
+        Returns:
+            float: Memória liberada, em MB.
+        """
+        with self._lock:
+            keys = [key] if key is not None else list(self._entries)
+            return sum(self._unload(k) for k in keys
+                       if k in self._entries and not self._entries[k].in_use)
+
+    def unload_idle(self) -> float:
+        """Descarrega os modelos sem uso há mais de idle_timeout; retorna os MB liberados"""
+        if self.idle_timeout is None:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items()
+                    if not entry.in_use and now - entry.last_used > self.idle_timeout]
+            return sum(self._unload(key) for key in idle)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self.idle_timeout is None or self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="model-registry-idle",
+                                            daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while not self._stop.wait(min(60.0, max(1.0, (self.idle_timeout or 240.0) / 4))):
+            self.unload_idle()
+
+    def close(self):
+        """Para a thread de tempo ocioso e descarrega todos os modelos"""
+        self._stop.set()
+        self.unload()
+
+
+# Registro único do processo, compartilhado por todas as janelas e ações
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+from PIL import Image
+from typing import List, Tuple
+
+# Maior lado da cópia reduzida usada no mapa de saliência. O resíduo espectral
+# funciona melhor em escalas pequenas (~64 px), e a busca pela janela fica
+# com resolução de ~1.5% do lado da imagem
+SALIENCY_PROXY_SIZE = 64
+
+# Janelas com pelo menos esta fração da maior saliência contam como empate e
+# vence a mais próxima do centro (imagens sem objeto destacado ficam centradas)
+TIE_TOLERANCE = 0.98
+
+# Desvio padrão mínimo (0-1) para um canal entrar no mapa: abaixo disso o
+# canal é praticamente uniforme e só teria ruído
+MIN_CONTRAST = 0.01
+
+
+def _spectral_residual(channel: np.ndarray) -> np.ndarray:
+    """
+    Saliência por resíduo espectral (Hou & Zhang, 2007): o que sobra do log
+    da amplitude depois de tirar a média local é a parte "inesperada" da
+    imagem, que volta ao domínio espacial com a fase original.
+    """
+    spectrum = np.fft.fft2(channel)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-8)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    return saliency
+
+
+def saliency_map(pil_image: Image.Image, proxy_size: int = SALIENCY_PROXY_SIZE) -> np.ndarray:
+    """
+    Mapa de saliência de uma imagem RGB, calculado numa cópia reduzida com o
+    maior lado igual a proxy_size. Soma a saliência da luminância e de dois
+    canais de oponência de cor (vermelho-verde, azul-amarelo), para que
+    objetos que só se destacam pela cor também apareçam.
+    Retorna um array float32 normalizado para somar 1.
+    """
+    width, height = pil_image.size
+    scale = proxy_size / max(width, height)
+    proxy = pil_image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             Image.Resampling.BOX, reducing_gap=2.0)
+    rgb = np.asarray(proxy, dtype=np.float32) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    channels = (0.299 * r + 0.587 * g + 0.114 * b, r - g, b - (r + g) / 2)
+
+    # O resíduo espectral não depende do contraste do canal: cada mapa é
+    # normalizado e pesado pelo desvio padrão do canal, senão o ruído de um
+    # canal quase uniforme pesaria tanto quanto um objeto bem destacado
+    saliency = np.zeros(r.shape, dtype=np.float64)
+    for channel in channels:
+        if channel.std() < MIN_CONTRAST:
+            continue
+        channel_map = _spectral_residual(channel)
+        total = channel_map.sum()
+        if np.isfinite(total) and total > 0:
+            saliency += channel_map / total * float(channel.std())
+    saliency = cv2.GaussianBlur(saliency, (0, 0), max(1.0, proxy_size / 32))
+    total = saliency.sum()
+    if not np.isfinite(total) or total <= 0:
+        return np.full(saliency.shape, 1.0 / saliency.size, dtype=np.float32)
+    return (saliency / total).astype(np.float32)
+
+
+def best_window(saliency: np.ndarray, scaled_size: Tuple[int, int],
+                target_size: Tuple[int, int]) -> List[float]:
+    """
+    Janela do target_size com maior saliência dentro de uma imagem
+    redimensionada para scaled_size. As somas de todas as posições saem de
+    uma imagem integral em operações vetorizadas (O(n) no tamanho do mapa).
+
+    Returns:
+        Caixa normalizada [x, y, w, h] da janela, em frações do tamanho da imagem
+        (mesmo formato das caixas de rostos, ver ImageProcessor._crop_box)
+    """
+    map_height, map_width = saliency.shape
+    fraction_width = min(1.0, target_size[0] / scaled_size[0])
+    fraction_height = min(1.0, target_size[1] / scaled_size[1])
+    window_width = min(map_width, max(1, round(fraction_width * map_width)))
+    window_height = min(map_height, max(1, round(fraction_height * map_height)))
+
+    integral = cv2.integral(saliency.astype(np.float64))
+    sums = (integral[window_height:, window_width:]
+            - integral[:-window_height, window_width:]
+            - integral[window_height:, :-window_width]
+            + integral[:-window_height, :-window_width])
+
+    # Entre as janelas empatadas com a melhor, fica a mais próxima do centro
+    tops, lefts = np.nonzero(sums >= sums.max() * TIE_TOLERANCE)
+    center_top = (map_height - window_height) / 2
+    center_left = (map_width - window_width) / 2
+    nearest = np.argmin((tops - center_top) ** 2 + (lefts - center_left) ** 2)
+    top, left = int(tops[nearest]), int(lefts[nearest])
+
+    # A posição vem da grade do mapa; a largura e a altura, exatas
+    x = (left + window_width / 2) / map_width - fraction_width / 2
+    y = (top + window_height / 2) / map_height - fraction_height / 2
+    return [round(x, 4), round(y, 4), round(fraction_width, 4), round(fraction_height, 4)]
@@ -0,0 +1,150 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from PIL import Image
+
+# Modelo padrão procurado na pasta models/ do projeto. Os modelos do
+# dnn_superres (FSRCNN, ESPCN, EDSR, LapSRN) são arquivos .pb nomeados como
+# <NOME>_x<escala>.pb; o FSRCNN x2 é pequeno (~40 KB) e roda bem em CPU
+DEFAULT_MODEL = Path(__file__).resolve().parent / "models" / "FSRCNN_x2.pb"
+
+# Pasta do cache de imagens ampliadas, dentro do diretório de saída (ao
+# lado do manifesto). Pode ser apagada a qualquer momento (ver clear_cache):
+# só custa ampliar as imagens de novo
+CACHE_DIRNAME = ".sr_cache"
+
+_MODEL_NAME = re.compile(r"^(edsr|espcn|fsrcnn|lapsrn)_x(\d)$", re.IGNORECASE)
+
+# Modelos carregados uma vez por processo/thread (DnnSuperResImpl não é thread-safe)
+_models = threading.local()
+
+
+class SuperResolutionUnavailable(RuntimeError):
+    """O OpenCV instalado não tem o dnn_superres ou o arquivo do modelo não existe"""
+
+
+def parse_model_name(model_path: Path):
+    """Algoritmo e escala a partir do nome do arquivo (ex.: FSRCNN_x2.pb -> ("fsrcnn", 2))"""
+    match = _MODEL_NAME.match(Path(model_path).stem)
+    if match is None:
+        raise ValueError(f"Nome de modelo não reconhecido: {Path(model_path).name} "
+                         f"(esperado <EDSR|ESPCN|FSRCNN|LapSRN>_x<escala>.pb)")
+    return match.group(1).lower(), int(match.group(2))
+
+
+def _load_model(model_path: Path):
+    """Retorna o modelo em cache do processo/thread atual"""
+    cache = getattr(_models, "cache", None)
+    if cache is None:
+        cache = _models.cache = {}
+    key = str(model_path)
+    if key not in cache:
+        import cv2
+        if not hasattr(cv2, "dnn_superres"):
+            raise SuperResolutionUnavailable(
+                "Para usar super-resolução, instale: pip install opencv-contrib-python")
+        if not Path(model_path).exists():
+            raise SuperResolutionUnavailable(f"Modelo de super-resolução não encontrado: {model_path}")
+        algorithm, scale = parse_model_name(model_path)
+        model = cv2.dnn_superres.DnnSuperResImpl_create()
+        model.readModel(str(model_path))
+        model.setModel(algorithm, scale)
+        cache[key] = model
+    return cache[key]
+
+
+class SuperResolver:
+    """
+    Ampliação por super-resolução em CPU (OpenCV dnn_superres), em blocos.
+
+    Cada bloco é ampliado com uma margem de sobreposição que é descartada na
+    montagem, o que evita emendas visíveis e limita a memória da rede ao
+    tamanho do bloco. Os resultados ficam em cache por hash do conteúdo da
+    origem, então reprocessar com outro tamanho de crop não amplia de novo.
+    """
+
+    def __init__(self, model_path: Path = DEFAULT_MODEL, tile_size: int = 256, overlap: int = 8):
+        self.model_path = Path(model_path)
+        self.algorithm, self.scale = parse_model_name(self.model_path)
+        self.tile_size = tile_size
+        self.overlap = overlap
+
+    def check(self):
+        """Levanta SuperResolutionUnavailable se o modelo não puder ser usado"""
+        _load_model(self.model_path)
+
+    def upscale(self, pil_image: Image.Image) -> Image.Image:
+        """Amplia uma imagem RGB pelo fator do modelo, bloco a bloco"""
+        model = _load_model(self.model_path)
+        # O dnn_superres trabalha em BGR
+        source = np.ascontiguousarray(np.asarray(pil_image.convert("RGB"))[:, :, ::-1])
+        height, width = source.shape[:2]
+        scale = self.scale
+        output = np.empty((height * scale, width * scale, 3), dtype=np.uint8)
+
+        step = self.tile_size
+        for top in range(0, height, step):
+            for left in range(0, width, step):
+                bottom, right = min(top + step, height), min(left + step, width)
+                # Bloco com margem (limitada às bordas da imagem)
+                y0, x0 = max(0, top - self.overlap), max(0, left - self.overlap)
+                y1, x1 = min(height, bottom + self.overlap), min(width, right + self.overlap)
+                tile = model.upsample(np.ascontiguousarray(source[y0:y1, x0:x1]))
+                # Descarta a margem ampliada e copia só a parte central
+                inner = tile[(top - y0) * scale:(bottom - y0) * scale,
+                             (left - x0) * scale:(right - x0) * scale]
+                output[top * scale:bottom * scale, left * scale:right * scale] = inner
+
+        return Image.fromarray(np.ascontiguousarray(output[:, :, ::-1]))
+
+    def _cache_path(self, image_path: Path, cache_dir: Path) -> Path:
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return Path(cache_dir) / f"{digest.hexdigest()}_{self.model_path.stem}.png"
+
+    def upscale_cached(self, image_path: Path, pil_image: Image.Image,
+                       cache_dir: Path) -> Image.Image:
+        """
+        Amplia a imagem decodificada de image_path, reaproveitando o resultado
+        em cache_dir se a mesma origem (pelo conteúdo) já foi ampliada com
+        este modelo.
+        """
+        cache_path = self._cache_path(image_path, cache_dir)
+        if cache_path.exists():
+            try:
+                with Image.open(cache_path) as cached:
+                    return cached.convert("RGB")
+            except Exception:
+                # Cache corrompido: amplia de novo e sobrescreve
+                pass
+
+        upscaled = self.upscale(pil_image)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Grava num nome temporário e renomeia: workers podem ampliar a mesma
+        # origem (arquivos duplicados) ao mesmo tempo
+        tmp_path = cache_path.with_name(
+            f"{cache_path.stem}.{os.getpid()}_{threading.get_ident()}.tmp")
+        upscaled.save(tmp_path, "PNG", compress_level=1)
+        os.replace(tmp_path, cache_path)
+        return upscaled
+
+
+def clear_cache(cache_dir: Path) -> int:
+    """
+    Apaga o cache de imagens ampliadas (ex.: cropped_images/.sr_cache).
+
+    Returns:
+        int: Número de imagens apagadas.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+    removed = sum(1 for path in cache_dir.iterdir() if path.suffix == ".png")
+    shutil.rmtree(cache_dir)
+    return removed
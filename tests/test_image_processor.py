@@ -0,0 +1,50 @@
+import pytest
+from PIL import Image
+
+import image_processor
+from image_processor import ImageProcessor
+
+
+def test_reprocessing_a_hardlinked_output_keeps_the_source(tmp_path, monkeypatch):
+    # Sem reflink, a saída no tamanho final é um hardlink da origem
+    monkeypatch.setattr(image_processor, "_reflink", lambda source, destination: False)
+    source = tmp_path / "src" / "c.png"
+    source.parent.mkdir()
+    Image.new("RGB", (512, 512), (200, 30, 30)).save(source)
+    original = source.read_bytes()
+    output = tmp_path / "out" / "c.png"
+    output.parent.mkdir()
+
+    processor = ImageProcessor(use_face_detection=False)
+    assert processor.process_image(source, output, (512, 512))
+    assert output.stat().st_nlink == 2
+
+    assert processor.process_image(source, output, (256, 256))
+    assert source.read_bytes() == original
+    with Image.open(source) as pil_image:
+        assert pil_image.size == (512, 512)
+    with Image.open(output) as pil_image:
+        assert pil_image.size == (256, 256)
+    assert output.stat().st_nlink == 1
+    assert sorted(p.name for p in output.parent.iterdir()) == ["c.png"]
+
+
+def test_large_sources_do_not_lift_the_global_pillow_limit(tmp_path, monkeypatch):
+    # Limite do Pillow reduzido para que uma imagem pequena faça o papel de scan gigante
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    monkeypatch.setattr(ImageProcessor, "MAX_SOURCE_PIXELS", 100_000)
+    # Faixas da decodificação limitada abaixo do limite reduzido, como os
+    # 4 MP reais ficam abaixo dos ~179 MP do Pillow
+    monkeypatch.setattr(ImageProcessor, "STRIP_PIXELS", 900)
+    source = tmp_path / "scan.png"
+    Image.new("RGB", (300, 300)).save(source)
+
+    processor = ImageProcessor(use_face_detection=False, max_pixels=10_000)
+    assert processor.process_image(source, tmp_path / "out.png", (64, 64))
+    assert Image.MAX_IMAGE_PIXELS == 1000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(source)
+
+    # Acima de MAX_SOURCE_PIXELS a origem continua recusada
+    Image.new("RGB", (400, 400)).save(source)
+    assert not processor.process_image(source, tmp_path / "out.png", (64, 64))
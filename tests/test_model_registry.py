@@ -0,0 +1,49 @@
+from model_registry import ModelRegistry
+
+
+class FakeGenerator:
+    def __init__(self, name: str, size_mb: int):
+        self.name = name
+        self.size_mb = size_mb
+        self.model = object()
+
+
+def make_registry(events: list, budget_mb: float = 100) -> ModelRegistry:
+    return ModelRegistry(memory_budget_mb=budget_mb, idle_timeout=None,
+                         loader=lambda generator: events.append(("load", generator.name)),
+                         sizeof=lambda generator: generator.size_mb * 1_000_000,
+                         release=lambda generator: events.append(("release", generator.name)))
+
+
+def test_old_model_is_released_before_a_new_one_loads():
+    events = []
+    registry = make_registry(events)
+    registry.get("a", lambda: FakeGenerator("a", 70))
+
+    def factory():
+        events.append(("factory", "b"))
+        return FakeGenerator("b", 70)
+
+    registry.get("b", factory)
+    assert events == [("load", "a"), ("release", "a"), ("factory", "b"), ("load", "b")]
+    assert registry.loaded() == ["b"]
+
+
+def test_known_sizes_let_models_share_the_budget():
+    events = []
+    registry = make_registry(events)
+    registry.get("a", lambda: FakeGenerator("a", 40))
+    registry.get("b", lambda: FakeGenerator("b", 40))
+    # a já foi carregado uma vez: com o tamanho conhecido, cabe junto de b
+    registry.get("a", lambda: FakeGenerator("a", 40))
+    assert registry.loaded() == ["b", "a"]
+    assert events[-1] == ("load", "a")
+
+
+def test_models_in_use_are_not_released_before_a_load():
+    events = []
+    registry = make_registry(events)
+    with registry.use("a", lambda: FakeGenerator("a", 70)):
+        registry.get("b", lambda: FakeGenerator("b", 20))
+        assert registry.loaded() == ["a", "b"]
+    assert ("release", "a") not in events
@@ -0,0 +1,81 @@
+import os
+import csv
+from dataclasses import dataclass, astuple, fields
+from pathlib import Path
+from typing import List, Tuple
+
+# Índice de crops virtuais gravado no diretório de saída
+CROP_INDEX = "crops.csv"
+
+
+@dataclass
+class VirtualCrop:
+    """
+    Uma linha do índice: de onde sai cada imagem final, sem os pixels.
+    A janela (x0, y0, x1, y1) está em pixels da origem e pode ser fracionária;
+    a saída é essa janela redimensionada para target_width x target_height
+    (o fator de escala é implícito na razão entre os dois).
+    """
+    source: str
+    output: str
+    width: int
+    height: int
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    target_width: int
+    target_height: int
+
+    @property
+    def box(self) -> Tuple[float, float, float, float]:
+        return self.x0, self.y0, self.x1, self.y1
+
+    @property
+    def target_size(self) -> Tuple[int, int]:
+        return self.target_width, self.target_height
+
+    @property
+    def scale(self) -> float:
+        """Fator de escala da origem para a saída"""
+        return self.target_width / (self.x1 - self.x0)
+
+
+_COLUMNS = [f.name for f in fields(VirtualCrop)]
+
+
+def write_crop_index(output_dir: Path, crops: List[VirtualCrop]):
+    """Grava o índice (uma linha por imagem) de forma atômica"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / CROP_INDEX
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(_COLUMNS)
+        for crop in crops:
+            writer.writerow(astuple(crop))
+    os.replace(tmp_path, path)
+
+
+def load_crop_index(output_dir: Path) -> List[VirtualCrop]:
+    """Lê o índice de crops virtuais de um diretório (lista vazia se não existir)"""
+    path = Path(output_dir) / CROP_INDEX
+    if not path.exists():
+        return []
+    crops = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            crops.append(VirtualCrop(
+                source=row["source"],
+                output=row["output"],
+                width=int(row["width"]),
+                height=int(row["height"]),
+                x0=float(row["x0"]),
+                y0=float(row["y0"]),
+                x1=float(row["x1"]),
+                y1=float(row["y1"]),
+                target_width=int(row["target_width"]),
+                target_height=int(row["target_height"]),
+            ))
+    return crops
@@ -0,0 +1,272 @@
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+class WorkerCrashed(RuntimeError):
+    """O processo worker terminou de forma anormal (ex.: segfault) durante a tarefa"""
+
+
+class WorkerTimeout(TimeoutError):
+    """A tarefa passou do tempo limite e o processo worker foi encerrado"""
+
+
+# Índice e conexão do worker no processo atual (None fora do pool)
+_worker_index = None
+_worker_conn = None
+
+
+def worker_index() -> Optional[int]:
+    """Índice do worker do SupervisedPool no processo atual (None fora do pool)"""
+    return _worker_index
+
+
+def heartbeat():
+    """
+    Avisa o supervisor que a tarefa atual continua ativa, reiniciando o prazo
+    dela (ex.: depois de esperar por um recurso compartilhado). Não faz nada
+    fora do pool.
+    """
+    if _worker_conn is not None:
+        _worker_conn.send(("heartbeat",))
+
+
+def _worker_main(index: int, conn, initializer: Optional[Callable], initargs: tuple):
+    """Laço do processo worker: executa uma tarefa por vez e devolve o resultado"""
+    global _worker_index, _worker_conn
+    _worker_index = index
+    _worker_conn = conn
+    init_error = None
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+    except Exception as e:
+        # Sem inicialização não há como executar tarefas: todas recebem o erro,
+        # em vez de o worker sair e as tarefas parecerem ter derrubado o processo
+        init_error = e
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        func, args = task
+        try:
+            if init_error is not None:
+                raise init_error
+            message = ("result", True, func(*args))
+        except Exception as e:
+            message = ("result", False, e)
+        try:
+            conn.send(message)
+        except Exception as e:
+            # Resultado ou exceção que não pode ser serializado
+            conn.send(("result", False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class WorkerSlots:
+    """
+    Semáforo compartilhado entre os workers de um SupervisedPool que registra
+    qual worker segura cada vaga. Se um worker morre ou é encerrado segurando
+    uma vaga, o supervisor a devolve com release_worker(), em vez de a vaga
+    ficar perdida e travar os demais workers.
+    """
+
+    def __init__(self, context, slots: int, workers: int):
+        self._semaphore = context.BoundedSemaphore(slots)
+        self._holders = context.Array("b", workers)
+
+    # Intervalo entre os avisos ao supervisor enquanto espera por uma vaga
+    HEARTBEAT_INTERVAL = 1.0
+
+    def __enter__(self):
+        # A espera pela vaga não conta no tempo limite da tarefa
+        while not self._semaphore.acquire(timeout=self.HEARTBEAT_INTERVAL):
+            heartbeat()
+        self._holders[worker_index()] = 1
+        heartbeat()
+        return self
+
+    def __exit__(self, *exc):
+        self._holders[worker_index()] = 0
+        self._semaphore.release()
+
+    def release_worker(self, index: int):
+        """Devolve a vaga de um worker encerrado, se ele segurava uma"""
+        with self._holders.get_lock():
+            held = self._holders[index]
+            self._holders[index] = 0
+        if held:
+            try:
+                self._semaphore.release()
+            except ValueError:
+                # O worker chegou a devolver a vaga antes de morrer
+                pass
+
+
+class _Worker:
+    """Processo worker e a tarefa em execução nele"""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.task = None
+        self.deadline = None
+
+
+class SupervisedPool:
+    """
+    Pool de processos supervisionado: cada worker executa uma tarefa por vez,
+    e o supervisor (o processo que itera sobre imap_unordered) acompanha cada
+    uma. Um worker que morre (segfault, abort do decodificador) ou passa do
+    tempo limite é encerrado e substituído por um novo, e só a tarefa que ele
+    executava falha; as demais continuam normalmente.
+    """
+
+    def __init__(self, workers: int,
+                 initializer: Optional[Callable] = None,
+                 initargs: tuple = (),
+                 timeout: Optional[float] = None,
+                 context=None,
+                 on_worker_lost: Optional[Callable[[int], None]] = None):
+        """
+        Args:
+            workers: Número de processos worker.
+            initializer: Função executada uma vez em cada worker (inclusive
+                nos reiniciados), com initargs.
+            timeout: Tempo limite por tarefa, em segundos (None: sem limite).
+            context: Contexto do multiprocessing (padrão: o contexto padrão).
+            on_worker_lost: Chamado com o índice do worker antes de reiniciar
+                um worker que morreu ou foi encerrado.
+        """
+        self.timeout = timeout
+        self.on_worker_lost = on_worker_lost
+        self._context = context or multiprocessing.get_context()
+        self._initializer = initializer
+        self._initargs = initargs
+        self._workers: List[Optional[_Worker]] = [None] * max(1, workers)
+        self.restarts = 0
+
+    def __enter__(self) -> "SupervisedPool":
+        for index in range(len(self._workers)):
+            self._start(index)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self, index: int):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, child_conn, self._initializer, self._initargs),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._workers[index] = _Worker(process, parent_conn)
+
+    def _restart(self, index: int):
+        """Encerra o worker (se ainda vivo) e sobe um novo no lugar"""
+        worker = self._workers[index]
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+        if self.on_worker_lost is not None:
+            self.on_worker_lost(index)
+        self.restarts += 1
+        self._start(index)
+
+    def close(self):
+        """Finaliza os workers: pede a saída e encerra os que não saírem"""
+        for worker in self._workers:
+            if worker is None:
+                continue
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            if worker is None:
+                continue
+            worker.process.join(timeout=1 if worker.task is None else 0)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self._workers = [None] * len(self._workers)
+
+    def imap_unordered(self, func: Callable, tasks: Iterable[tuple]
+                       ) -> Iterator[Tuple[tuple, Any, Optional[BaseException]]]:
+        """
+        Executa func(*task) para cada task e produz (task, resultado, erro) na
+        ordem em que as tarefas terminam. erro é None em caso de sucesso, a
+        exceção levantada por func, WorkerCrashed se o worker morreu ou
+        WorkerTimeout se a tarefa passou do tempo limite.
+        func precisa ser uma função de módulo (serializável).
+        """
+        tasks = iter(tasks)
+        exhausted = False
+
+        while True:
+            # Distribui tarefas para os workers livres
+            for index, worker in enumerate(self._workers):
+                if worker.task is not None or exhausted:
+                    continue
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                worker.task = task
+                worker.deadline = time.monotonic() + self.timeout if self.timeout else None
+                try:
+                    worker.conn.send((func, task))
+                except (OSError, ValueError):
+                    # Worker morreu ocioso: o sentinel é tratado abaixo
+                    pass
+
+            busy = [(index, worker) for index, worker in enumerate(self._workers)
+                    if worker.task is not None]
+            if not busy:
+                return
+
+            deadlines = [worker.deadline for _, worker in busy if worker.deadline is not None]
+            wait_time = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([obj for _, worker in busy
+                          for obj in (worker.conn, worker.process.sentinel)], wait_time)
+
+            for index, worker in busy:
+                task = worker.task
+                error = None
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    try:
+                        # Um resultado enviado logo antes de o processo sair ainda vale
+                        message = worker.conn.recv() if worker.conn.poll() else None
+                    except (EOFError, OSError):
+                        message = None
+
+                    if message is None:
+                        worker.process.join()
+                        error = WorkerCrashed(
+                            f"Worker encerrado com código {worker.process.exitcode}")
+                    elif message[0] == "heartbeat":
+                        if self.timeout:
+                            worker.deadline = time.monotonic() + self.timeout
+                        continue
+                    else:
+                        _, success, value = message
+                        worker.task = None
+                        yield (task, value, None) if success else (task, None, value)
+                        continue
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    error = WorkerTimeout(f"Tempo limite de {self.timeout:g}s excedido")
+                else:
+                    continue
+
+                worker.task = None
+                self._restart(index)
+                yield task, None, error